@@ -11,6 +11,7 @@ from browser_env import Trajectory
 from browser_env.actions import (
     Action,
     ActionParsingError,
+    create_compact_id_based_action,
     create_id_based_action,
     create_none_action,
     create_playwright_action,
@@ -69,6 +70,8 @@ class TeacherForcingAgent(Agent):
                     cur_action = create_playwright_action(a_str)
                 elif self.action_set_tag == "id_accessibility_tree":
                     cur_action = create_id_based_action(a_str)
+                elif self.action_set_tag == "id_accessibility_tree_compact":
+                    cur_action = create_compact_id_based_action(a_str)
                 else:
                     raise ValueError(
                         f"Unknown action type {self.action_set_tag}"
@@ -210,6 +213,8 @@ class PromptAgent(Agent):
                     action = create_scroll_action("down")
                 elif self.action_set_tag == "id_accessibility_tree":
                     action = create_id_based_action(parsed_response)
+                elif self.action_set_tag == "id_accessibility_tree_compact":
+                    action = create_compact_id_based_action(parsed_response)
                 elif self.action_set_tag == "playwright":
                     action = create_playwright_action(parsed_response)
                 elif self.action_set_tag == "som":
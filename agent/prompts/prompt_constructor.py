@@ -120,6 +120,17 @@ class PromptConstructor(object):
     ) -> APIInput:
         raise NotImplementedError
 
+    def truncate_observation(self, obs: str) -> str:
+        """Cut the observation to `max_obs_length` tokens, if set"""
+        max_obs_length = self.lm_config.gen_config["max_obs_length"]
+        if not max_obs_length:
+            return obs
+        if self.lm_config.provider == "google":
+            print("NOTE: This is a Gemini model, so we use characters instead of tokens for max_obs_length.")
+            return obs[:max_obs_length]
+        # tokenizers without a vocabulary fall back to characters
+        return self.tokenizer.truncate(obs, max_obs_length)
+
     def map_url_to_real(self, url: str) -> str:
         """Map the urls to their real world counterparts"""
         for i, j in URL_MAPPINGS.items():
@@ -171,13 +182,7 @@ class DirectPromptConstructor(PromptConstructor):
         state_info: StateInfo = trajectory[-1]  # type: ignore[assignment]
 
         obs = state_info["observation"][self.obs_modality]
-        max_obs_length = self.lm_config.gen_config["max_obs_length"]
-        if max_obs_length:
-            if self.lm_config.provider == "google":
-                print("NOTE: This is a Gemini model, so we use characters instead of tokens for max_obs_length.")
-                obs = obs[:max_obs_length]
-            else:
-                obs = self.tokenizer.decode(self.tokenizer.encode(obs)[:max_obs_length])  # type: ignore[arg-type]
+        obs = self.truncate_observation(obs)
 
         page = state_info["info"]["page"]
         url = page.url
@@ -233,13 +238,7 @@ class CoTPromptConstructor(PromptConstructor):
         state_info: StateInfo = trajectory[-1]  # type: ignore[assignment]
 
         obs = state_info["observation"][self.obs_modality]
-        max_obs_length = self.lm_config.gen_config["max_obs_length"]
-        if max_obs_length:
-            if self.lm_config.provider == "google":
-                print("NOTE: This is a Gemini model, so we use characters instead of tokens for max_obs_length.")
-                obs = obs[:max_obs_length]
-            else:
-                obs = self.tokenizer.decode(self.tokenizer.encode(obs)[:max_obs_length])  # type: ignore[arg-type]
+        obs = self.truncate_observation(obs)
 
         page = state_info["info"]["page"]
         url = page.url
@@ -300,13 +299,7 @@ class MultimodalCoTPromptConstructor(CoTPromptConstructor):
         state_info: StateInfo = trajectory[-1]  # type: ignore[assignment]
 
         obs = state_info["observation"][self.obs_modality]
-        max_obs_length = self.lm_config.gen_config["max_obs_length"]
-        if max_obs_length:
-            if self.lm_config.provider in ["google", "api", "finetune"]:
-                print("NOTE: This is a Gemini / API model, so we use characters instead of tokens for max_obs_length.")
-                obs = obs[:max_obs_length]
-            else:
-                obs = self.tokenizer.decode(self.tokenizer.encode(obs)[:max_obs_length])  # type: ignore[arg-type]
+        obs = self.truncate_observation(obs)
 
         page = state_info["info"]["page"]
         url = page.url
@@ -525,17 +518,7 @@ class WebRLPromptConstructor(PromptConstructor):
         state_info: StateInfo = trajectory[-1]  # type: ignore[assignment]
 
         obs = state_info["observation"][self.obs_modality]
-        max_obs_length = self.lm_config.gen_config["max_obs_length"]
-        if max_obs_length:
-            if self.lm_config.provider == "google":
-                print("NOTE: This is a Gemini model, so we use characters instead of tokens for max_obs_length.")
-                obs = obs[:max_obs_length]
-            else:
-                try:
-                    obs = self.tokenizer.decode(self.tokenizer.encode(obs)[:max_obs_length])  # type: ignore[arg-type]
-                except:
-                    print("NOTE: There is no available tokenizer, so we use characters instead of tokens for max_obs_length.")
-                    obs = obs[:max_obs_length]
+        obs = self.truncate_observation(obs)
 
         turn_num = len(meta_data["action_history"])
         if turn_num == 1:
@@ -605,17 +588,7 @@ class WebRLChatPromptConstructor(PromptConstructor):
         state_info: StateInfo = trajectory[-1]  # type: ignore[assignment]
 
         obs = state_info["observation"][self.obs_modality]
-        max_obs_length = self.lm_config.gen_config["max_obs_length"]
-        if max_obs_length:
-            if self.lm_config.provider == "google":
-                print("NOTE: This is a Gemini model, so we use characters instead of tokens for max_obs_length.")
-                obs = obs[:max_obs_length]
-            else:
-                try:
-                    obs = self.tokenizer.decode(self.tokenizer.encode(obs)[:max_obs_length])  # type: ignore[arg-type]
-                except:
-                    print("NOTE: There is no available tokenizer, so we use characters instead of tokens for max_obs_length.")
-                    obs = obs[:max_obs_length]
+        obs = self.truncate_observation(obs)
 
         turn_num = len(meta_data["action_history"])
         if turn_num == 1:
@@ -706,14 +679,7 @@ class PlannerPromptConstructor(CoTPromptConstructor):
         state_info: StateInfo = trajectory[-1]
         
         obs = state_info["observation"][self.obs_modality]
-        max_obs_length = self.lm_config.gen_config["max_obs_length"]
-        if max_obs_length:
-            if self.lm_config.provider == "google":
-                obs = obs[:max_obs_length]
-            else:
-                obs = self.tokenizer.decode(
-                    self.tokenizer.encode(obs)[:max_obs_length]
-                )
+        obs = self.truncate_observation(obs)
 
         # Get previous action description
         action_history = meta_data.get("action_history", [])
@@ -777,14 +743,7 @@ class ExecutorPromptConstructor(CoTPromptConstructor):
         # Per user's prompt, this should be HTML.
         # webrl observation is already in a simplified HTML format.
         obs = state_info["observation"]["text"]
-        max_obs_length = self.lm_config.gen_config["max_obs_length"]
-        if max_obs_length:
-            if self.lm_config.provider == "google":
-                obs = obs[:max_obs_length]
-            else:
-                obs = self.tokenizer.decode(
-                    self.tokenizer.encode(obs)[:max_obs_length]
-                )
+        obs = self.truncate_observation(obs)
 
         prompt = (
             f'You are a helpful WebAgent AI to do following task: "{user_query}". '
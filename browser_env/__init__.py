@@ -8,6 +8,7 @@ from .actions import (
     action2str,
     create_check_action,
     create_click_action,
+    create_compact_id_based_action,
     create_focus_and_click_action,
     create_focus_and_type_action,
     create_go_back_action,
@@ -35,11 +36,13 @@ from .async_envs import AsyncScriptBrowserEnv
 from .envs import ScriptBrowserEnv
 from .processors import ObservationMetadata
 from .trajectory import Trajectory
+from .vector_env import VectorBrowserEnv
 from .utils import DetachedPage, StateInfo
 
 __all__ = [
     "ScriptBrowserEnv",
     "AsyncScriptBrowserEnv",
+    "VectorBrowserEnv",
     "DetachedPage",
     "StateInfo",
     "ObservationMetadata",
@@ -62,6 +65,7 @@ __all__ = [
     "create_page_close_action",
     "action2create_function",
     "create_playwright_action",
+    "create_compact_id_based_action",
     "create_id_based_action",
     "create_scroll_action",
     "create_key_press_action",
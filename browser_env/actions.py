@@ -42,6 +42,7 @@ from browser_env.constants import (
     RolesType,
 )
 from browser_env.processors import ObservationProcessor
+from browser_env.settle import SettleDetector
 
 
 class ParsedPlaywrightCode(TypedDict):
@@ -124,6 +125,7 @@ def action2str(
     if action_set_tag in [
         "id_accessibility_tree",
         "id_accessibility_tree_with_captioner",
+        "id_accessibility_tree_compact",
     ]:
         element_id = action["element_id"]
         match action["action_type"]:
@@ -1292,6 +1294,7 @@ def execute_action_webrl(
     browser_ctx: BrowserContext,
     obseration_processor: ObservationProcessor,
     sleep_after_execution: float = 0.0,
+    settle_detector: SettleDetector | None = None,
 ) -> Page:
     """Execute the action on the ChromeDriver."""
     action_type = action["action_type"]
@@ -1365,8 +1368,11 @@ def execute_action_webrl(
                 last_turn_element.select_option(value=value)
         case _:
             raise ValueError(f"Unknown action type: {action_type}")
-            
-    page.wait_for_timeout(int(sleep_after_execution * 1000))
+
+    if settle_detector is not None:
+        settle_detector.wait(page)
+    else:
+        page.wait_for_timeout(int(sleep_after_execution * 1000))
     num_tabs_now = len(browser_ctx.pages)
     # if a new tab is opened by clicking, switch to the new tab
     if num_tabs_now > num_tabs_before:
@@ -1382,6 +1388,7 @@ def execute_action(
     browser_ctx: BrowserContext,
     obseration_processor: ObservationProcessor,
     sleep_after_execution: float = 0.0,
+    settle_detector: SettleDetector | None = None,
 ) -> Page:
     """Execute the action on the ChromeDriver."""
     action_type = action["action_type"]
@@ -1529,7 +1536,10 @@ def execute_action(
         case _:
             raise ValueError(f"Unknown action type: {action_type}")
 
-    page.wait_for_timeout(int(sleep_after_execution * 1000))
+    if settle_detector is not None:
+        settle_detector.wait(page)
+    else:
+        page.wait_for_timeout(int(sleep_after_execution * 1000))
     num_tabs_now = len(browser_ctx.pages)
     # if a new tab is opened by clicking, switch to the new tab
     if num_tabs_now > num_tabs_before:
@@ -1542,10 +1552,15 @@ def execute_action(
 
 @beartype
 async def aexecute_action(
-    action: Action, page: APage, browser_ctx: ABrowserContext
+    action: Action,
+    page: APage,
+    browser_ctx: ABrowserContext,
+    obseration_processor: ObservationProcessor | None = None,
+    sleep_after_execution: float = 0.0,
 ) -> APage:
     """Execute the async action on the ChromeDriver."""
     action_type = action["action_type"]
+    num_tabs_before = len(browser_ctx.pages)
     match action_type:
         case ActionTypes.NONE:
             pass
@@ -1563,21 +1578,24 @@ async def aexecute_action(
         case ActionTypes.CLEAR:
             element_id = action["element_id"]
             element_center = obseration_processor.get_element_center(element_id)  # type: ignore[attr-defined]
-            await execute_mouse_click(element_center[0], element_center[1], page)
-            await execute_key_press("Meta+A", page)
-            await execute_key_press('Backspace', page)
+            await aexecute_mouse_click(element_center[0], element_center[1], page)
+            await aexecute_key_press("Meta+A", page)
+            await aexecute_key_press("Backspace", page)
         case ActionTypes.MOUSE_HOVER:
             await aexecute_mouse_hover(
                 action["coords"][0], action["coords"][1], page
             )
         case ActionTypes.KEYBOARD_TYPE:
             await aexecute_type(action["text"], page)
+            await page.keyboard.press("Enter")
 
         case ActionTypes.CLICK:
             # check each kind of locator in order
             # TODO[shuyanzh]: order is temp now
             if action["element_id"]:
-                raise NotImplementedError
+                element_id = action["element_id"]
+                element_center = obseration_processor.get_element_center(element_id)  # type: ignore[attr-defined]
+                await aexecute_mouse_click(element_center[0], element_center[1], page)
             elif action["element_role"] and action["element_name"]:
                 element_role = int(action["element_role"])
                 element_name = action["element_name"]
@@ -1595,7 +1613,9 @@ async def aexecute_action(
                 raise ValueError("No proper locator found for click action")
         case ActionTypes.HOVER:
             if action["element_id"]:
-                raise NotImplementedError
+                element_id = action["element_id"]
+                element_center = obseration_processor.get_element_center(element_id)  # type: ignore[attr-defined]
+                await aexecute_mouse_hover(element_center[0], element_center[1], page)
             elif action["element_role"] and action["element_name"]:
                 element_role = int(action["element_role"])
                 element_name = action["element_name"]
@@ -1614,14 +1634,21 @@ async def aexecute_action(
                 )
         case ActionTypes.TYPE:
             if action["element_id"]:
-                raise NotImplementedError
+                element_id = action["element_id"]
+                element_center = obseration_processor.get_element_center(element_id)  # type: ignore[attr-defined]
+                await aexecute_mouse_click(element_center[0], element_center[1], page)
+                # Clear the input field before typing
+                await aexecute_key_press("Meta+A", page)
+                await aexecute_key_press("Backspace", page)
+                await aexecute_type(action["text"], page)
+                await page.keyboard.press("Enter")
             elif action["element_role"] and action["element_name"]:
                 element_role = int(action["element_role"])
                 element_name = action["element_name"]
                 nth = action["nth"]
                 await aexecute_focus(element_role, element_name, nth, page)
                 await aexecute_type(action["text"], page)
-                page.keyboard.press("Enter")
+                await page.keyboard.press("Enter")
             elif action["pw_code"]:
                 parsed_code = parse_playwright_code(action["pw_code"])
                 locator_code = parsed_code[:-1]
@@ -1630,7 +1657,7 @@ async def aexecute_action(
                 await aexecute_playwright_type(
                     text=text, locator_code=locator_code, page=page
                 )
-                page.keyboard.press("Enter")
+                await page.keyboard.press("Enter")
             else:
                 raise NotImplementedError(
                     "No proper locator found for type action"
@@ -1676,6 +1703,107 @@ async def aexecute_action(
         case _:
             raise ValueError(f"Unknown action type: {action_type}")
 
+    await page.wait_for_timeout(int(sleep_after_execution * 1000))
+    num_tabs_now = len(browser_ctx.pages)
+    # if a new tab is opened by clicking, switch to the new tab
+    if num_tabs_now > num_tabs_before:
+        page = browser_ctx.pages[-1]
+        await page.bring_to_front()
+
+    return page
+
+
+@beartype
+async def aexecute_scroll_webrl(direction: str, page: APage) -> None:
+    # perform the action which move 2/3 of the height of the page at a time
+    if direction == "up":
+        await page.mouse.wheel(0, -page.viewport_size['height'] * 2.0 / 3)
+    elif direction == "down":
+        await page.mouse.wheel(0, page.viewport_size['height'] * 2.0 / 3)
+
+
+@beartype
+async def aexecute_action_webrl(
+    action: Action,
+    page: APage,
+    browser_ctx: ABrowserContext,
+    obseration_processor: ObservationProcessor,
+    sleep_after_execution: float = 0.0,
+) -> APage:
+    """Execute the async action on the ChromeDriver."""
+    action_type = action["action_type"]
+    num_tabs_before = len(browser_ctx.pages)
+    match action_type:
+        case ActionTypes.NONE:
+            pass
+        case ActionTypes.SCROLL:
+            direction = "up" if "up" in action["direction"] else "down"
+            await aexecute_scroll_webrl(direction, page)
+        case ActionTypes.KEY_PRESS:
+            keys = action["key_comb"]
+            await aexecute_key_press(keys, page)
+        case ActionTypes.MOUSE_CLICK:
+            await aexecute_mouse_click(action["coords"][0], action["coords"][1], page)
+        case ActionTypes.CLICK:
+            element_id = action["element_id"]
+            element_center = await obseration_processor.aget_element_center(element_id, page)  # type: ignore[attr-defined]
+            await aexecute_mouse_click(element_center[0], element_center[1], page)
+        case ActionTypes.HOVER:
+            element_id = action["element_id"]
+            element_center = obseration_processor.get_element_center(element_id)  # type: ignore[attr-defined]
+            await aexecute_mouse_hover(element_center[0], element_center[1], page)
+        case ActionTypes.TYPE | ActionTypes.SEARCH:
+            element_id = action["element_id"]
+            element_center = obseration_processor.get_element_center(element_id)  # type: ignore[attr-defined]
+            await aexecute_mouse_click(element_center[0], element_center[1], page)
+            # Clear the input field before typing
+            await aexecute_key_press("Meta+A", page)
+            await aexecute_key_press("Backspace", page)
+            text = _keys2ids(action["text"])
+            await aexecute_type(text, page)
+            await page.keyboard.press("Enter")
+        case ActionTypes.GO_BACK:
+            await page.go_back()
+        case ActionTypes.GO_FORWARD:
+            await page.go_forward()
+        case ActionTypes.GOTO_URL:
+            await page.goto(action["url"])
+        case ActionTypes.SELECT_DROPDOWN_OPTION:
+            # Click
+            element_id = action["element_id"]
+            argument = action["argument"]
+            element_center = await obseration_processor.aget_element_center(element_id, page)  # type: ignore[attr-defined]
+            await aexecute_mouse_click(element_center[0], element_center[1], page)
+            # get element
+            device_pixel_ratio = await page.evaluate("window.devicePixelRatio")
+            center_x, center_y = element_center[0] * page.viewport_size["width"], element_center[1] * page.viewport_size["height"]
+            last_turn_element = await page.evaluate_handle(f"""() => document.elementFromPoint({center_x / device_pixel_ratio}, {center_y / device_pixel_ratio})""")
+            # get select element options
+            select_element_options = [
+                {
+                    "value": await option.get_attribute('value'),
+                    "text": (await option.text_content()).strip(' \n'),
+                }
+                for option in await last_turn_element.query_selector_all("option")
+            ]
+            selector_option_dict = dict((o["text"].lower(), o["value"]) for o in select_element_options)
+            value = None
+            for key in selector_option_dict.keys():
+                if argument.lower() in key.lower():
+                    value = selector_option_dict[key]
+                    break
+            if value is not None:
+                await last_turn_element.select_option(value=value)
+        case _:
+            raise ValueError(f"Unknown action type: {action_type}")
+
+    await page.wait_for_timeout(int(sleep_after_execution * 1000))
+    num_tabs_now = len(browser_ctx.pages)
+    # if a new tab is opened by clicking, switch to the new tab
+    if num_tabs_now > num_tabs_before:
+        page = browser_ctx.pages[-1]
+        await page.bring_to_front()
+
     return page
 
 
@@ -1883,6 +2011,25 @@ def create_id_based_action(action_str: str) -> Action:
         return create_none_action()
 
 
+@beartype
+def create_compact_id_based_action(action_str: str) -> Action:
+    """Parse an action issued on the compact observation dialect.
+
+    The compact observation shows element ids without brackets, so besides
+    `click [12]` the ids are also accepted as `click 12` or `type 12 [text]`.
+    Only the id right after the action name is rewritten, never the typed
+    text.
+    """
+    action_str = re.sub(
+        r"^\s*(click|hover|type|clear)\s+#?(\d+)\b",
+        r"\1 [\2]",
+        action_str,
+        count=1,
+        flags=re.IGNORECASE,
+    )
+    return create_id_based_action(action_str)
+
+
 @beartype
 def create_webrl_id_based_action(action_str: str) -> Action:
     """Parse a webrl_id-based action string and return the corresponding action."""
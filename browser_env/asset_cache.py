@@ -0,0 +1,197 @@
+"""On-disk cache of static responses, shared across contexts and workers.
+
+Stylesheets, scripts, images and fonts are served from disk through route
+interception while they are fresh according to their Cache-Control (or
+Expires) headers. Documents and API responses are never cached.
+
+Layout of the cache directory:
+- `blobs/<sha256 of body>`: response bodies, content addressed, so the same
+  bundle served under several URLs is stored once
+- `entries/<sha256 of url>.json`: status, headers, body hash and expiry
+
+All files are written to a temporary file first and moved into place with
+`os.replace`, so several workers can share one directory.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any
+
+from playwright.sync_api import BrowserContext, Route
+
+CACHEABLE_RESOURCE_TYPES = {"stylesheet", "script", "image", "font"}
+UNCACHEABLE_CONTENT_TYPES = ("text/html", "application/json")
+# the stored body is already decoded
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+# entries are keyed by URL only; the stored body is decoded, so varying by
+# encoding is harmless
+IGNORED_VARY_HEADERS = {"accept-encoding"}
+
+
+def varies_by_request(headers: dict[str, str]) -> bool:
+    """Whether the response depends on request headers beyond the URL"""
+    vary = {
+        name.strip().lower()
+        for name in headers.get("vary", "").split(",")
+        if name.strip()
+    }
+    return bool(vary - IGNORED_VARY_HEADERS)
+
+
+def freshness_lifetime(headers: dict[str, str], default_ttl: float) -> float:
+    """Seconds a response may be served from the cache, 0 if it may not"""
+    cache_control = headers.get("cache-control", "").lower()
+    directives = {}
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name] = value.strip('"')
+    if {"no-store", "no-cache", "private"} & directives.keys():
+        return 0.0
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                return max(0.0, float(directives[name]))
+            except ValueError:
+                return 0.0
+    if "expires" in headers:
+        try:
+            expires = parsedate_to_datetime(headers["expires"]).timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+        return max(0.0, expires - time.time())
+    return default_ttl
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class AssetCache:
+    """Serves static assets from `cache_dir` and stores fresh responses.
+
+    `default_ttl` is used for responses without any freshness information;
+    the default of 0 leaves them uncached.
+    """
+
+    def __init__(self, cache_dir: str | Path, default_ttl: float = 0.0) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.blob_dir = self.cache_dir / "blobs"
+        self.entry_dir = self.cache_dir / "entries"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.entry_dir.mkdir(parents=True, exist_ok=True)
+        self.default_ttl = default_ttl
+        self.stats: dict[BrowserContext, Counter[str]] = {}
+
+    def _entry_path(self, url: str) -> Path:
+        return self.entry_dir / (
+            hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json"
+        )
+
+    def lookup(self, url: str) -> tuple[dict[str, Any], bytes] | None:
+        """The cached entry and body for `url`, if present and fresh"""
+        try:
+            with open(self._entry_path(url), "r") as f:
+                entry = json.load(f)
+            if entry["url"] != url or entry["expires"] <= time.time():
+                return None
+            with open(self.blob_dir / entry["body_sha256"], "rb") as f:
+                body = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        return entry, body
+
+    def store(
+        self, url: str, status: int, headers: dict[str, str], body: bytes
+    ) -> bool:
+        """Store the response if it is cacheable; returns whether it was"""
+        if status != 200 or "set-cookie" in headers:
+            return False
+        if varies_by_request(headers):
+            return False
+        if headers.get("content-type", "").startswith(UNCACHEABLE_CONTENT_TYPES):
+            return False
+        lifetime = freshness_lifetime(headers, self.default_ttl)
+        if lifetime <= 0:
+            return False
+
+        body_sha256 = hashlib.sha256(body).hexdigest()
+        blob_path = self.blob_dir / body_sha256
+        if not blob_path.exists():
+            _atomic_write(blob_path, body)
+        entry = {
+            "url": url,
+            "status": status,
+            "headers": {
+                k: v for k, v in headers.items() if k not in DROPPED_HEADERS
+            },
+            "body_sha256": body_sha256,
+            "expires": time.time() + lifetime,
+        }
+        _atomic_write(self._entry_path(url), json.dumps(entry).encode("utf-8"))
+        return True
+
+    def attach(self, context: BrowserContext) -> None:
+        counter: Counter[str] = Counter()
+        self.stats[context] = counter
+
+        def handle(route: Route) -> None:
+            request = route.request
+            if (
+                request.method != "GET"
+                or request.resource_type not in CACHEABLE_RESOURCE_TYPES
+            ):
+                route.fallback()
+                return
+
+            cached = self.lookup(request.url)
+            if cached is not None:
+                entry, body = cached
+                counter["hits"] += 1
+                route.fulfill(
+                    status=entry["status"], headers=entry["headers"], body=body
+                )
+                return
+
+            try:
+                response = route.fetch()
+            except Exception as e:
+                # let the request go to the network as if uncached
+                print(f"WARNING: failed to fetch {request.url} for the cache: {e}")
+                counter["fetch_errors"] += 1
+                route.fallback()
+                return
+            counter["misses"] += 1
+            try:
+                if self.store(
+                    request.url, response.status, response.headers, response.body()
+                ):
+                    counter["stores"] += 1
+            except Exception as e:
+                # e.g. a full disk, or a body that could not be read
+                print(f"WARNING: failed to cache {request.url}: {e}")
+            route.fulfill(response=response)
+
+        context.route("**/*", handle)
+        context.on("close", lambda _: self.stats.pop(context, None))
+
+    def pop_stats(self, context: BrowserContext) -> dict[str, int]:
+        """Cache hits, misses and stores since the last call"""
+        counter = self.stats.get(context)
+        if counter is None:
+            return {}
+        stats = dict(counter)
+        counter.clear()
+        return stats
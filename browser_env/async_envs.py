@@ -1,77 +1,209 @@
 import asyncio
 import json
-from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 
 import numpy as np
 import numpy.typing as npt
 from beartype import beartype
 from gymnasium import Env
-from gymnasium.spaces import Box, Text
-from playwright.async_api import Page, ViewportSize, async_playwright
+from playwright.async_api import BrowserContext, Page, ViewportSize, async_playwright
 
-from .actions import Action, aexecute_action, get_action_space
-from .utils import DetachedPage, png_bytes_to_numpy
+from .actions import (
+    Action,
+    aexecute_action,
+    aexecute_action_webrl,
+    get_action_space,
+)
+from .async_processors import AsyncObservationHandler
+from .html_tools.fetch import ainstall_page_scripts
+from .processors import ObservationMetadata
+from .site_reset import SiteResetManager, build_site_reset_manager
+from .utils import DetachedPage, Observation
 
 
-class AsyncScriptBrowserEnv(Env[npt.NDArray[np.uint8], Action]):
+class AsyncScriptBrowserEnv(Env[dict[str, Observation], Action]):
     """
-    The goal of this environment is to produce a prototype of a browser environment.
-    In the end, we want to support a fully configurable browser environment with wide
-    range of action spaces and observation spaces, both structured and unstructured.
-    But in this prototype, we just support action space specified by Playwright script,
-    and observation space is the html content of the page.
+    Async counterpart of ScriptBrowserEnv with the same observations.
+
+    `areset`, `astep` and `aclose` run on the caller's event loop, so many
+    environments can be driven concurrently from one process. The sync
+    `reset`, `step` and `close` drive the coroutines on a loop owned by the
+    environment that persists across calls.
     """
 
     @beartype
     def __init__(
         self,
-        max_page_length: int = 2048,
+        max_page_length: int = 8192,
         headless: bool = True,
         slow_mo: int = 0,
-        timeout: int = 30000,
+        observation_type: str = "html",
+        current_viewport_only: bool = False,
         viewport_size: ViewportSize = {"width": 1280, "height": 720},
+        sleep_after_execution: float = 0.0,
+        captioning_fn=None,
+        observation_token_budget: int = 0,
+        ax_fetch_mode: str = "full",
+        observation_dialect: str = "default",
+        reuse_browser: bool = False,
+        site_reset_manager: SiteResetManager | None = None,
     ):
-        self.observation_space = Box(
-            0,
-            255,
-            (viewport_size["height"], viewport_size["width"], 4),
-            np.uint8,
-        )
         # TODO: make Space[Action] = ActionSpace
         self.action_space = get_action_space()  # type: ignore[assignment]
         self.headless = headless
         self.slow_mo = slow_mo
+        self.current_viewport_only = current_viewport_only
         self.reset_finished = False
-        self.timeout = timeout
         self.viewport_size = viewport_size
+        self.sleep_after_execution = sleep_after_execution
+        self.reuse_browser = reuse_browser
+        self.context_manager = None
+        self.site_reset_manager = site_reset_manager
+        self.loop: asyncio.AbstractEventLoop | None = None
 
-    @beartype
-    async def setup(self, config_file: Path | None = None) -> None:
+        match observation_type:
+            case "html" | "accessibility_tree" | "webrl":
+                self.text_observation_type = observation_type
+                self.image_observation_type = ""
+                self.main_observation_type = "text"
+            case "image":
+                self.image_observation_type = observation_type
+                self.text_observation_type = ""  # type: ignore[assignment]
+                self.main_observation_type = "image"
+            case "image_som":
+                self.image_observation_type = observation_type
+                self.text_observation_type = observation_type  # type: ignore[assignment]
+                self.main_observation_type = "image"
+            case _:
+                raise ValueError(
+                    f"Unsupported observation type: {observation_type}"
+                )
+
+        self.observation_handler = AsyncObservationHandler(
+            self.main_observation_type,
+            self.text_observation_type,
+            self.image_observation_type,
+            self.current_viewport_only,
+            self.viewport_size,
+            captioning_fn,
+            observation_token_budget,
+            ax_fetch_mode,
+            observation_dialect,
+        )
+
+        self.observation_space = (
+            self.observation_handler.get_observation_space()
+        )
+
+    async def _launch_browser(self) -> None:
         self.context_manager = async_playwright()
         self.playwright = await self.context_manager.__aenter__()
         self.browser = await self.playwright.chromium.launch(
             headless=self.headless, slow_mo=self.slow_mo
         )
+
+    async def _shutdown_browser(self) -> None:
+        if self.context_manager is None:
+            return
+        try:
+            await self.context_manager.__aexit__()
+        except Exception as e:
+            print(f"WARNING: failed to shut down the browser cleanly: {e}")
+        self.context_manager = None
+
+    def browser_is_healthy(self) -> bool:
+        if self.context_manager is None:
+            return False
+        try:
+            return self.browser.is_connected()
+        except Exception:
+            return False
+
+    def _load_instance_config(self, config_file: Path | None) -> dict[str, Any]:
         if config_file:
             with open(config_file, "r") as f:
-                instance_config = json.load(f)
-        else:
-            instance_config = {}
+                return json.load(f)
+        return {}
+
+    def _reset_manager(self) -> SiteResetManager:
+        if self.site_reset_manager is None:
+            self.site_reset_manager = build_site_reset_manager()
+        return self.site_reset_manager
 
+    def _reset_sites(self, instance_config: dict[str, Any]) -> None:
+        # a manager that was never used has no dirty sites, so only a task
+        # that requires a reset needs it; building it reads all site URLs
+        if self.site_reset_manager is None and not instance_config.get(
+            "require_reset", False
+        ):
+            return
+        self._reset_manager().before_task(instance_config)
+
+    async def _new_context(
+        self, instance_config: dict[str, Any]
+    ) -> tuple[BrowserContext, ViewportSize]:
         storage_state = instance_config.get("storage_state", None)
-        start_url = instance_config.get("start_url", None)
         geolocation = instance_config.get("geolocation", None)
 
-        self.context = await self.browser.new_context(
-            viewport=self.viewport_size,
+        # Use custom viewport size if specified in the config, otherwise use the default.
+        viewport_size = self.viewport_size.copy()
+        viewport_size.update(instance_config.get("viewport_size", {}))
+
+        context = await self.browser.new_context(
+            viewport=viewport_size,
             storage_state=storage_state,
             geolocation=geolocation,
             device_scale_factor=1,
         )
-        self.page = await self.context.new_page()
-        if start_url:
-            await self.page.goto(start_url)
+        if (
+            self.text_observation_type == "webrl"
+            or self.image_observation_type == "image_som"
+        ):
+            await ainstall_page_scripts(context)
+        return context, viewport_size
+
+    @beartype
+    async def setup(self, config_file: Path | None = None) -> None:
+        if not self.browser_is_healthy():
+            if self.context_manager is not None:
+                print("WARNING: browser is not responding, relaunching it.")
+            await self._shutdown_browser()
+            await self._launch_browser()
+
+        instance_config = self._load_instance_config(config_file)
+        # resets block on the sites, keep the loop free for other envs
+        await asyncio.to_thread(
+            self._reset_sites, instance_config
+        )
+
+        start_url = instance_config.get("start_url", None)
+        start_urls = start_url.split(" |AND| ") if start_url else []
+        self.context, viewport_size = await self._new_context(instance_config)
+        self.observation_handler.viewport_size = viewport_size
+
+        pages = [await self.context.new_page() for _ in start_urls or [None]]
+        self.page = pages[0]
+        # Enable accessibility tree for all pages
+        if self.text_observation_type == "accessibility_tree":
+            for page in pages:
+                client = await self.context.new_cdp_session(page)
+                await client.send("Accessibility.enable")
+
+        # the tabs load concurrently; focus them in order afterwards so the
+        # tab order and the focused tab match the sync environment
+        await asyncio.gather(
+            *[page.goto(url) for page, url in zip(pages, start_urls)]
+        )
+        for page in pages:
+            await page.bring_to_front()
+        await self.page.bring_to_front()
+
+    async def _get_obs(self) -> dict[str, Observation]:
+        return await self.observation_handler.aget_observation(self.page)
+
+    def _get_obs_metadata(self) -> dict[str, ObservationMetadata]:
+        return self.observation_handler.get_observation_metadata()
 
     @beartype
     async def areset(
@@ -79,82 +211,142 @@ class AsyncScriptBrowserEnv(Env[npt.NDArray[np.uint8], Action]):
         *,
         seed: int | None = None,
         options: dict[str, str] | None = None,
-    ) -> tuple[npt.NDArray[np.uint8], dict[str, object]]:
+    ) -> tuple[dict[str, Observation], dict[str, Any]]:
         """
         Reset the environment.
-        :param options: options for the environment. The options are:
-            - storage_state: the path to the storage state file
+        :param options: options for the environment. The current supported options are:
+            - "config_file": the path to the task config file
         """
         super().reset(seed=seed, options=options)
         if self.reset_finished:
-            await self.context_manager.__aexit__()
+            if self.reuse_browser:
+                try:
+                    await self.context.close()
+                except Exception as e:
+                    print(f"WARNING: failed to close the browser context: {e}")
+            else:
+                await self._shutdown_browser()
+
         if options is not None and "config_file" in options:
             config_file = Path(options["config_file"])
             if config_file.exists():
                 await self.setup(config_file=config_file)
             else:
-                raise ValueError(f"Config state {config_file} does not exist.")
+                raise ValueError(f"Config file {config_file} does not exist.")
         else:
             await self.setup()
         self.reset_finished = True
-        content = await self.page.content()
-        screenshot = png_bytes_to_numpy(await self.page.screenshot())
-        return (
-            screenshot,
-            {"page": DetachedPage(self.page.url, content)},
-        )
+        timeout_in_ms = 120000
+        self.page.set_default_timeout(timeout_in_ms)
+        self.page.set_default_navigation_timeout(timeout_in_ms)
+        await self.page.wait_for_timeout(int(self.sleep_after_execution * 1000))
 
-    @beartype
-    def reset(
-        self,
-        *,
-        seed: int | None = None,
-        options: dict[str, str] | None = None,
-    ) -> tuple[npt.NDArray[np.uint8], dict[str, object]]:
-        return asyncio.run(self.areset(seed=seed, options=options))
-
-    async def aclose(self) -> None:
-        if self.reset_finished:
-            await self.context_manager.__aexit__()
+        observation = await self._get_obs()
+        observation_metadata = self._get_obs_metadata()
+        info = {
+            "state_info": {
+                "observation": observation,
+                "info": {
+                    "page": DetachedPage(self.page.url, ""),
+                    "fail_error": "",
+                    "observation_metadata": observation_metadata,
+                },
+            },
+            "step_stats": {
+                "observation_time": dict(self.observation_handler.timings),
+                "ax_fetch": (
+                    self.observation_handler.text_processor.pop_ax_fetch_stats()
+                ),
+            },
+        }
 
-    def close(self) -> None:
-        asyncio.run(self.aclose())
+        return (observation, info)
 
     @beartype
     async def astep(
         self, action: Action
-    ) -> tuple[npt.NDArray[np.uint8], float, bool, bool, dict[str, object]]:
+    ) -> tuple[dict[str, Observation], float, bool, bool, dict[str, Any]]:
         if not self.reset_finished:
             raise RuntimeError("Call reset first before calling step.")
+
         success = False
         fail_error = ""
         try:
-            self.page = await aexecute_action(action, self.page, self.context)
+            if self.text_observation_type == "webrl":
+                self.page = await aexecute_action_webrl(
+                    action,
+                    self.page,
+                    self.context,
+                    self.observation_handler.action_processor,
+                    self.sleep_after_execution,
+                )
+            else:
+                self.page = await aexecute_action(
+                    action,
+                    self.page,
+                    self.context,
+                    self.observation_handler.action_processor,
+                    self.sleep_after_execution,
+                )
             success = True
         except Exception as e:
             fail_error = str(e)
 
-        try:
-            content = await self.page.content()
-            screenshot = png_bytes_to_numpy(await self.page.screenshot())
-        except:
-            await self.page.wait_for_load_state("load")
-            content = await self.page.content()
-            screenshot = png_bytes_to_numpy(await self.page.screenshot())
+        observation = await self._get_obs()
+        observation_metadata = self._get_obs_metadata()
 
-        return (
-            screenshot,
-            float(success),
-            False,
-            False,
-            {
-                "page": DetachedPage(self.page.url, content),
-                "fail_error": fail_error,
+        info = {
+            "state_info": {
+                "observation": observation,
+                "info": {
+                    "page": DetachedPage(self.page.url, await self.page.content()),
+                    "fail_error": fail_error,
+                    "observation_metadata": observation_metadata,
+                },
             },
+            "step_stats": {
+                "observation_time": dict(self.observation_handler.timings),
+                "ax_fetch": (
+                    self.observation_handler.text_processor.pop_ax_fetch_stats()
+                ),
+            },
+        }
+        return (
+            observation,
+            float(success),  # reward
+            False,  # terminated
+            False,  # truncated
+            info,
         )
 
+    async def aclose(self) -> None:
+        await self._shutdown_browser()
+
+    def _run(self, coroutine: Any) -> Any:
+        # one loop for the lifetime of the environment: the Playwright
+        # connection is bound to the loop it was created on
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(coroutine)
+
+    @beartype
+    def reset(
+        self,
+        *,
+        seed: int | None = None,
+        options: dict[str, str] | None = None,
+    ) -> tuple[dict[str, Observation], dict[str, Any]]:
+        return self._run(self.areset(seed=seed, options=options))
+
     @beartype
     def step(
         self, action: Action
-    ) -> tuple[npt.NDArray[np.uint8], float, bool, bool, dict[str, object]]:
-        return asyncio.run(self.astep(action), debug=True)
+    ) -> tuple[dict[str, Observation], float, bool, bool, dict[str, Any]]:
+        return self._run(self.astep(action))
+
+    def close(self) -> None:
+        if self.loop is None:
+            return
+        self._run(self.aclose())
+        self.loop.close()
+        self.loop = None
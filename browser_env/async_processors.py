@@ -0,0 +1,410 @@
+"""Observation processors for the async Playwright API.
+
+The processors reuse the parsing, pruning and drawing of their sync
+counterparts in processors.py and only replace the calls into the browser
+with `a`-prefixed coroutines, so that many environments can share one event
+loop.
+"""
+import asyncio
+import time
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+from playwright.async_api import CDPSession, Page, ViewportSize
+
+from .html_tools.fetch import acall_page_script, aget_parsed_html
+from .processors import (
+    BOUNDING_CLIENT_RECT_FUNCTION,
+    DOM_SNAPSHOT_PARAMS,
+    MAX_PARTIAL_AX_FETCHES,
+    WINDOW_METRICS_SCRIPT,
+    ImageObservationProcessor,
+    ObservationHandler,
+    TextObervationProcessor,
+    TextObervationProcessorWebRL,
+    assemble_partial_accessibility_tree,
+    calibrate_dom_snapshot,
+    create_browser_config,
+    format_tab_titles,
+    union_bound_from_rect,
+    viewport_backend_node_ids,
+)
+from .utils import (
+    AccessibilityTree,
+    AccessibilityTreeNode,
+    BrowserInfo,
+    DOMTree,
+    Observation,
+    png_bytes_to_numpy,
+)
+
+
+async def afetch_browser_info(page: Page, viewport_size: ViewportSize) -> BrowserInfo:
+    client = await page.context.new_cdp_session(page)
+    # extract domtree
+    tree = await client.send("DOMSnapshot.captureSnapshot", DOM_SNAPSHOT_PARAMS)
+    await client.detach()
+    calibrate_dom_snapshot(tree, viewport_size)
+
+    # extract browser info
+    config = create_browser_config(*await page.evaluate(WINDOW_METRICS_SCRIPT))
+
+    info: BrowserInfo = {"DOMTree": tree, "config": config}
+    return info
+
+
+async def afetch_browser_info_with_retry(
+    page: Page, viewport_size: ViewportSize
+) -> BrowserInfo:
+    try:
+        return await afetch_browser_info(page, viewport_size)
+    except Exception:
+        await page.wait_for_load_state("load", timeout=500)
+        return await afetch_browser_info(page, viewport_size)
+
+
+async def aget_bounding_client_rect(
+    client: CDPSession, backend_node_id: str
+) -> dict[str, Any]:
+    try:
+        remote_object = await client.send(
+            "DOM.resolveNode", {"backendNodeId": int(backend_node_id)}
+        )
+        remote_object_id = remote_object["object"]["objectId"]
+        response = await client.send(
+            "Runtime.callFunctionOn",
+            {
+                "objectId": remote_object_id,
+                "functionDeclaration": BOUNDING_CLIENT_RECT_FUNCTION,
+                "returnByValue": True,
+            },
+        )
+        return response
+    except Exception:
+        return {"result": {"subtype": "error"}}
+
+
+class AsyncTextObervationProcessor(TextObervationProcessor):
+    async def afetch_browser_info(self, page: Page) -> BrowserInfo:
+        return await afetch_browser_info(page, self.viewport_size)
+
+    async def afetch_page_html(
+        self,
+        info: BrowserInfo,
+        page: Page,
+        current_viewport_only: bool,
+    ) -> DOMTree:
+        dom_tree = self.build_dom_tree(info["DOMTree"])
+
+        # get the bounds; the requests are independent, so they are sent
+        # together over one session
+        client = await page.context.new_cdp_session(page)
+        nodes = [node for node in dom_tree if node["parentId"] != "-1"]
+        responses = await asyncio.gather(
+            *[
+                aget_bounding_client_rect(client, node["backendNodeId"])
+                for node in nodes
+            ]
+        )
+        await client.detach()
+        for node, response in zip(nodes, responses):
+            node["union_bound"] = union_bound_from_rect(response)
+
+        if current_viewport_only:
+            dom_tree = self.filter_dom_tree_by_viewport(dom_tree, info["config"])
+
+        return dom_tree
+
+    async def afetch_viewport_accessibility_tree(
+        self, client: CDPSession, info: BrowserInfo
+    ) -> AccessibilityTree | None:
+        nodes: dict[str, AccessibilityTreeNode] = {}
+        covered: set[int] = set()
+        fetches = 0
+        for backend_node_id in viewport_backend_node_ids(info):
+            if backend_node_id in covered:
+                continue
+            if fetches == MAX_PARTIAL_AX_FETCHES:
+                self.ax_fetch_stats["full_fallbacks"] += 1
+                return None
+            fetches += 1
+            self.ax_fetch_stats["partial_fetches"] += 1
+            try:
+                response = await client.send(
+                    "Accessibility.getPartialAXTree",
+                    {"backendNodeId": backend_node_id, "fetchRelatives": True},
+                )
+            except Exception:
+                continue
+            for node in response["nodes"]:
+                nodes.setdefault(node["nodeId"], node)
+                if "backendDOMNodeId" in node:
+                    covered.add(node["backendDOMNodeId"])
+        if not nodes:
+            self.ax_fetch_stats["full_fallbacks"] += 1
+            return None
+        return assemble_partial_accessibility_tree(nodes)
+
+    async def aadd_union_bounds(
+        self, client: CDPSession, accessibility_tree: AccessibilityTree
+    ) -> None:
+        nodes = []
+        for node in accessibility_tree:
+            # usually because the node is not visible etc
+            if "backendDOMNodeId" not in node:
+                node["union_bound"] = None
+            elif node["role"]["value"] == "RootWebArea":
+                # always inside the viewport
+                node["union_bound"] = [0.0, 0.0, 10.0, 10.0]
+            else:
+                nodes.append(node)
+        responses = await asyncio.gather(
+            *[
+                aget_bounding_client_rect(client, str(node["backendDOMNodeId"]))
+                for node in nodes
+            ]
+        )
+        for node, response in zip(nodes, responses):
+            node["union_bound"] = union_bound_from_rect(response)
+
+    async def afetch_page_accessibility_tree(
+        self,
+        page: Page,
+        info: BrowserInfo,
+        current_viewport_only: bool,
+    ) -> AccessibilityTree:
+        client = await page.context.new_cdp_session(page)
+        accessibility_tree = None
+        if current_viewport_only and self.ax_fetch_mode != "full":
+            accessibility_tree = await self.afetch_viewport_accessibility_tree(
+                client, info
+            )
+        check_viewport_fetch = (
+            accessibility_tree is not None and self.ax_fetch_mode == "check"
+        )
+        if accessibility_tree is None:
+            accessibility_tree = (
+                await client.send("Accessibility.getFullAXTree", {})
+            )["nodes"]
+        accessibility_tree = self.dedupe_accessibility_tree(accessibility_tree)
+        await self.aadd_union_bounds(client, accessibility_tree)
+
+        # filter nodes that are not in the current viewport
+        if current_viewport_only:
+            accessibility_tree = self.filter_accessibility_tree_by_viewport(
+                accessibility_tree, info["config"]
+            )
+        if check_viewport_fetch:
+            full_tree = self.dedupe_accessibility_tree(
+                (await client.send("Accessibility.getFullAXTree", {}))["nodes"]
+            )
+            await self.aadd_union_bounds(client, full_tree)
+            full_tree = self.filter_accessibility_tree_by_viewport(
+                full_tree, info["config"]
+            )
+            accessibility_tree = self.compare_viewport_accessibility_tree(
+                accessibility_tree, full_tree
+            )
+
+        await client.detach()
+        return accessibility_tree
+
+    async def aprocess(
+        self, page: Page, browser_info: BrowserInfo | None = None
+    ) -> str:
+        # get the tab info
+        open_tabs = page.context.pages
+        try:
+            tab_titles = [await tab.title() for tab in open_tabs]
+            tab_title_str = format_tab_titles(tab_titles, open_tabs.index(page))
+        except Exception:
+            tab_title_str = " | ".join([f"Tab {idx}" for idx in range(len(open_tabs))])
+
+        if browser_info is None:
+            browser_info = await afetch_browser_info_with_retry(
+                page, self.viewport_size
+            )
+
+        if self.observation_type == "html":
+            dom_tree = await self.afetch_page_html(
+                browser_info,
+                page,
+                self.current_viewport_only,
+            )
+            content, obs_nodes_info = self.parse_html(dom_tree)
+            self.obs_nodes_info = obs_nodes_info
+            self.meta_data["obs_nodes_info"] = obs_nodes_info
+
+        elif self.observation_type == "accessibility_tree":
+            accessibility_tree = await self.afetch_page_accessibility_tree(
+                page,
+                browser_info,
+                self.current_viewport_only,
+            )
+            accessibility_tree = self.prune_accessibility_tree(accessibility_tree)
+            content, obs_nodes_info = self.serialize_accessibility_tree(
+                accessibility_tree
+            )
+            self.obs_nodes_info = obs_nodes_info
+            self.meta_data["obs_nodes_info"] = obs_nodes_info
+
+        elif self.observation_type in ["image_som", ""]:
+            # the SoM text comes from the image processor
+            content = ""
+
+        else:
+            raise ValueError(
+                f"Unsupported observation type for the async processor: {self.observation_type}"
+            )
+
+        self.browser_config = browser_info["config"]
+        content = f"{tab_title_str}\n\n{content}"
+
+        return content
+
+
+class AsyncTextObervationProcessorWebRL(TextObervationProcessorWebRL):
+    async def aprocess(
+        self, page: Page, browser_info: BrowserInfo | None = None
+    ) -> str:
+        page_info = await aget_parsed_html(page)
+        html = page_info["html"]
+        self.set_obs_nodes_info(html)
+        return html
+
+    async def aget_element_center(
+        self, element_id: str, page: Page | None = None
+    ) -> tuple[float, float]:
+        if page is None:
+            return self.get_element_center(element_id)
+        element = await page.query_selector(f"[data-label-id='{element_id}']")
+        bbox = await element.bounding_box()
+        center_x = bbox["x"] + bbox["width"] / 2
+        center_y = bbox["y"] + bbox["height"] / 2
+        return (
+            center_x / self.viewport_size["width"],
+            center_y / self.viewport_size["height"],
+        )
+
+
+class AsyncImageObservationProcessor(ImageObservationProcessor):
+    async def aget_page_bboxes(self, page: Page) -> str:
+        return await acall_page_script(page, "pageBboxes")
+
+    async def afetch_browser_info(self, page: Page) -> BrowserInfo:
+        return await afetch_browser_info(page, self.viewport_size)
+
+    async def aprocess(
+        self, page: Page, browser_info: BrowserInfo | None = None
+    ) -> tuple[npt.NDArray[np.uint8], str]:
+        if browser_info is None:
+            browser_info = await afetch_browser_info_with_retry(
+                page, self.viewport_size
+            )
+
+        self.browser_config = browser_info["config"]
+
+        if self.observation_type == "image_som":
+            # Produce the SoM image, with bounding boxes
+            try:
+                return self.build_som_observation(
+                    await page.screenshot(), await self.aget_page_bboxes(page)
+                )
+            except Exception:
+                await page.wait_for_event("load")
+                return self.build_som_observation(
+                    await page.screenshot(), await self.aget_page_bboxes(page)
+                )
+        else:
+            try:
+                screenshot = png_bytes_to_numpy(await page.screenshot())
+            except Exception:
+                await page.wait_for_event("load")
+                screenshot = png_bytes_to_numpy(await page.screenshot())
+            return screenshot, ""
+
+
+class AsyncObservationHandler(ObservationHandler):
+    """Async counterpart of ObservationHandler"""
+
+    def __init__(
+        self,
+        main_observation_type: str,
+        text_observation_type: str,
+        image_observation_type: str,
+        current_viewport_only: bool,
+        viewport_size: ViewportSize,
+        captioning_fn=None,
+        observation_token_budget: int = 0,
+        ax_fetch_mode: str = "full",
+        observation_dialect: str = "default",
+    ) -> None:
+        # captioning calls a local model between page reads, which would
+        # block the loop shared by all environments
+        if (
+            text_observation_type == "accessibility_tree_with_captioner"
+            or captioning_fn is not None
+        ):
+            raise ValueError("Captioning is not supported by the async environment")
+        self.main_observation_type = main_observation_type
+        if text_observation_type == "webrl":
+            self.text_processor = AsyncTextObervationProcessorWebRL(
+                text_observation_type,
+                current_viewport_only,
+                viewport_size,
+                captioning_fn,
+                observation_token_budget,
+                ax_fetch_mode,
+                observation_dialect,
+            )
+        else:
+            self.text_processor = AsyncTextObervationProcessor(
+                text_observation_type,
+                current_viewport_only,
+                viewport_size,
+                captioning_fn,
+                observation_token_budget,
+                ax_fetch_mode,
+                observation_dialect,
+            )
+        self.image_processor = AsyncImageObservationProcessor(
+            image_observation_type, viewport_size
+        )
+        self.viewport_size = viewport_size
+        self.timings: dict[str, float] = {}
+
+    async def aget_observation(self, page: Page) -> dict[str, Observation]:
+        async def timed(name: str, coroutine: Any) -> Any:
+            part_start = time.perf_counter()
+            result = await coroutine
+            self.timings[name] = time.perf_counter() - part_start
+            return result
+
+        self.timings = {}
+        start = time.perf_counter()
+        # both processors read the same DOM snapshot and window metrics
+        browser_info = await timed(
+            "browser_info",
+            afetch_browser_info_with_retry(page, self.image_processor.viewport_size),
+        )
+        text_coroutine = timed(
+            "text", self.text_processor.aprocess(page, browser_info)
+        )
+        image_coroutine = timed(
+            "image", self.image_processor.aprocess(page, browser_info)
+        )
+        if self.text_processor.observation_type == "webrl":
+            # the WebRL parser draws labels into the page, which must not
+            # show up in the screenshot
+            text_obs = await text_coroutine
+            image_obs, content_str = await image_coroutine
+        else:
+            # Chromium serves the screenshot while the DOM and AX queries run
+            text_obs, (image_obs, content_str) = await asyncio.gather(
+                text_coroutine, image_coroutine
+            )
+        self.timings["total"] = time.perf_counter() - start
+        if content_str != "":
+            text_obs = content_str
+        return {"text": text_obs, "image": image_obs}
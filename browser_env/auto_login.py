@@ -1,12 +1,14 @@
 """Script to automatically login each website"""
 import argparse
 import glob
+import json
 import os
 import time
 from concurrent.futures import ThreadPoolExecutor
 from itertools import combinations
 from pathlib import Path
 
+import requests
 from playwright.sync_api import sync_playwright
 from browser_env.env_config import ACCOUNTS
 
@@ -50,12 +52,65 @@ SLOW_MO = 0
 
 assert len(SITES) == len(URLS) == len(EXACT_MATCH) == len(KEYWORDS)
 
+def _cookie_jar(storage_state: dict) -> requests.cookies.RequestsCookieJar:
+    """The cookies of `storage_state`, scoped to their domain and path"""
+    jar = requests.cookies.RequestsCookieJar()
+    for cookie in storage_state.get("cookies", []):
+        expires = cookie.get("expires", -1)
+        if 0 < expires < time.time():
+            continue
+        jar.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain", ""),
+            path=cookie.get("path", "/"),
+            secure=cookie.get("secure", False),
+            # playwright marks session cookies with -1
+            expires=int(expires) if expires > 0 else None,
+        )
+    return jar
+
+
+def probe_is_expired(
+    storage_state: Path | dict, url: str, keyword: str, url_exact: bool = True
+) -> bool:
+    """Test whether the cookie is expired with a plain HTTP request"""
+    if isinstance(storage_state, Path):
+        if not storage_state.exists():
+            return True
+        with open(storage_state, "r") as f:
+            storage_state = json.load(f)
+    # the session keeps sending the cookies, and any set on the way, when
+    # the probe is redirected
+    with requests.Session() as session:
+        session.cookies = _cookie_jar(storage_state)
+        try:
+            response = session.get(url, timeout=30)
+        except requests.RequestException:
+            return True
+    if keyword:
+        return keyword not in response.text
+    else:
+        if url_exact:
+            return response.url != url
+        else:
+            return url not in response.url
+
+
 def is_expired(
-    storage_state: Path, url: str, keyword: str, url_exact: bool = True
+    storage_state: Path,
+    url: str,
+    keyword: str,
+    url_exact: bool = True,
+    use_browser: bool = False,
 ) -> bool:
     """Test whether the cookie is expired"""
     if not storage_state.exists():
         return True
+    # the checked pages are rendered by the server, so a plain request sees
+    # the same content as a browser
+    if not use_browser:
+        return probe_is_expired(storage_state, url, keyword, url_exact)
 
     context_manager = sync_playwright()
     playwright = context_manager.__enter__()
@@ -0,0 +1,304 @@
+"""Keep a live copy of each page's accessibility tree.
+
+Instead of calling `Accessibility.getFullAXTree` on every step, the mirror
+fetches the tree once per document and then follows CDP change events:
+- `Accessibility.nodesUpdated` replaces the nodes it reports
+- `DOM.childNodeInserted`/`Removed`, `DOM.attributeModified`/`Removed` and
+  `DOM.characterDataModified` mark the closest AX node of the changed DOM
+  node dirty; dirty subtrees are fetched again before the tree is read, or
+  the full tree when the root or a large subtree is dirty
+- `Accessibility.loadComplete`, `DOM.documentUpdated` and main frame
+  navigations drop the mirror, and the next read fetches the full tree
+
+With `check=True` every read is compared against a full fetch. Mismatches
+are reported, and the full tree is used and becomes the new mirror, so the
+mode is safe to run while testing the mirror on real tasks.
+"""
+from typing import Any
+
+from playwright.sync_api import CDPSession, Page
+
+from .utils import AccessibilityTree, AccessibilityTreeNode
+
+# above this many dirty subtrees a full fetch is cheaper
+MAX_DIRTY_SUBTREES = 50
+# a dirty subtree is read again with one getChildAXNodes call per node, so
+# above this many cached nodes under a dirty root a full fetch is cheaper
+MAX_REFRESHED_SUBTREE_NODES = 100
+
+
+def compare_ax_trees(
+    mirror: AccessibilityTree, full: AccessibilityTree
+) -> list[str]:
+    """Differences between two AX trees, as readable messages"""
+    mirror_nodes = {node["nodeId"]: node for node in mirror}
+    full_nodes = {node["nodeId"]: node for node in full}
+    mismatches = [f"missing {node_id}" for node_id in full_nodes.keys() - mirror_nodes.keys()]
+    mismatches += [f"stale {node_id}" for node_id in mirror_nodes.keys() - full_nodes.keys()]
+    for node_id in full_nodes.keys() & mirror_nodes.keys():
+        a, b = mirror_nodes[node_id], full_nodes[node_id]
+        for key in ["role", "name", "value", "childIds", "ignored"]:
+            if a.get(key) != b.get(key):
+                mismatches.append(f"{node_id} differs in {key}")
+    return mismatches
+
+
+class PageAXMirror:
+    def __init__(self, page: Page) -> None:
+        self.client: CDPSession = page.context.new_cdp_session(page)
+        self.nodes: dict[str, AccessibilityTreeNode] = {}
+        self.root_id: str | None = None
+        self.backend_to_ax: dict[int, str] = {}
+        # DOM frontend node id -> backend node id and parent node id
+        self.dom_backend: dict[int, int] = {}
+        self.dom_parent: dict[int, int] = {}
+        self.dirty: set[str] = set()
+        self.stale = True
+        self.patched_nodes = 0
+        self.full_fetches = 0
+        self.document_fetches = 0
+
+        self.client.on("Accessibility.nodesUpdated", self._on_nodes_updated)
+        self.client.on("Accessibility.loadComplete", self._invalidate)
+        self.client.on("DOM.documentUpdated", self._invalidate)
+        self.client.on("DOM.setChildNodes", self._on_set_child_nodes)
+        self.client.on("DOM.childNodeInserted", self._on_child_inserted)
+        self.client.on("DOM.childNodeRemoved", self._on_child_removed)
+        for event in [
+            "DOM.attributeModified",
+            "DOM.attributeRemoved",
+            "DOM.characterDataModified",
+        ]:
+            self.client.on(event, self._on_node_changed)
+        page.on(
+            "framenavigated",
+            lambda frame: self._invalidate() if frame == page.main_frame else None,
+        )
+        self.client.send("Accessibility.enable")
+        self.client.send("DOM.enable")
+
+    # event handlers
+
+    def _invalidate(self, *_: Any) -> None:
+        self.stale = True
+
+    def _on_nodes_updated(self, event: dict[str, Any]) -> None:
+        for node in event["nodes"]:
+            if node["nodeId"] not in self.nodes:
+                continue
+            self._index(node)
+            # children the mirror has not seen need their subtree fetched
+            if any(child_id not in self.nodes for child_id in node.get("childIds", [])):
+                self.dirty.add(node["nodeId"])
+
+    def _track_dom(self, node: dict[str, Any], parent_id: int | None) -> None:
+        stack = [(node, parent_id)]
+        while stack:
+            node, parent_id = stack.pop()
+            self.dom_backend[node["nodeId"]] = node["backendNodeId"]
+            if parent_id is not None:
+                self.dom_parent[node["nodeId"]] = parent_id
+            for child in node.get("children", []):
+                stack.append((child, node["nodeId"]))
+
+    def _on_set_child_nodes(self, event: dict[str, Any]) -> None:
+        for node in event["nodes"]:
+            self._track_dom(node, event["parentId"])
+
+    def _on_child_inserted(self, event: dict[str, Any]) -> None:
+        self._track_dom(event["node"], event["parentNodeId"])
+        self._mark_dirty(event["parentNodeId"])
+
+    def _on_child_removed(self, event: dict[str, Any]) -> None:
+        self._mark_dirty(event["parentNodeId"])
+
+    def _on_node_changed(self, event: dict[str, Any]) -> None:
+        self._mark_dirty(event["nodeId"])
+
+    def _mark_dirty(self, dom_node_id: int) -> None:
+        """Mark the AX node of the DOM node, or of its closest ancestor"""
+        while dom_node_id is not None:
+            backend_id = self.dom_backend.get(dom_node_id)
+            if backend_id in self.backend_to_ax:
+                self.dirty.add(self.backend_to_ax[backend_id])
+                return
+            dom_node_id = self.dom_parent.get(dom_node_id)
+        self.stale = True
+
+    # mirror maintenance
+
+    def _index(self, node: AccessibilityTreeNode) -> None:
+        self.nodes[node["nodeId"]] = node
+        if "backendDOMNodeId" in node:
+            self.backend_to_ax[node["backendDOMNodeId"]] = node["nodeId"]
+
+    def _remove_subtree(self, node_id: str, keep_root: bool) -> None:
+        stack = [node_id]
+        while stack:
+            current = stack.pop()
+            node = self.nodes.get(current)
+            if node is None:
+                continue
+            stack.extend(node.get("childIds", []))
+            if keep_root and current == node_id:
+                continue
+            del self.nodes[current]
+            if self.backend_to_ax.get(node.get("backendDOMNodeId")) == current:
+                del self.backend_to_ax[node["backendDOMNodeId"]]
+
+    def load(self, nodes: AccessibilityTree) -> None:
+        self.nodes, self.backend_to_ax = {}, {}
+        for node in nodes:
+            self._index(node)
+        self.root_id = nodes[0]["nodeId"] if nodes else None
+        self.dirty = set()
+        self.stale = False
+
+    def full_fetch(self) -> AccessibilityTree:
+        # DOM events are only sent for nodes known to this session
+        document = self.client.send("DOM.getDocument", {"depth": -1})
+        self.document_fetches += 1
+        self.dom_backend, self.dom_parent = {}, {}
+        self._track_dom(document["root"], None)
+        nodes = self.client.send("Accessibility.getFullAXTree", {})["nodes"]
+        self.full_fetches += 1
+        self.load(nodes)
+        return nodes
+
+    def _refresh_subtree(self, node_id: str) -> bool:
+        """Fetch a dirty subtree again; False if the node has disappeared"""
+        node = self.nodes.get(node_id)
+        if node is None or "backendDOMNodeId" not in node:
+            return False
+        response = self.client.send(
+            "Accessibility.getPartialAXTree",
+            {"backendNodeId": node["backendDOMNodeId"], "fetchRelatives": False},
+        )
+        fresh = [n for n in response["nodes"] if n["nodeId"] == node_id]
+        if not fresh:
+            return False
+        self._remove_subtree(node_id, keep_root=True)
+        self._index(fresh[0])
+        pending = [node_id]
+        while pending:
+            parent_id = pending.pop()
+            children = self.client.send(
+                "Accessibility.getChildAXNodes", {"id": parent_id}
+            )["nodes"]
+            for child in children:
+                if child.get("parentId") != parent_id:
+                    continue
+                self._index(child)
+                self.patched_nodes += 1
+                pending.append(child["nodeId"])
+        return True
+
+    def _subtree_exceeds(self, node_id: str, limit: int) -> bool:
+        """Whether more than `limit` cached nodes are under `node_id`"""
+        stack = list(self.nodes.get(node_id, {}).get("childIds", []))
+        size = 0
+        while stack:
+            node = self.nodes.get(stack.pop())
+            if node is None:
+                continue
+            size += 1
+            if size > limit:
+                return True
+            stack.extend(node.get("childIds", []))
+        return False
+
+    def _has_dirty_ancestor(self, node_id: str) -> bool:
+        parent_id = self.nodes.get(node_id, {}).get("parentId")
+        while parent_id is not None:
+            if parent_id in self.dirty:
+                return True
+            parent_id = self.nodes.get(parent_id, {}).get("parentId")
+        return False
+
+    def tree(self) -> AccessibilityTree:
+        """Current AX tree, in depth-first order from the root"""
+        if self.stale or self.root_id is None or len(self.dirty) > MAX_DIRTY_SUBTREES:
+            self.full_fetch()
+        else:
+            roots = [
+                node_id for node_id in self.dirty if not self._has_dirty_ancestor(node_id)
+            ]
+            self.dirty = set()
+            if any(
+                node_id == self.root_id
+                or self._subtree_exceeds(node_id, MAX_REFRESHED_SUBTREE_NODES)
+                for node_id in roots
+            ):
+                self.full_fetch()
+            else:
+                for node_id in roots:
+                    if not self._refresh_subtree(node_id):
+                        self.full_fetch()
+                        break
+        ordered = []
+        stack = [self.root_id]
+        while stack:
+            node = self.nodes.get(stack.pop())
+            if node is None:
+                continue
+            ordered.append(node)
+            stack.extend(reversed(node.get("childIds", [])))
+        # the processors rewrite childIds and parentId while filtering
+        return [{**node, "childIds": list(node.get("childIds", []))} for node in ordered]
+
+    def close(self) -> None:
+        try:
+            self.client.detach()
+        except Exception:
+            pass
+
+
+class AXMirror:
+    """Accessibility tree mirrors of all pages of the environment"""
+
+    def __init__(self, check: bool = False) -> None:
+        self.check = check
+        self.mirrors: dict[Page, PageAXMirror] = {}
+        self.mismatched_reads = 0
+
+    def _mirror(self, page: Page) -> PageAXMirror:
+        if page not in self.mirrors:
+            self.mirrors[page] = PageAXMirror(page)
+            page.on("close", lambda _: self.mirrors.pop(page, None))
+        return self.mirrors[page]
+
+    def tree(self, page: Page) -> AccessibilityTree:
+        mirror = self._mirror(page)
+        tree = mirror.tree()
+        if not self.check:
+            return tree
+        full = mirror.client.send("Accessibility.getFullAXTree", {})["nodes"]
+        mismatches = compare_ax_trees(tree, full)
+        if mismatches:
+            self.mismatched_reads += 1
+            print(
+                f"WARNING: AX mirror differs from the full tree in {len(mismatches)} places, e.g. {mismatches[:5]}"
+            )
+            mirror.load(full)
+            return [{**node, "childIds": list(node.get("childIds", []))} for node in full]
+        return tree
+
+    def pop_stats(self) -> dict[str, int]:
+        stats = {
+            "full_fetches": sum(m.full_fetches for m in self.mirrors.values()),
+            "document_fetches": sum(
+                m.document_fetches for m in self.mirrors.values()
+            ),
+            "patched_nodes": sum(m.patched_nodes for m in self.mirrors.values()),
+            "mismatched_reads": self.mismatched_reads,
+        }
+        for mirror in self.mirrors.values():
+            mirror.full_fetches = mirror.document_fetches = 0
+            mirror.patched_nodes = 0
+        self.mismatched_reads = 0
+        return stats
+
+    def reset(self) -> None:
+        for mirror in self.mirrors.values():
+            mirror.close()
+        self.mirrors = {}
@@ -0,0 +1,75 @@
+"""One Chromium per host, shared by several runner processes.
+
+Start the server once:
+
+    python -m browser_env.browser_server --port 9222
+
+and pass `--browser_endpoint http://localhost:9222` to each `run.py`. Every
+environment then connects over CDP and creates its own browser contexts in
+the shared browser instead of launching a Chromium of its own.
+
+Crash isolation and reconnection:
+- Contexts do not share cookies, storage or cache, and every site runs in
+  its own renderer process, so a crashed or hung page only affects the
+  environment that owns it.
+- If the browser process itself dies, all connected environments lose
+  their current context. The server launches a new browser on the same
+  port; each environment notices the dropped connection in
+  `browser_is_healthy()` at its next reset and reconnects, retrying with
+  backoff while the server restarts. The task that was running fails.
+- Contexts created over a connection are disposed when that connection
+  closes, so a runner that exits or crashes does not leak its contexts.
+"""
+import argparse
+import time
+
+from playwright.sync_api import Browser, Playwright, sync_playwright
+
+
+def connect(
+    playwright: Playwright,
+    endpoint: str,
+    retries: int = 5,
+    initial_delay: float = 1.0,
+) -> Browser:
+    """Connect to a shared browser, waiting for it if it is restarting"""
+    delay = initial_delay
+    for attempt in range(retries):
+        try:
+            return playwright.chromium.connect_over_cdp(endpoint)
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            print(f"WARNING: cannot reach browser at {endpoint} ({e}), retrying.")
+            time.sleep(delay)
+            delay *= 2
+    raise RuntimeError("unreachable")
+
+
+def serve(port: int, headless: bool = True) -> None:
+    """Run a browser with a CDP endpoint and relaunch it if it dies"""
+    with sync_playwright() as playwright:
+        while True:
+            browser = playwright.chromium.launch(
+                headless=headless,
+                args=[f"--remote-debugging-port={port}"],
+            )
+            print(f"Browser listening on http://localhost:{port}")
+            # waiting through Playwright notices when the browser goes away
+            keepalive = browser.new_page()
+            try:
+                while True:
+                    keepalive.wait_for_timeout(1000)
+            except KeyboardInterrupt:
+                browser.close()
+                return
+            except Exception:
+                print("WARNING: browser exited, relaunching it.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9222)
+    parser.add_argument("--headful", action="store_true")
+    args = parser.parse_args()
+    serve(args.port, headless=not args.headful)
@@ -0,0 +1,180 @@
+"""Compact serialization of the accessibility tree.
+
+The default serialization spends many tokens on boilerplate: bracketed
+accessibility node ids such as `[1744]`, quoted names, full role names,
+properties that only restate their default value, and StaticText children
+that repeat the name of their parent. The compact dialect writes one line
+per node as
+
+    <id> <role>[(<properties>)] <name>
+
+with short ids numbered from 1 in document order, abbreviated roles (see
+ROLE_ABBREVIATIONS), unquoted names, and only the properties that differ
+from their default. Text that is already part of the parent or a recent
+line is dropped, and consecutive text nodes of the same parent are merged
+into one line. The short ids key the node table, so `click [12]` acts on
+the line starting with `12`.
+"""
+from dataclasses import dataclass
+from typing import Any
+
+from .constants import IGNORED_ACTREE_PROPERTIES
+from .pruning import SILENT_ROLES
+from .utils import AccessibilityTree, AccessibilityTreeNode
+
+ROLE_ABBREVIATIONS = {
+    "RootWebArea": "page",
+    "StaticText": "t",
+    "link": "a",
+    "button": "btn",
+    "textbox": "input",
+    "searchbox": "search",
+    "combobox": "select",
+    "checkbox": "check",
+    "heading": "h",
+    "image": "img",
+    "paragraph": "p",
+    "list": "ul",
+    "listitem": "li",
+    "menuitem": "item",
+    "option": "opt",
+    "row": "tr",
+    "cell": "td",
+    "gridcell": "td",
+    "columnheader": "th",
+    "rowheader": "th",
+    "navigation": "nav",
+    "banner": "header",
+    "contentinfo": "footer",
+    "complementary": "aside",
+    "generic": "div",
+    "separator": "hr",
+    "tablist": "tabs",
+    "spinbutton": "number",
+    "progressbar": "progress",
+    "DescriptionListTerm": "dt",
+    "DescriptionListDetail": "dd",
+    "LabelText": "label",
+}
+
+# properties left out when they have their ARIA default value
+DEFAULT_PROPERTY_VALUES = {
+    "required": "false",
+    "disabled": "false",
+    "selected": "false",
+    "checked": "false",
+    "pressed": "false",
+    "hasPopup": "false",
+    "autocomplete": "none",
+    "modal": "false",
+    "multiselectable": "false",
+    "busy": "false",
+    "atomic": "false",
+    "live": "off",
+}
+
+# how many previous lines to search for text that is already shown
+TEXT_LOOKBACK = 3
+
+# roles that are left out when they have neither a name nor properties
+COMPACT_SILENT_ROLES = SILENT_ROLES | {"LineBreak", "StaticText"}
+
+
+@dataclass
+class CompactLine:
+    depth: int
+    role: str
+    name: str
+    properties: list[str]
+    node: AccessibilityTreeNode
+
+
+def compact_properties(node: AccessibilityTreeNode) -> list[str]:
+    properties = []
+    for prop in node.get("properties", []):
+        name = prop.get("name")
+        if name in IGNORED_ACTREE_PROPERTIES or "value" not in prop.get("value", {}):
+            continue
+        value = str(prop["value"]["value"])
+        if DEFAULT_PROPERTY_VALUES.get(name) == value.lower():
+            continue
+        properties.append(name if value.lower() == "true" else f"{name}={value}")
+    return properties
+
+
+def _collect_lines(accessibility_tree: AccessibilityTree) -> list[CompactLine]:
+    """Nodes that parse_accessibility_tree would show, in document order"""
+    nodes = {node["nodeId"]: node for node in accessibility_tree}
+    lines = []
+    stack = [(accessibility_tree[0]["nodeId"], 0)]
+    while stack:
+        node_id, depth = stack.pop()
+        node = nodes[node_id]
+        # ignored nodes have no name, invisible ones no DOM node
+        visible = all(key in node for key in ["role", "name", "backendDOMNodeId"])
+        if visible:
+            role = node["role"]["value"]
+            name = " ".join(str(node["name"].get("value", "")).split())
+            properties = compact_properties(node)
+            if not name and (
+                role == "listitem"
+                or (not properties and role in COMPACT_SILENT_ROLES)
+            ):
+                visible = False
+        if visible:
+            lines.append(CompactLine(depth, role, name, properties, node))
+        child_depth = depth + 1 if visible else depth
+        for child_id in reversed(node.get("childIds", [])):
+            if child_id in nodes:
+                stack.append((child_id, child_depth))
+    return lines
+
+
+def _drop_redundant_text(lines: list[CompactLine]) -> list[CompactLine]:
+    kept: list[CompactLine] = []
+    # shown ancestors of the current line
+    ancestors: list[CompactLine] = []
+    for line in lines:
+        while ancestors and ancestors[-1].depth >= line.depth:
+            ancestors.pop()
+        if line.role == "StaticText":
+            context = kept[-TEXT_LOOKBACK:] + ancestors[-1:]
+            if any(line.name in other.name for other in context):
+                continue
+            previous = kept[-1] if kept else None
+            if (
+                previous is not None
+                and previous.role == "StaticText"
+                and previous.node.get("parentId") == line.node.get("parentId")
+            ):
+                previous.name = f"{previous.name} {line.name}"
+                continue
+        kept.append(line)
+        ancestors.append(line)
+    return kept
+
+
+def serialize_compact_accessibility_tree(
+    accessibility_tree: AccessibilityTree,
+) -> tuple[str, dict[str, Any]]:
+    """The compact observation and its node table, keyed by short id"""
+    if not accessibility_tree:
+        return "", {}
+    lines = []
+    obs_nodes_info = {}
+    for short_id, line in enumerate(
+        _drop_redundant_text(_collect_lines(accessibility_tree)), start=1
+    ):
+        role = ROLE_ABBREVIATIONS.get(line.role, line.role)
+        text = f"{short_id} {role}"
+        if line.properties:
+            text += f"({', '.join(line.properties)})"
+        if line.name:
+            text += f" {line.name}"
+        lines.append("\t" * line.depth + text)
+        obs_nodes_info[str(short_id)] = {
+            "backend_id": line.node["backendDOMNodeId"],
+            "union_bound": line.node["union_bound"],
+            "text": text,
+        }
+    return "\n".join(lines), obs_nodes_info
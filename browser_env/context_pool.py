@@ -0,0 +1,85 @@
+"""Browser contexts prepared ahead of time for upcoming tasks.
+
+Playwright's sync API objects may only be used from the thread that created
+them, so the pool does not load pages from a helper thread. Instead, the
+context and its pages are created on the environment's thread and navigation
+is started without waiting for it; Chromium keeps loading the pages in its own
+processes while the caller is busy elsewhere (e.g. waiting for the LLM). The
+wait for the load event happens only when the context is adopted.
+
+This only holds while no request of the context is intercepted in Python.
+Route handlers of the sync API (the request router, the asset cache and HAR
+replay with `route_from_har`) run only while the environment's thread is
+inside a Playwright call, so every routed request of a prefetched page,
+the document included, would wait until the context is adopted. The
+environment therefore turns prefetching off when any of them is enabled.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from playwright.sync_api import BrowserContext, Page, ViewportSize
+
+
+@dataclass
+class WarmContext:
+    key: str
+    instance_config: dict[str, Any]
+    context: BrowserContext
+    viewport_size: ViewportSize
+    pages: list[Page] = field(default_factory=list)
+    start_urls: list[str] = field(default_factory=list)
+
+    def close(self) -> None:
+        try:
+            self.context.close()
+        except Exception as e:
+            # the browser may already be gone
+            print(f"WARNING: failed to close a prefetched context: {e}")
+
+
+def pool_key(config_file: str | Path) -> str:
+    return str(Path(config_file).resolve())
+
+
+def start_navigation(page: Page, url: str) -> None:
+    """Start loading `url` in `page` without waiting for the navigation"""
+    page.evaluate("url => { window.location.href = url; }", url)
+
+
+def wait_for_navigation(page: Page) -> None:
+    """Wait until a navigation started by `start_navigation` has loaded"""
+    # the page stays on about:blank until the navigation commits
+    page.wait_for_url(lambda url: url != "about:blank", wait_until="load")
+
+
+class ContextPool:
+    """A bounded set of warm contexts, keyed by task config file"""
+
+    def __init__(self, max_size: int = 1) -> None:
+        self.max_size = max_size
+        self.entries: OrderedDict[str, WarmContext] = OrderedDict()
+
+    def __contains__(self, config_file: str | Path) -> bool:
+        return pool_key(config_file) in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def put(self, warm_context: WarmContext) -> None:
+        stale = self.entries.pop(warm_context.key, None)
+        if stale is not None:
+            stale.close()
+        self.entries[warm_context.key] = warm_context
+        while len(self.entries) > self.max_size:
+            _, evicted = self.entries.popitem(last=False)
+            evicted.close()
+
+    def take(self, config_file: str | Path) -> WarmContext | None:
+        return self.entries.pop(pool_key(config_file), None)
+
+    def clear(self) -> None:
+        while self.entries:
+            _, warm_context = self.entries.popitem(last=False)
+            warm_context.close()
@@ -10,11 +10,11 @@ from typing import Any, Union
 
 import numpy as np
 import numpy.typing as npt
-import requests
 from beartype import beartype
 from gymnasium import Env
 from gymnasium.spaces import Box, Text
 from playwright.sync_api import (
+    BrowserContext,
     CDPSession,
     Page,
     Playwright,
@@ -24,14 +24,33 @@ from playwright.sync_api import (
 )
 
 DATASET = os.environ["DATASET"]
-if DATASET == "visualwebarena":
-    from browser_env.env_config import (
-        CLASSIFIEDS,
-        CLASSIFIEDS_RESET_TOKEN,
-    )
 
-from .actions import Action, execute_action, get_action_space, execute_action_webrl
+from .actions import (
+    Action,
+    ActionTypes,
+    execute_action,
+    get_action_space,
+    execute_action_webrl,
+)
+from .asset_cache import AssetCache
+from .ax_mirror import AXMirror
+from .browser_server import connect
+from .context_pool import (
+    ContextPool,
+    WarmContext,
+    pool_key,
+    start_navigation,
+    wait_for_navigation,
+)
+from .html_tools.fetch import install_page_scripts
+from .memory_watchdog import MemoryWatchdog
 from .processors import ObservationHandler, ObservationMetadata
+from .routing import RequestRouter
+from .scroll_reuse import ScrollReuseCache
+from .settle import SettleDetector
+from .site_reset import SiteResetManager, build_site_reset_manager
+from .tab_cache import TabObservationCache
+from .tracing import TraceManager
 from .utils import (
     AccessibilityTree,
     DetachedPage,
@@ -94,6 +113,28 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
         save_trace_enabled: bool = False,
         sleep_after_execution: float = 0.0,
         captioning_fn=None,
+        observation_token_budget: int = 0,
+        ax_fetch_mode: str = "full",
+        observation_dialect: str = "default",
+        reuse_browser: bool = False,
+        context_pool_size: int = 0,
+        settle_mode: str = "fixed",
+        block_resources: bool = False,
+        block_images: bool = False,
+        asset_cache_dir: str | None = None,
+        har_mode: str = "off",
+        har_dir: str | None = None,
+        har_not_found: str = "abort",
+        trace_policy: str | None = None,
+        trace_sample_rate: float = 0.1,
+        site_reset_manager: SiteResetManager | None = None,
+        memory_watchdog: bool = False,
+        max_js_heap_mb: float = 0.0,
+        max_browser_rss_mb: float = 0.0,
+        browser_endpoint: str | None = None,
+        ax_mirror: str = "off",
+        scroll_reuse: bool = False,
+        tab_cache: bool = False,
     ):
         # TODO: make Space[Action] = ActionSpace
         self.action_space = get_action_space()  # type: ignore[assignment]
@@ -103,7 +144,28 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
         self.reset_finished = False
         self.viewport_size = viewport_size
         self.save_trace_enabled = save_trace_enabled
+        # save_trace_enabled alone keeps the previous behaviour of tracing
+        # every task in full
+        if trace_policy is None:
+            trace_policy = "on" if save_trace_enabled else "off"
+        self.tracer = TraceManager(trace_policy, trace_sample_rate)
         self.sleep_after_execution = sleep_after_execution
+        # waits after each action, at most sleep_after_execution seconds
+        self.settle_detector = SettleDetector(
+            settle_mode, max_wait=sleep_after_execution
+        )
+        # keep the Playwright driver and browser alive across resets and only
+        # replace the browser context per task
+        self.reuse_browser = reuse_browser
+        self.context_manager = None
+        self.browser_endpoint = browser_endpoint
+        # contexts prepared ahead of time live in the shared browser, so the
+        # pool is only available when the browser is kept across resets
+        if context_pool_size > 0 and not reuse_browser:
+            raise ValueError("context_pool_size requires reuse_browser=True")
+        self.context_pool = (
+            ContextPool(context_pool_size) if context_pool_size > 0 else None
+        )
 
         match observation_type:
             case "html" | "accessibility_tree" | "accessibility_tree_with_captioner" | "webrl":
@@ -123,6 +185,50 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
                     f"Unsupported observation type: {observation_type}"
                 )
 
+        # images are only safe to drop when no observation looks at them
+        if block_images and self.text_observation_type != "accessibility_tree":
+            print(
+                "WARNING: block_images is only supported for the accessibility_tree observation, ignoring it."
+            )
+            block_images = False
+        self.request_router = (
+            RequestRouter(block_images) if block_resources else None
+        )
+        self.asset_cache = (
+            AssetCache(asset_cache_dir) if asset_cache_dir else None
+        )
+        # record each task's traffic into a HAR archive, or serve the pages
+        # from previously recorded archives without the sites
+        if har_mode not in ["off", "record", "replay"]:
+            raise ValueError(f"Unsupported HAR mode: {har_mode}")
+        if har_mode != "off" and not har_dir:
+            raise ValueError("har_dir is required to record or replay HAR")
+        if har_not_found not in ["abort", "fallback"]:
+            raise ValueError(
+                f"Unsupported HAR not_found handling: {har_not_found}"
+            )
+        self.har_mode = har_mode
+        self.har_dir = Path(har_dir) if har_dir else None
+        self.har_not_found = har_not_found
+        # route handlers of the sync API only run while this thread is in a
+        # Playwright call, so a prefetched page would stall on its requests
+        # until the task is adopted; see context_pool.py
+        if self.context_pool is not None and (
+            self.request_router is not None
+            or self.asset_cache is not None
+            or har_mode == "replay"
+        ):
+            print(
+                "WARNING: prefetching does not work with block_resources, asset_cache_dir or HAR replay, disabling it."
+            )
+            self.context_pool = None
+        self.site_reset_manager = site_reset_manager
+        self.memory_watchdog = (
+            MemoryWatchdog(max_js_heap_mb, max_browser_rss_mb)
+            if memory_watchdog
+            else None
+        )
+
         self.observation_handler = ObservationHandler(
             self.main_observation_type,
             self.text_observation_type,
@@ -130,69 +236,159 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
             self.current_viewport_only,
             self.viewport_size,
             captioning_fn,
+            observation_token_budget,
+            ax_fetch_mode,
+            observation_dialect,
         )
 
         self.observation_space = (
             self.observation_handler.get_observation_space()
         )
 
-    @beartype
-    def setup(self, config_file: Path | None = None) -> None:
+        # follow AX and DOM change events instead of refetching the AX tree;
+        # "check" compares every read against a full fetch
+        if ax_mirror not in ["off", "on", "check"]:
+            raise ValueError(f"Unsupported AX mirror mode: {ax_mirror}")
+        self.ax_mirror = (
+            AXMirror(check=ax_mirror == "check") if ax_mirror != "off" else None
+        )
+        self.observation_handler.text_processor.ax_mirror = self.ax_mirror
+        # after a scroll that changed nothing else, shift the previous AX
+        # tree instead of capturing the page again
+        self.scroll_reuse = ScrollReuseCache() if scroll_reuse else None
+        self.observation_handler.text_processor.scroll_reuse = self.scroll_reuse
+        # serve switches back to unchanged tabs from their last observation
+        self.tab_cache = TabObservationCache() if tab_cache else None
+        self.observation_handler.set_tab_cache(self.tab_cache)
+
+    def _launch_browser(self) -> None:
         self.context_manager = sync_playwright()
         self.playwright = self.context_manager.__enter__()
-        self.browser = self.playwright.chromium.launch(
-            headless=self.headless, slow_mo=self.slow_mo
-        )
-
-        if config_file:
-            with open(config_file, "r") as f:
-                instance_config = json.load(f)
+        if self.browser_endpoint:
+            # contexts live in a browser shared with other runner processes,
+            # see browser_server.py
+            self.browser = connect(self.playwright, self.browser_endpoint)
         else:
-            instance_config = {}
-
-        # Reset site if needed. Currently only supported for Classifieds.
-        # TODO(jykoh): Add reset functionality for Shopping/Reddit.
-        if instance_config.get("require_reset", False):
-            if "classifieds" in instance_config["sites"]:
-                # Send POST request to __CLASSIFIEDS__/index.php?page=reset with token=CLASSIFIEDS_TOKEN
-                response = requests.post(
-                    f"{CLASSIFIEDS}/index.php?page=reset",
-                    data={"token": CLASSIFIEDS_RESET_TOKEN},
-                )
+            self.browser = self.playwright.chromium.launch(
+                headless=self.headless, slow_mo=self.slow_mo
+            )
 
-                # Check if the request was successful
-                if response.status_code == 200:
-                    print("Reset Classifieds site.")
-                else:
-                    print(
-                        "Failed to reset Classifieds site:",
-                        response.status_code,
-                    )
-            else:
-                print(
-                    "WARNING: Reset is not supported for this site. Please manually reset the site."
-                )
+    def _shutdown_browser(self) -> None:
+        if self.context_manager is None:
+            return
+        try:
+            self.context_manager.__exit__()
+        except Exception as e:
+            # the driver may already be gone after a browser crash
+            print(f"WARNING: failed to shut down the browser cleanly: {e}")
+        self.context_manager = None
+
+    def browser_is_healthy(self) -> bool:
+        """Whether the launched browser is still alive and connected"""
+        if self.context_manager is None:
+            return False
+        try:
+            if not self.browser.is_connected():
+                return False
+            # the sync API only learns of a dropped connection while it
+            # talks to the browser, so make one round trip
+            self.browser.new_browser_cdp_session().detach()
+            return True
+        except Exception:
+            return False
+
+    def _close_context(self) -> None:
+        try:
+            self.context.close()
+        except Exception as e:
+            print(f"WARNING: failed to close the browser context: {e}")
 
+    def _load_instance_config(self, config_file: Path | None) -> dict[str, Any]:
+        if config_file:
+            with open(config_file, "r") as f:
+                return json.load(f)
+        return {}
+
+    def _reset_manager(self) -> SiteResetManager:
+        # built on first use, the site URLs are not needed otherwise
+        if self.site_reset_manager is None:
+            self.site_reset_manager = build_site_reset_manager()
+        return self.site_reset_manager
+
+    def _reset_sites(self, instance_config: dict[str, Any]) -> None:
+        # a manager that was never used has no dirty sites, so only a task
+        # that requires a reset needs it; building it reads all site URLs
+        if self.site_reset_manager is None and not instance_config.get(
+            "require_reset", False
+        ):
+            return
+        self._reset_manager().before_task(instance_config)
+
+    def _har_path(self, instance_config: dict[str, Any]) -> Path:
+        assert self.har_dir is not None
+        # a .zip archive keeps the response bodies as separate entries
+        return self.har_dir / f"{instance_config.get('task_id', 'default')}.zip"
+
+    def _new_context(
+        self, instance_config: dict[str, Any]
+    ) -> tuple[BrowserContext, ViewportSize]:
         storage_state = instance_config.get("storage_state", None)
-        start_url = instance_config.get("start_url", None)
         geolocation = instance_config.get("geolocation", None)
 
         # Use custom viewport size if specified in the config, otherwise use the default.
         viewport_size = self.viewport_size.copy()
         viewport_size.update(instance_config.get("viewport_size", {}))
-        self.observation_handler.viewport_size = viewport_size
 
-        self.context = self.browser.new_context(
+        har_options: dict[str, Any] = {}
+        if self.har_mode == "record":
+            self.har_dir.mkdir(parents=True, exist_ok=True)
+            har_options["record_har_path"] = self._har_path(instance_config)
+            har_options["record_har_content"] = "attach"
+        context = self.browser.new_context(
             viewport=viewport_size,
             storage_state=storage_state,
             geolocation=geolocation,
             device_scale_factor=1,
+            **har_options,
         )
-        if self.save_trace_enabled:
-            self.context.tracing.start(screenshots=True, snapshots=True)
+        self.tracer.start(context, instance_config.get("task_id"))
+
+        # WebRL and SoM observations run page helpers on every step; register
+        # them once per context instead of shipping their source each time.
+        if (
+            self.text_observation_type == "webrl"
+            or self.image_observation_type == "image_som"
+        ):
+            install_page_scripts(context)
+        self.settle_detector.attach(context)
+        if self.scroll_reuse is not None:
+            self.scroll_reuse.attach(context)
+        if self.tab_cache is not None:
+            self.tab_cache.attach(context)
+        # route handlers run in reverse order of registration, so blocked
+        # requests are aborted before the cache is consulted
+        if self.asset_cache is not None:
+            self.asset_cache.attach(context)
+        if self.request_router is not None:
+            self.request_router.attach(
+                context, instance_config.get("sites", [])
+            )
+        if self.har_mode == "replay":
+            har_path = self._har_path(instance_config)
+            if not har_path.exists():
+                context.close()
+                raise ValueError(f"HAR archive {har_path} does not exist.")
+            # unmatched requests are aborted, or passed on to the handlers
+            # above and the network with not_found="fallback"
+            context.route_from_har(har_path, not_found=self.har_not_found)
+        return context, viewport_size
+
+    def _start_urls(self, instance_config: dict[str, Any]) -> list[str]:
+        start_url = instance_config.get("start_url", None)
+        return start_url.split(" |AND| ") if start_url else []
 
-        if start_url:
-            start_urls = start_url.split(" |AND| ")
+    def _open_pages(self, start_urls: list[str]) -> None:
+        if start_urls:
             for i, url in enumerate(start_urls):
                 page = self.context.new_page()
                 if i == 0:
@@ -200,6 +396,7 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
         else:
             self.page = self.context.new_page()
 
+    def _enable_accessibility(self) -> None:
         # Enable accessibility tree for all pages
         for page in self.context.pages:
             if self.text_observation_type in [
@@ -209,14 +406,152 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
                 client = page.context.new_cdp_session(page)
                 client.send("Accessibility.enable")
 
+    @beartype
+    def setup(self, config_file: Path | None = None) -> None:
+        if not self.browser_is_healthy():
+            if self.context_manager is not None:
+                print("WARNING: browser is not responding, relaunching it.")
+            if self.context_pool is not None:
+                self.context_pool.clear()
+            self._shutdown_browser()
+            self._launch_browser()
+
+        warm_context = None
+        if self.context_pool is not None and config_file:
+            warm_context = self.context_pool.take(config_file)
+        if warm_context is not None:
+            self._adopt(warm_context)
+            return
+
+        instance_config = self._load_instance_config(config_file)
+        if self.har_mode != "replay":
+            self._reset_sites(instance_config)
+
+        start_urls = self._start_urls(instance_config)
+        self.context, viewport_size = self._new_context(instance_config)
+        self.observation_handler.viewport_size = viewport_size
+        self._open_pages(start_urls)
+        self._enable_accessibility()
+
         # Navigate all pages to their URLs
-        if start_url:
+        if len(start_urls) > 1:
+            # load the tabs concurrently, then visit them in order so that
+            # the tab order and the focused tab are the same as before
+            for page, url in zip(self.context.pages, start_urls):
+                start_navigation(page, url)
+            for page, url in zip(self.context.pages, start_urls):
+                try:
+                    wait_for_navigation(page)
+                except Exception as e:
+                    print(f"WARNING: {url} did not load, retrying: {e}")
+                    page.goto(url)
+                page.bring_to_front()
+        else:
             for page, url in zip(self.context.pages, start_urls):
                 page.goto(url)
                 page.bring_to_front()
 
         self.page.bring_to_front()
 
+    def _adopt(self, warm_context: WarmContext) -> None:
+        self.context = warm_context.context
+        self.observation_handler.viewport_size = warm_context.viewport_size
+        self.page = warm_context.pages[0]
+        self._enable_accessibility()
+        for page, url in zip(warm_context.pages, warm_context.start_urls):
+            try:
+                wait_for_navigation(page)
+            except Exception as e:
+                print(f"WARNING: prefetched page did not load, reloading: {e}")
+                page.goto(url)
+            page.bring_to_front()
+        self.page.bring_to_front()
+
+    @beartype
+    def prefetch(self, config_file: Path) -> bool:
+        """Prepare the context of an upcoming task while the current one runs.
+
+        The context is created with the task's storage state and its start
+        pages begin loading right away; a later `reset` with the same config
+        file adopts it instead of building a new one. Tasks that require a
+        site reset are not prefetched, since the reset must happen first.
+        Returns whether a context was prepared.
+        """
+        if self.context_pool is None:
+            return False
+        if not self.browser_is_healthy():
+            self.context_pool.clear()
+            self._shutdown_browser()
+            self._launch_browser()
+
+        instance_config = self._load_instance_config(config_file)
+        if self.har_mode != "replay" and (
+            instance_config.get("require_reset", False)
+            or (
+                self.site_reset_manager is not None
+                and self.site_reset_manager.sites_to_reset(instance_config)
+            )
+        ):
+            return False
+
+        start_urls = self._start_urls(instance_config)
+        context, viewport_size = self._new_context(instance_config)
+        pages = [context.new_page() for _ in start_urls or [None]]
+        try:
+            for page, url in zip(pages, start_urls):
+                start_navigation(page, url)
+        except Exception as e:
+            print(f"WARNING: failed to prefetch {config_file}: {e}")
+            context.close()
+            return False
+
+        self.context_pool.put(
+            WarmContext(
+                key=pool_key(config_file),
+                instance_config=instance_config,
+                context=context,
+                viewport_size=viewport_size,
+                pages=pages,
+                start_urls=start_urls,
+            )
+        )
+        return True
+
+    def _step_stats(self) -> dict[str, Any]:
+        return {
+            "settle_time": self.settle_detector.last_wait,
+            "blocked_requests": (
+                self.request_router.pop_stats(self.context)
+                if self.request_router is not None
+                else {}
+            ),
+            "asset_cache": (
+                self.asset_cache.pop_stats(self.context)
+                if self.asset_cache is not None
+                else {}
+            ),
+            "memory": (
+                self.memory_watchdog.sample(self.context)
+                if self.memory_watchdog is not None
+                else {}
+            ),
+            "observation_time": dict(self.observation_handler.timings),
+            "ax_fetch": (
+                self.observation_handler.text_processor.pop_ax_fetch_stats()
+            ),
+            "ax_mirror": (
+                self.ax_mirror.pop_stats() if self.ax_mirror is not None else {}
+            ),
+            "scroll_reuse": (
+                self.scroll_reuse.pop_stats()
+                if self.scroll_reuse is not None
+                else {}
+            ),
+            "tab_cache": (
+                self.tab_cache.pop_stats() if self.tab_cache is not None else {}
+            ),
+        }
+
     def _get_obs(self) -> dict[str, Observation]:
         obs = self.observation_handler.get_observation(self.page)
         return obs
@@ -239,7 +574,28 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
         """
         super().reset(seed=seed, options=options)
         if self.reset_finished:
-            self.context_manager.__exit__()
+            # a recorded HAR archive is only written when its context closes
+            if self.reuse_browser or self.har_mode == "record":
+                self._close_context()
+            if not self.reuse_browser:
+                self._shutdown_browser()
+            elif (
+                self.memory_watchdog is not None
+                and self.memory_watchdog.browser_needs_recycle()
+            ):
+                # setup() launches a fresh browser
+                if self.context_pool is not None:
+                    self.context_pool.clear()
+                self._shutdown_browser()
+            if self.memory_watchdog is not None:
+                self.memory_watchdog.reset()
+            if self.ax_mirror is not None:
+                self.ax_mirror.reset()
+        if self.scroll_reuse is not None:
+            self.scroll_reuse.last_action_scrolled = False
+        if self.tab_cache is not None:
+            self.tab_cache.reset()
+            self.tab_cache.last_action_switched_tab = False
 
         if options is not None and "config_file" in options:
             config_file = Path(options["config_file"])
@@ -253,7 +609,7 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
         timeout_in_ms = 120000
         self.page.set_default_timeout(timeout_in_ms)
         self.page.set_default_navigation_timeout(timeout_in_ms)
-        self.page.wait_for_timeout(int(self.sleep_after_execution * 1000))
+        self.settle_detector.wait(self.page)
 
         observation = self._get_obs()
         observation_metadata = self._get_obs_metadata()
@@ -265,18 +621,23 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
                     "fail_error": "",
                     "observation_metadata": observation_metadata,
                 }
-            }
+            },
+            "step_stats": self._step_stats(),
         }
 
         return (observation, info)
 
-    def save_trace(self, trace_path: str | Path) -> None:
-        if self.save_trace_enabled:
-            self.context.tracing.stop(path=trace_path)
+    def save_trace(self, trace_path: str | Path, failed: bool = False) -> None:
+        """Write the trace of the current task, as allowed by the trace policy"""
+        self.tracer.stop(self.context, trace_path, failed)
 
     def close(self) -> None:
-        if self.reset_finished:
-            self.context_manager.__exit__()
+        if self.reset_finished and self.har_mode == "record":
+            self._close_context()
+        if self.context_pool is not None:
+            self.context_pool.clear()
+        self._shutdown_browser()
+        self.tracer.close()
 
     def step(
         self, action: Action
@@ -286,6 +647,7 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
 
         success = False
         fail_error = ""
+        self.settle_detector.last_wait = 0.0
         try:
             if self.text_observation_type == 'webrl':
                 self.page = execute_action_webrl(
@@ -294,6 +656,7 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
                     self.context,
                     self.observation_handler.action_processor,
                     self.sleep_after_execution,
+                    self.settle_detector,
                 )
             else:
                 self.page = execute_action(
@@ -302,11 +665,20 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
                     self.context,
                     self.observation_handler.action_processor,
                     self.sleep_after_execution,
+                    self.settle_detector,
                 )
             success = True
         except Exception as e:
             fail_error = str(e)
 
+        if self.scroll_reuse is not None:
+            self.scroll_reuse.last_action_scrolled = (
+                success and action["action_type"] == ActionTypes.SCROLL
+            )
+        if self.tab_cache is not None:
+            self.tab_cache.last_action_switched_tab = success and action[
+                "action_type"
+            ] in [ActionTypes.PAGE_FOCUS, ActionTypes.PAGE_CLOSE]
         observation = self._get_obs()
         observation_metadata = self._get_obs_metadata()
 
@@ -318,7 +690,8 @@ class ScriptBrowserEnv(Env[dict[str, Observation], Action]):
                     "fail_error": fail_error,
                     "observation_metadata": observation_metadata,
                 }
-            }
+            },
+            "step_stats": self._step_stats(),
         }
         msg = (
             observation,
@@ -5,18 +5,47 @@ from .html_parser import HtmlParser
 from .configs import basic_attrs
 from .scripts import *
 
+def install_page_scripts(context):
+    """Register the page helpers on every document the context creates."""
+    context.add_init_script(script=bootstrap_script)
+
+async def ainstall_page_scripts(context):
+    await context.add_init_script(script=bootstrap_script)
+
+def call_page_script(page, name, arg=None):
+    """Invoke an installed page helper by name.
+
+    Documents that predate `install_page_scripts` (or contexts that never
+    installed it) are bootstrapped with one extra evaluate on first use.
+    """
+    found, result = page.evaluate(call_script, [name, arg])
+    if not found:
+        page.evaluate(bootstrap_script)
+        found, result = page.evaluate(call_script, [name, arg])
+    return result
+
+async def acall_page_script(page, name, arg=None):
+    found, result = await page.evaluate(call_script, [name, arg])
+    if not found:
+        await page.evaluate(bootstrap_script)
+        found, result = await page.evaluate(call_script, [name, arg])
+    return result
+
+WINDOW_SCRIPT = "() => [window.scrollX, window.scrollY, window.innerWidth, window.innerHeight]"
+
 def get_window(page):
-    x = page.evaluate("window.scrollX")
-    y = page.evaluate("window.scrollY")
-    w = page.evaluate("window.innerWidth")
-    h = page.evaluate("window.innerHeight")
+    x, y, w, h = page.evaluate(WINDOW_SCRIPT)
+    return (x, y, w, h)
+
+async def aget_window(page):
+    x, y, w, h = await page.evaluate(WINDOW_SCRIPT)
     return (x, y, w, h)
 
 def modify_page(page):
     page.wait_for_timeout(500)
     
     try:
-        page.evaluate(remove_id_script)
+        call_page_script(page, "removeId")
     except:
         pass
     
@@ -25,31 +54,31 @@ def modify_page(page):
         "window": get_window(page)
     }
     
-    page.evaluate(prepare_script)
+    call_page_script(page, "prepare")
     page.wait_for_timeout(100)
     
     img_bytes = page.screenshot(path="debug_info/screenshot_raw.png")
     raw_image = base64.b64encode(img_bytes).decode()
     
-    page.evaluate(clickable_checker_script)
+    call_page_script(page, "clickableChecker")
     page.wait_for_timeout(50)
     
     # get all clickable elements
     start_id = 0
-    items, start_id = page.evaluate(label_script, {
+    items, start_id = call_page_script(page, "label", {
         "selector": ".possible-clickable-element",
         "startIndex": start_id
     })
     page.wait_for_timeout(50)
     
     # mark our own labels and get the images
-    items = page.evaluate(label_marker_script, items)
+    items = call_page_script(page, "labelMarker", items)
     page.wait_for_timeout(100)
     img_bytes = page.screenshot(path="debug_info/marked.png")
     marked_image = base64.b64encode(img_bytes).decode()
     
     # remove markers on the page
-    page.evaluate(remove_label_mark_script)
+    call_page_script(page, "removeLabelMark")
     
     packet.update({
         "raw_image": raw_image,
@@ -58,11 +87,63 @@ def modify_page(page):
     })
     
     # element_info, include "all_elements" and "clickable_elements"
-    element_info = page.evaluate(element_info_script)
+    element_info = call_page_script(page, "elementInfo")
     page.wait_for_timeout(100)
     packet.update(element_info)
     return packet
 
+async def amodify_page(page):
+    await page.wait_for_timeout(500)
+    
+    try:
+        await acall_page_script(page, "removeId")
+    except:
+        pass
+    
+    packet = {
+        "raw_html": await page.evaluate("document.documentElement.outerHTML"),
+        "window": await aget_window(page)
+    }
+    
+    await acall_page_script(page, "prepare")
+    await page.wait_for_timeout(100)
+    
+    # no debug dumps: environments sharing the loop would overwrite them
+    img_bytes = await page.screenshot()
+    raw_image = base64.b64encode(img_bytes).decode()
+    
+    await acall_page_script(page, "clickableChecker")
+    await page.wait_for_timeout(50)
+    
+    # get all clickable elements
+    start_id = 0
+    items, start_id = await acall_page_script(page, "label", {
+        "selector": ".possible-clickable-element",
+        "startIndex": start_id
+    })
+    await page.wait_for_timeout(50)
+    
+    # mark our own labels and get the images
+    items = await acall_page_script(page, "labelMarker", items)
+    await page.wait_for_timeout(100)
+    img_bytes = await page.screenshot()
+    marked_image = base64.b64encode(img_bytes).decode()
+    
+    # remove markers on the page
+    await acall_page_script(page, "removeLabelMark")
+    
+    packet.update({
+        "raw_image": raw_image,
+        "marked_image": marked_image,
+        "modified_html": await page.evaluate("document.documentElement.outerHTML")
+    })
+    
+    # element_info, include "all_elements" and "clickable_elements"
+    element_info = await acall_page_script(page, "elementInfo")
+    await page.wait_for_timeout(100)
+    packet.update(element_info)
+    return packet
+
 def save_debug_info(packet):
     with open("debug_info/raw.html", "w") as f:
         f.write(packet["modified_html"])
@@ -78,6 +159,15 @@ def get_parsed_html(page):
     print("parsing html...")
     
     packet = modify_page(page)
+    return parse_packet(packet)
+
+async def aget_parsed_html(page):
+    print("parsing html...")
+    
+    packet = await amodify_page(page)
+    return parse_packet(packet, save_debug=False)
+
+def parse_packet(packet, save_debug=True):
     raw_html = packet["modified_html"]
     
     args = {
@@ -100,7 +190,8 @@ def get_parsed_html(page):
     packet["html"] = page_html
     
     # for debug
-    save_debug_info(packet)
+    if save_debug:
+        save_debug_info(packet)
     
     print("parsing finished.")
     
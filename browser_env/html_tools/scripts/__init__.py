@@ -18,6 +18,10 @@ with open(os.path.join(rootdir, 'element_info.js'), 'r') as f:
 with open(os.path.join(rootdir, 'label_marker.js'), 'r') as f:
     label_marker_script = f.read()
 
+# bounding boxes for set-of-marks observations
+with open(os.path.join(rootdir, 'page_bboxes.js'), 'r') as f:
+    page_bboxes_script = f.read()
+
 # remove label draw on page
 remove_label_mark_script = """
     () => {
@@ -41,3 +45,35 @@ remove_id_script = """
         });
     }
 """
+
+# All helpers are installed once per document under this global and invoked by
+# name, so only the (small) arguments cross the driver on every observation.
+SCRIPT_NAMESPACE = "__webarenaScripts"
+
+page_scripts = {
+    "prepare": prepare_script,
+    "clickableChecker": clickable_checker_script,
+    "label": label_script,
+    "labelMarker": label_marker_script,
+    "elementInfo": element_info_script,
+    "removeLabelMark": remove_label_mark_script,
+    "removeId": remove_id_script,
+    "pageBboxes": page_bboxes_script,
+}
+
+bootstrap_script = (
+    "(() => {\n"
+    + f"    if (window.{SCRIPT_NAMESPACE}) return;\n"
+    + f"    window.{SCRIPT_NAMESPACE} = {{\n"
+    + ",\n".join(
+        f"        {name}: ({source.strip()})" for name, source in page_scripts.items()
+    )
+    + "\n    };\n})();"
+)
+
+call_script = f"""
+    ([name, arg]) => {{
+        const scripts = window.{SCRIPT_NAMESPACE};
+        return scripts ? [true, scripts[name](arg)] : [false, null];
+    }}
+"""
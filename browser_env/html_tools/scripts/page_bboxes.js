@@ -0,0 +1,47 @@
+() => {
+    const interactableSelectors = [
+        'a[href]:not(:has(img))', 'a[href] img', 'button', 'input:not([type="hidden"])', 'textarea', 'select',
+        '[tabindex]:not([tabindex="-1"])', '[contenteditable="true"]', '[role="button"]', '[role="link"]',
+        '[role="checkbox"]', '[role="menuitem"]', '[role="tab"]', '[draggable="true"]',
+        '.btn', 'a[href="/notifications"]', 'a[href="/submit"]', '.fa.fa-star.is-rating-item', 'input[type="checkbox"]'
+
+    ];
+
+    const textSelectors = ['p', 'span', 'div:not(:has(*))', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'article'];
+    const modifiedTextSelectors = textSelectors.map(selector =>
+        `:not(${interactableSelectors.join(', ')}):not(style) > ${selector}`
+    );
+
+    const combinedSelectors = [...interactableSelectors, ...modifiedTextSelectors];
+    const elements = document.querySelectorAll(combinedSelectors.join(', '));
+
+    const pixelRatio = window.devicePixelRatio;
+    let csvContent = "ID,Element,Top,Right,Bottom,Left,Width,Height,Alt,Class,Id,TextContent,Interactable\n";
+    let counter = 1;
+
+    elements.forEach(element => {
+        const rect = element.getBoundingClientRect();
+        if (rect.width === 0 || rect.height === 0) return;
+        let altText = element.getAttribute('alt') || '';
+        altText = altText.replace(/"/g, ''); // Escape double quotes in alt text
+        const classList = element.className || '';
+        const id = element.id || '';
+        let textContent = element.textContent || '';
+        textContent = textContent.replace(/"/g, ''); // Escape double quotes in textContent
+
+        // Determine if the element is interactable
+        const isInteractable = interactableSelectors.some(selector => element.matches(selector));
+
+        const dataString = [
+            counter, element.tagName, (rect.top + window.scrollY) * pixelRatio,
+            (rect.right + window.scrollX) * pixelRatio, (rect.bottom + window.scrollY) * pixelRatio,
+            (rect.left + window.scrollX) * pixelRatio, rect.width * pixelRatio, rect.height * pixelRatio,
+            altText, classList, id, textContent, isInteractable
+        ].map(value => `"${value}"`).join(",");
+
+        csvContent += dataString + "\n";
+        counter++;
+    });
+
+    return csvContent;
+}
\ No newline at end of file
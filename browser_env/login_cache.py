@@ -0,0 +1,125 @@
+"""Long-lived cache of logged-in storage states per site combination.
+
+States are kept in memory and in the auth folder, validated with the HTTP
+cookie probe of `auto_login.probe_is_expired` and only renewed through a
+browser login when the probe fails. Logins run on a worker thread with its
+own Playwright instance, since the sync API cannot be nested in the thread
+that drives the environment. A background thread re-validates the cached
+states periodically so tasks usually get a ready state immediately.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from browser_env.auto_login import (
+    EXACT_MATCH,
+    KEYWORDS,
+    SITES,
+    URLS,
+    probe_is_expired,
+    renew_comb,
+)
+
+
+def state_file_name(comb: list[str]) -> str:
+    return f"{'.'.join(comb)}_state.json"
+
+
+class LoginCache:
+    def __init__(
+        self,
+        auth_folder: str | Path = "./.auth",
+        validate_interval: float = 300.0,
+        refresh_in_background: bool = True,
+    ) -> None:
+        self.auth_folder = Path(auth_folder)
+        self.auth_folder.mkdir(parents=True, exist_ok=True)
+        # a state validated more recently than this is used without probing
+        self.validate_interval = validate_interval
+        self.validated_at: dict[tuple[str, ...], float] = {}
+        self.renewals: dict[tuple[str, ...], Future] = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.stop_event = threading.Event()
+        self.refresher: threading.Thread | None = None
+        if refresh_in_background:
+            self.refresher = threading.Thread(
+                target=self._refresh_loop, daemon=True
+            )
+            self.refresher.start()
+
+    def path(self, comb: list[str]) -> Path:
+        return self.auth_folder / state_file_name(comb)
+
+    def is_valid(self, comb: list[str]) -> bool:
+        """Probe every site of the combination with the stored cookies"""
+        path = self.path(comb)
+        if not path.exists():
+            return False
+        for site in comb:
+            if site not in SITES:
+                continue
+            idx = SITES.index(site)
+            if probe_is_expired(path, URLS[idx], KEYWORDS[idx], EXACT_MATCH[idx]):
+                return False
+        return True
+
+    def _renew(self, comb: list[str]) -> None:
+        # log in into a scratch folder and move the result in place, so that
+        # other workers never read a partially written state
+        temp_dir = tempfile.mkdtemp()
+        try:
+            renew_comb(comb, auth_folder=temp_dir)
+            os.replace(Path(temp_dir) / state_file_name(comb), self.path(comb))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        with self.lock:
+            self.validated_at[tuple(comb)] = time.time()
+
+    def renew(self, comb: list[str]) -> Future:
+        """Schedule a login for the combination, at most one at a time"""
+        key = tuple(comb)
+        with self.lock:
+            future = self.renewals.get(key)
+            if future is None or future.done():
+                future = self.executor.submit(self._renew, comb)
+                self.renewals[key] = future
+            return future
+
+    def get(self, comb: list[str]) -> Path:
+        """Path of a valid storage state for the combination"""
+        key = tuple(comb)
+        with self.lock:
+            validated_at = self.validated_at.get(key, 0.0)
+            pending = self.renewals.get(key)
+        if pending is not None and not pending.done():
+            pending.result()
+        elif time.time() - validated_at > self.validate_interval:
+            if self.is_valid(comb):
+                with self.lock:
+                    self.validated_at[key] = time.time()
+            else:
+                self.renew(comb).result()
+        return self.path(comb)
+
+    def _refresh_loop(self) -> None:
+        while not self.stop_event.wait(self.validate_interval):
+            with self.lock:
+                combs = [list(key) for key in self.validated_at]
+            for comb in combs:
+                try:
+                    if self.is_valid(comb):
+                        with self.lock:
+                            self.validated_at[tuple(comb)] = time.time()
+                    else:
+                        self.renew(comb)
+                except Exception as e:
+                    print(f"WARNING: failed to refresh login for {comb}: {e}")
+
+    def close(self) -> None:
+        self.stop_event.set()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,90 @@
+"""Keep browser memory bounded over long runs.
+
+After every step the watchdog samples the JS heap of each open page
+(`Performance.getMetrics` over CDP) and the resident memory of all Chromium
+processes started by this worker. Contexts are already replaced per task, so
+an oversized page heap is released at the next reset; when the browser
+processes themselves stay above the RSS threshold between tasks, the whole
+browser is recycled.
+"""
+import os
+
+import psutil
+from playwright.sync_api import BrowserContext, CDPSession, Page
+
+MB = 1024 * 1024
+
+
+def chromium_rss() -> float:
+    """Resident memory of the Chromium processes below this process, in MB"""
+    total = 0
+    for proc in psutil.Process(os.getpid()).children(recursive=True):
+        try:
+            name = proc.name().lower()
+            if "chrom" in name or "headless_shell" in name:
+                total += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total / MB
+
+
+class MemoryWatchdog:
+    def __init__(
+        self, max_js_heap_mb: float = 0.0, max_browser_rss_mb: float = 0.0
+    ) -> None:
+        # 0 disables the corresponding threshold
+        self.max_js_heap_mb = max_js_heap_mb
+        self.max_browser_rss_mb = max_browser_rss_mb
+        self.sessions: dict[Page, CDPSession] = {}
+        self.over_heap_limit = False
+
+    def _session(self, page: Page) -> CDPSession:
+        if page not in self.sessions:
+            client = page.context.new_cdp_session(page)
+            client.send("Performance.enable")
+            self.sessions[page] = client
+            page.on("close", lambda _: self.sessions.pop(page, None))
+        return self.sessions[page]
+
+    def js_heap(self, page: Page) -> float:
+        """Used JS heap of the page, in MB"""
+        metrics = self._session(page).send("Performance.getMetrics")["metrics"]
+        for metric in metrics:
+            if metric["name"] == "JSHeapUsedSize":
+                return metric["value"] / MB
+        return 0.0
+
+    def sample(self, context: BrowserContext) -> dict[str, float]:
+        heaps = []
+        for page in context.pages:
+            try:
+                heaps.append(self.js_heap(page))
+            except Exception:
+                # the page is navigating or already closed
+                continue
+        stats = {
+            "js_heap_mb": max(heaps, default=0.0),
+            "total_js_heap_mb": sum(heaps),
+            "browser_rss_mb": chromium_rss(),
+        }
+        if self.max_js_heap_mb and stats["js_heap_mb"] > self.max_js_heap_mb:
+            if not self.over_heap_limit:
+                print(
+                    f"WARNING: page JS heap at {stats['js_heap_mb']:.0f}MB, the context will be recycled at the next reset."
+                )
+            self.over_heap_limit = True
+        return stats
+
+    def browser_needs_recycle(self) -> bool:
+        """Whether the browser should be restarted before the next task"""
+        if not self.max_browser_rss_mb:
+            return False
+        rss = chromium_rss()
+        if rss > self.max_browser_rss_mb:
+            print(f"WARNING: browser RSS at {rss:.0f}MB, recycling the browser.")
+            return True
+        return False
+
+    def reset(self) -> None:
+        self.sessions = {}
+        self.over_heap_limit = False
@@ -1,7 +1,8 @@
 import json
 import pkgutil
 import re
-from collections import defaultdict
+import time
+from collections import Counter, defaultdict
 from dataclasses import dataclass
 from io import BytesIO, StringIO
 from typing import Any, Optional, TypedDict, Union
@@ -16,7 +17,11 @@ import requests
 from gymnasium import spaces
 from PIL import Image, ImageDraw, ImageFont
 from playwright.sync_api import CDPSession, Page, ViewportSize
-from .html_tools.fetch import get_parsed_html
+from .ax_mirror import AXMirror
+from .compact_observation import serialize_compact_accessibility_tree
+from .html_tools.fetch import call_page_script, get_parsed_html
+from .scroll_reuse import ScrollEntry, ScrollReuseCache
+from .tab_cache import TabEntry, TabObservationCache
 
 from browser_env.constants import (
     ASCII_CHARSET,
@@ -29,6 +34,7 @@ from browser_env.constants import (
     IN_VIEWPORT_RATIO_THRESHOLD,
 )
 
+from .pruning import prune_accessibility_tree
 from .utils import (
     AccessibilityTree,
     AccessibilityTreeNode,
@@ -81,6 +87,170 @@ def extract_data_items_from_aria(string: str) -> tuple[list[str], str]:
     return data_items, original_aria
 
 
+# only the node table, the layout bounds and the CSS position (to find fixed
+# and sticky elements for scroll reuse) are read; paint order and the
+# offset/scroll/client rects would roughly double the payload
+DOM_SNAPSHOT_PARAMS = {
+    "computedStyles": ["position"],
+    "includeDOMRects": False,
+    "includePaintOrder": False,
+}
+
+# "check" fetches the viewport subtrees and compares the observation with
+# the one of a full fetch
+AX_FETCH_MODES = ["full", "viewport", "check"]
+# above this many partial fetches a full fetch is cheaper
+MAX_PARTIAL_AX_FETCHES = 200
+
+OBSERVATION_DIALECTS = ["default", "compact"]
+
+# pageYOffset, pageXOffset, screen width and height and devicePixelRatio
+WINDOW_METRICS_SCRIPT = """() => [
+    window.pageYOffset,
+    window.pageXOffset,
+    window.screen.width,
+    window.screen.height,
+    window.devicePixelRatio,
+]"""
+
+BOUNDING_CLIENT_RECT_FUNCTION = """
+    function() {
+        if (this.nodeType == 3) {
+            var range = document.createRange();
+            range.selectNode(this);
+            var rect = range.getBoundingClientRect().toJSON();
+            range.detach();
+            return rect;
+        } else {
+            return this.getBoundingClientRect().toJSON();
+        }
+    }
+"""
+
+
+def calibrate_dom_snapshot(tree: dict[str, Any], viewport_size: ViewportSize) -> None:
+    """Rescale the snapshot bounds to CSS pixels, as one (n, 4) array"""
+    layout = tree["documents"][0]["layout"]
+    bounds = np.asarray(layout["bounds"], dtype=np.float64).reshape(-1, 4)
+    # calibrate the bounds, in some cases, the bounds are scaled somehow
+    if len(bounds) and bounds[0, 2]:
+        bounds /= bounds[0, 2] / viewport_size["width"]
+    layout["bounds"] = bounds
+
+
+def create_browser_config(
+    win_upper_bound: float,
+    win_left_bound: float,
+    win_width: float,
+    win_height: float,
+    device_pixel_ratio: float,
+) -> BrowserConfig:
+    assert device_pixel_ratio == 1.0, "devicePixelRatio is not 1.0"
+    config: BrowserConfig = {
+        "win_upper_bound": win_upper_bound,
+        "win_left_bound": win_left_bound,
+        "win_width": win_width,
+        "win_height": win_height,
+        "win_right_bound": win_left_bound + win_width,
+        "win_lower_bound": win_upper_bound + win_height,
+        "device_pixel_ratio": device_pixel_ratio,
+    }
+    return config
+
+
+def union_bound_from_rect(response: dict[str, Any]) -> list[float] | None:
+    """[x, y, width, height] from a getBoundingClientRect response"""
+    if response.get("result", {}).get("subtype", "") == "error":
+        return None
+    x = response["result"]["value"]["x"]
+    y = response["result"]["value"]["y"]
+    width = response["result"]["value"]["width"]
+    height = response["result"]["value"]["height"]
+    return [x, y, width, height]
+
+
+def viewport_backend_node_ids(info: BrowserInfo) -> list[int]:
+    """Backend ids of the DOM nodes whose layout box intersects the viewport"""
+    document = info["DOMTree"]["documents"][0]
+    layout = document["layout"]
+    bounds = layout["bounds"]
+    if not len(bounds):
+        return []
+    config = info["config"]
+    # layout bounds are in document coordinates
+    left = config["win_left_bound"]
+    top = config["win_upper_bound"]
+    x, y, width, height = bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]
+    visible = (
+        (width > 0)
+        & (height > 0)
+        & (x < left + config["win_width"])
+        & (x + width > left)
+        & (y < top + config["win_height"])
+        & (y + height > top)
+    )
+    node_indices = np.asarray(layout["nodeIndex"])[visible]
+    backend_node_ids = np.asarray(document["nodes"]["backendNodeId"])[node_indices]
+    return backend_node_ids.tolist()
+
+
+def assemble_partial_accessibility_tree(
+    nodes: dict[str, AccessibilityTreeNode]
+) -> AccessibilityTree:
+    """Join partial AX trees into one tree rooted at the RootWebArea.
+
+    Children that were not fetched are off screen; they are dropped from
+    their parent's childIds so the tree only links fetched nodes.
+    """
+    for node in nodes.values():
+        node["childIds"] = [
+            child_id for child_id in node.get("childIds", []) if child_id in nodes
+        ]
+    roots = [
+        node_id
+        for node_id, node in nodes.items()
+        if node.get("parentId") not in nodes
+    ]
+    # the tree is walked from its first node
+    root_id = next(
+        (
+            node_id
+            for node_id in roots
+            if nodes[node_id]["role"]["value"] == "RootWebArea"
+        ),
+        roots[0],
+    )
+    return [nodes[root_id]] + [
+        node for node_id, node in nodes.items() if node_id != root_id
+    ]
+
+
+def observation_line_differences(observation: str, reference: str) -> list[str]:
+    """Lines of `reference` missing from `observation` (-) and extra ones (+)"""
+    lines = Counter(observation.split("\n"))
+    reference_lines = Counter(reference.split("\n"))
+    return [f"- {line}" for line in (reference_lines - lines).elements()] + [
+        f"+ {line}" for line in (lines - reference_lines).elements()
+    ]
+
+
+def format_tab_titles(tab_titles: list[str], current_tab_idx: int) -> str:
+    for idx in range(len(tab_titles)):
+        if idx == current_tab_idx:
+            tab_titles[idx] = f"Tab {idx} (current): {tab_titles[idx]}"
+        else:
+            tab_titles[idx] = f"Tab {idx}: {tab_titles[idx]}"
+    return " | ".join(tab_titles)
+
+
+def fetch_browser_info_with_retry(processor: Any, page: Page) -> BrowserInfo:
+    try:
+        return processor.fetch_browser_info(page)
+    except Exception:
+        page.wait_for_load_state("load", timeout=500)
+        return processor.fetch_browser_info(page)
+
+
 class TextObervationProcessor(ObservationProcessor):
     def __init__(
         self,
@@ -88,14 +258,42 @@ class TextObervationProcessor(ObservationProcessor):
         current_viewport_only: bool,
         viewport_size: ViewportSize,
         captioning_fn=None,
+        observation_token_budget: int = 0,
+        ax_fetch_mode: str = "full",
+        observation_dialect: str = "default",
     ):
         self.observation_type = observation_type
         self.current_viewport_only = current_viewport_only
         self.viewport_size = viewport_size
+        # when positive, low-value subtrees are pruned to fit this many tokens
+        self.observation_token_budget = observation_token_budget
+        # "viewport" fetches only the AX subtrees on screen when
+        # current_viewport_only is set; "full" fetches the whole tree
+        if ax_fetch_mode not in AX_FETCH_MODES:
+            raise ValueError(f"Unsupported AX fetch mode: {ax_fetch_mode}")
+        self.ax_fetch_mode = ax_fetch_mode
+        # "compact" serializes the accessibility tree with short ids and
+        # abbreviated roles, for prompts written in that dialect
+        if observation_dialect not in OBSERVATION_DIALECTS:
+            raise ValueError(f"Unsupported observation dialect: {observation_dialect}")
+        self.observation_dialect = observation_dialect
         self.observation_tag = "text"
         self.meta_data = (
             create_empty_metadata()
         )  # use the store meta data of this observation type
+        # partial fetches, full fallbacks and check results of the
+        # viewport fetch mode
+        self.ax_fetch_stats: Counter[str] = Counter()
+        # keeps the AX tree up to date from change events between steps
+        self.ax_mirror: AXMirror | None = None
+        # shifts the previous tree instead of fetching it after a scroll
+        self.scroll_reuse: ScrollReuseCache | None = None
+        self.scroll_state: dict[str, Any] | None = None
+        self.scroll_entry: ScrollEntry | None = None
+        # caches tab titles and the observations of unchanged tabs
+        self.tab_cache: TabObservationCache | None = None
+        # the last observation without the tab header
+        self.page_content = ""
 
         if self.observation_type in [
             "accessibility_tree_with_captioner",
@@ -111,42 +309,12 @@ class TextObervationProcessor(ObservationProcessor):
     ) -> BrowserInfo:
         # extract domtree
         tree = page.context.new_cdp_session(page).send(
-            "DOMSnapshot.captureSnapshot",
-            {
-                "computedStyles": [],
-                "includeDOMRects": True,
-                "includePaintOrder": True,
-            },
+            "DOMSnapshot.captureSnapshot", DOM_SNAPSHOT_PARAMS
         )
-
-        # calibrate the bounds, in some cases, the bounds are scaled somehow
-        bounds = tree["documents"][0]["layout"]["bounds"]
-        b = bounds[0]
-        n = b[2] / self.viewport_size["width"]
-        bounds = [[x / n for x in bound] for bound in bounds]
-        tree["documents"][0]["layout"]["bounds"] = bounds
-        # add union bound placeholder
-        tree["documents"][0]["layout"]["unionBounds"] = [None for _ in bounds]
+        calibrate_dom_snapshot(tree, self.viewport_size)
 
         # extract browser info
-        win_upper_bound = page.evaluate("window.pageYOffset")
-        win_left_bound = page.evaluate("window.pageXOffset")
-        win_width = page.evaluate("window.screen.width")
-        win_height = page.evaluate("window.screen.height")
-        win_right_bound = win_left_bound + win_width
-        win_lower_bound = win_upper_bound + win_height
-        device_pixel_ratio = page.evaluate("window.devicePixelRatio")
-        assert device_pixel_ratio == 1.0, "devicePixelRatio is not 1.0"
-
-        config: BrowserConfig = {
-            "win_upper_bound": win_upper_bound,
-            "win_left_bound": win_left_bound,
-            "win_width": win_width,
-            "win_height": win_height,
-            "win_right_bound": win_right_bound,
-            "win_lower_bound": win_lower_bound,
-            "device_pixel_ratio": device_pixel_ratio,
-        }
+        config = create_browser_config(*page.evaluate(WINDOW_METRICS_SCRIPT))
 
         # assert len(tree['documents']) == 1, "More than one document in the DOM tree"
         info: BrowserInfo = {"DOMTree": tree, "config": config}
@@ -166,19 +334,7 @@ class TextObervationProcessor(ObservationProcessor):
                 "Runtime.callFunctionOn",
                 {
                     "objectId": remote_object_id,
-                    "functionDeclaration": """
-                        function() {
-                            if (this.nodeType == 3) {
-                                var range = document.createRange();
-                                range.selectNode(this);
-                                var rect = range.getBoundingClientRect().toJSON();
-                                range.detach();
-                                return rect;
-                            } else {
-                                return this.getBoundingClientRect().toJSON();
-                            }
-                        }
-                    """,
+                    "functionDeclaration": BOUNDING_CLIENT_RECT_FUNCTION,
                     "returnByValue": True,
                 },
             )
@@ -217,14 +373,11 @@ class TextObervationProcessor(ObservationProcessor):
         ratio = overlap_width * overlap_height / width * height
         return ratio
 
-    def fetch_page_html(
-        self,
-        info: BrowserInfo,
-        page: Page,
-        current_viewport_only: bool,
-    ) -> DOMTree:
+    @staticmethod
+    def build_dom_tree(tree: dict[str, Any]) -> DOMTree:
+        """Turn a DOM snapshot into a node list with parent/child links; only
+        the root gets a union bound"""
         # adopted from [natbot](https://github.com/nat/natbot)
-        tree = info["DOMTree"]
         strings = tree["strings"]
         document = tree["documents"][0]
         nodes = document["nodes"]
@@ -278,21 +431,8 @@ class TextObervationProcessor(ObservationProcessor):
             if cur_node["parentId"] != "-1":
                 graph[cur_node["parentId"]].append(str(cur_node["nodeId"]))
 
-            # get the bound
             if cur_node["parentId"] == "-1":
                 cur_node["union_bound"] = [0.0, 0.0, 10.0, 10.0]
-            else:
-                response = self.get_bounding_client_rect(
-                    page.context.new_cdp_session(page), cur_node["backendNodeId"]
-                )
-                if response.get("result", {}).get("subtype", "") == "error":
-                    cur_node["union_bound"] = None
-                else:
-                    x = response["result"]["value"]["x"]
-                    y = response["result"]["value"]["y"]
-                    width = response["result"]["value"]["width"]
-                    height = response["result"]["value"]["height"]
-                    cur_node["union_bound"] = [x, y, width, height]
 
             dom_tree.append(cur_node)
 
@@ -300,59 +440,82 @@ class TextObervationProcessor(ObservationProcessor):
         for parent_id, child_ids in graph.items():
             dom_tree[int(parent_id)]["childIds"] = child_ids
 
-        # remove the nodes that are not in the current viewport
-        if current_viewport_only:
+        return dom_tree
 
-            def remove_node_in_graph(node: DOMNode) -> None:
-                # update the node information in the accessibility tree
-                node_id = node["nodeId"]
-                parent_id = node["parentId"]
-                child_ids = node["childIds"]
-
-                # update the children of the parent node
-                assert dom_tree[int(parent_id)]["parentId"] != "[REMOVED]"
-                # remove the nodeid from parent
-                index = dom_tree[int(parent_id)]["childIds"].index(node_id)
-                dom_tree[int(parent_id)]["childIds"].pop(index)
-
-                # Insert children_nodeids in the same location
-                for child_id in child_ids:
-                    dom_tree[int(parent_id)]["childIds"].insert(index, child_id)
-                    index += 1
-
-                # update children node's parent
-                for child_id in child_ids:
-                    dom_tree[int(child_id)]["parentId"] = parent_id
-                # mark as removed
-                dom_tree[int(node_id)]["parentId"] = "[REMOVED]"
-
-            config = info["config"]
-            for cursor, node in enumerate(dom_tree):
-                if not node["union_bound"]:
-                    remove_node_in_graph(node)
-                    continue
+    @classmethod
+    def filter_dom_tree_by_viewport(
+        cls, dom_tree: DOMTree, config: BrowserConfig
+    ) -> DOMTree:
+        """Remove the nodes that are not in the current viewport"""
+
+        def remove_node_in_graph(node: DOMNode) -> None:
+            # update the node information in the accessibility tree
+            node_id = node["nodeId"]
+            parent_id = node["parentId"]
+            child_ids = node["childIds"]
+
+            # update the children of the parent node
+            assert dom_tree[int(parent_id)]["parentId"] != "[REMOVED]"
+            # remove the nodeid from parent
+            index = dom_tree[int(parent_id)]["childIds"].index(node_id)
+            dom_tree[int(parent_id)]["childIds"].pop(index)
+
+            # Insert children_nodeids in the same location
+            for child_id in child_ids:
+                dom_tree[int(parent_id)]["childIds"].insert(index, child_id)
+                index += 1
+
+            # update children node's parent
+            for child_id in child_ids:
+                dom_tree[int(child_id)]["parentId"] = parent_id
+            # mark as removed
+            dom_tree[int(node_id)]["parentId"] = "[REMOVED]"
+
+        for cursor, node in enumerate(dom_tree):
+            if not node["union_bound"]:
+                remove_node_in_graph(node)
+                continue
 
-                [x, y, width, height] = node["union_bound"]
+            [x, y, width, height] = node["union_bound"]
 
-                # invisible node
-                if width == 0.0 or height == 0.0:
-                    remove_node_in_graph(node)
-                    continue
+            # invisible node
+            if width == 0.0 or height == 0.0:
+                remove_node_in_graph(node)
+                continue
 
-                in_viewport_ratio = self.get_element_in_viewport_ratio(
-                    elem_left_bound=float(x),
-                    elem_top_bound=float(y),
-                    width=float(width),
-                    height=float(height),
-                    config=config,
-                )
+            in_viewport_ratio = cls.get_element_in_viewport_ratio(
+                elem_left_bound=float(x),
+                elem_top_bound=float(y),
+                width=float(width),
+                height=float(height),
+                config=config,
+            )
 
-                if in_viewport_ratio < IN_VIEWPORT_RATIO_THRESHOLD:
-                    remove_node_in_graph(node)
+            if in_viewport_ratio < IN_VIEWPORT_RATIO_THRESHOLD:
+                remove_node_in_graph(node)
 
-            dom_tree = [
-                node for node in dom_tree if node.get("parentId", "-1") != "[REMOVED]"
-            ]
+        return [
+            node for node in dom_tree if node.get("parentId", "-1") != "[REMOVED]"
+        ]
+
+    def fetch_page_html(
+        self,
+        info: BrowserInfo,
+        page: Page,
+        current_viewport_only: bool,
+    ) -> DOMTree:
+        dom_tree = self.build_dom_tree(info["DOMTree"])
+
+        # get the bound
+        for cur_node in dom_tree:
+            if cur_node["parentId"] != "-1":
+                response = self.get_bounding_client_rect(
+                    page.context.new_cdp_session(page), cur_node["backendNodeId"]
+                )
+                cur_node["union_bound"] = union_bound_from_rect(response)
+
+        if current_viewport_only:
+            dom_tree = self.filter_dom_tree_by_viewport(dom_tree, info["config"])
 
         return dom_tree
 
@@ -397,17 +560,10 @@ class TextObervationProcessor(ObservationProcessor):
         html = dfs(0, 0)
         return html, obs_nodes_info
 
-    def fetch_page_accessibility_tree(
-        self,
-        page: Page,
-        info: BrowserInfo,
-        current_viewport_only: bool,
+    @staticmethod
+    def dedupe_accessibility_tree(
+        accessibility_tree: AccessibilityTree,
     ) -> AccessibilityTree:
-        client = page.context.new_cdp_session(page)
-        accessibility_tree: AccessibilityTree = client.send(
-            "Accessibility.getFullAXTree", {}
-        )["nodes"]
-
         # a few nodes are repeated in the accessibility tree
         seen_ids = set()
         _accessibility_tree = []
@@ -415,11 +571,143 @@ class TextObervationProcessor(ObservationProcessor):
             if node["nodeId"] not in seen_ids:
                 _accessibility_tree.append(node)
                 seen_ids.add(node["nodeId"])
-        accessibility_tree = _accessibility_tree
+        return _accessibility_tree
 
-        nodeid_to_cursor = {}
-        for cursor, node in enumerate(accessibility_tree):
-            nodeid_to_cursor[node["nodeId"]] = cursor
+    @classmethod
+    def filter_accessibility_tree_by_viewport(
+        cls, accessibility_tree: AccessibilityTree, config: BrowserConfig
+    ) -> AccessibilityTree:
+        """Remove the nodes that are not in the current viewport"""
+        nodeid_to_cursor = {
+            node["nodeId"]: cursor for cursor, node in enumerate(accessibility_tree)
+        }
+
+        def remove_node_in_graph(node: AccessibilityTreeNode) -> None:
+            # update the node information in the accessibility tree
+            nodeid = node["nodeId"]
+            node_cursor = nodeid_to_cursor[nodeid]
+            parent_nodeid = node["parentId"]
+            children_nodeids = node["childIds"]
+            parent_cursor = nodeid_to_cursor[parent_nodeid]
+            # update the children of the parent node
+            assert (
+                accessibility_tree[parent_cursor].get("parentId", "Root")
+                is not None
+            )
+            # remove the nodeid from parent's childIds
+            index = accessibility_tree[parent_cursor]["childIds"].index(nodeid)
+            accessibility_tree[parent_cursor]["childIds"].pop(index)
+            # Insert children_nodeids in the same location
+            for child_nodeid in children_nodeids:
+                accessibility_tree[parent_cursor]["childIds"].insert(
+                    index, child_nodeid
+                )
+                index += 1
+            # update children node's parent
+            for child_nodeid in children_nodeids:
+                child_cursor = nodeid_to_cursor[child_nodeid]
+                accessibility_tree[child_cursor]["parentId"] = parent_nodeid
+            # mark as removed
+            accessibility_tree[node_cursor]["parentId"] = "[REMOVED]"
+
+        for node in accessibility_tree:
+            if not node["union_bound"]:
+                remove_node_in_graph(node)
+                continue
+
+            [x, y, width, height] = node["union_bound"]
+
+            # invisible node
+            if width == 0 or height == 0:
+                remove_node_in_graph(node)
+                continue
+
+            in_viewport_ratio = cls.get_element_in_viewport_ratio(
+                elem_left_bound=float(x),
+                elem_top_bound=float(y),
+                width=float(width),
+                height=float(height),
+                config=config,
+            )
+
+            if in_viewport_ratio < IN_VIEWPORT_RATIO_THRESHOLD:
+                remove_node_in_graph(node)
+
+        return [
+            node
+            for node in accessibility_tree
+            if node.get("parentId", "Root") != "[REMOVED]"
+        ]
+
+    def fetch_viewport_accessibility_tree(
+        self, client: CDPSession, info: BrowserInfo
+    ) -> AccessibilityTree | None:
+        """AX nodes of the DOM nodes on screen, with their ancestors.
+
+        Each partial fetch also returns the node's children and siblings, so
+        DOM nodes that an earlier fetch already covered are skipped. Returns
+        None when nothing on screen was found, or when the screen needs more
+        than MAX_PARTIAL_AX_FETCHES fetches.
+        """
+        nodes: dict[str, AccessibilityTreeNode] = {}
+        covered: set[int] = set()
+        fetches = 0
+        # layout order is document order, so parents come before children
+        for backend_node_id in viewport_backend_node_ids(info):
+            if backend_node_id in covered:
+                continue
+            if fetches == MAX_PARTIAL_AX_FETCHES:
+                self.ax_fetch_stats["full_fallbacks"] += 1
+                return None
+            fetches += 1
+            self.ax_fetch_stats["partial_fetches"] += 1
+            try:
+                response = client.send(
+                    "Accessibility.getPartialAXTree",
+                    {"backendNodeId": backend_node_id, "fetchRelatives": True},
+                )
+            except Exception:
+                # nodes without an AX counterpart, e.g. in detached subtrees
+                continue
+            for node in response["nodes"]:
+                nodes.setdefault(node["nodeId"], node)
+                if "backendDOMNodeId" in node:
+                    covered.add(node["backendDOMNodeId"])
+        if not nodes:
+            self.ax_fetch_stats["full_fallbacks"] += 1
+            return None
+        return assemble_partial_accessibility_tree(nodes)
+
+    def compare_viewport_accessibility_tree(
+        self, viewport_tree: AccessibilityTree, full_tree: AccessibilityTree
+    ) -> AccessibilityTree:
+        """Compare the viewport-filtered results of both fetch modes.
+
+        Differences are reported and the full tree is used, so the check
+        mode is safe to run on real tasks.
+        """
+        viewport_text, _ = self.parse_accessibility_tree(viewport_tree)
+        full_text, _ = self.parse_accessibility_tree(full_tree)
+        differences = observation_line_differences(viewport_text, full_text)
+        self.ax_fetch_stats["checked_reads"] += 1
+        if not differences:
+            return viewport_tree
+        self.ax_fetch_stats["mismatched_reads"] += 1
+        self.ax_fetch_stats["mismatched_lines"] += len(differences)
+        print(
+            f"WARNING: viewport AX fetch differs from the full fetch in {len(differences)} lines, e.g. {differences[:5]}"
+        )
+        return full_tree
+
+    def pop_ax_fetch_stats(self) -> dict[str, int]:
+        stats = dict(self.ax_fetch_stats)
+        self.ax_fetch_stats.clear()
+        return stats
+
+    def add_union_bounds(
+        self, client: CDPSession, accessibility_tree: AccessibilityTree
+    ) -> None:
+        for node in accessibility_tree:
             # usually because the node is not visible etc
             if "backendDOMNodeId" not in node:
                 node["union_bound"] = None
@@ -433,79 +721,123 @@ class TextObervationProcessor(ObservationProcessor):
                     client,
                     backend_node_id
                 )
-                if response.get("result", {}).get("subtype", "") == "error":
-                    node["union_bound"] = None
-                else:
-                    x = response["result"]["value"]["x"]
-                    y = response["result"]["value"]["y"]
-                    width = response["result"]["value"]["width"]
-                    height = response["result"]["value"]["height"]
-                    node["union_bound"] = [x, y, width, height]
-
-        client.detach()
-        # filter nodes that are not in the current viewport
-        if current_viewport_only:
-
-            def remove_node_in_graph(node: AccessibilityTreeNode) -> None:
-                # update the node information in the accessibility tree
-                nodeid = node["nodeId"]
-                node_cursor = nodeid_to_cursor[nodeid]
-                parent_nodeid = node["parentId"]
-                children_nodeids = node["childIds"]
-                parent_cursor = nodeid_to_cursor[parent_nodeid]
-                # update the children of the parent node
-                assert (
-                    accessibility_tree[parent_cursor].get("parentId", "Root")
-                    is not None
+                node["union_bound"] = union_bound_from_rect(response)
+
+    def scroll_reuse_info(self, page: Page) -> BrowserInfo | None:
+        """Browser info for reusing the previous tree, None if it cannot be"""
+        self.scroll_state = self.scroll_entry = None
+        if (
+            self.scroll_reuse is None
+            or self.observation_type != "accessibility_tree"
+            or self.ax_fetch_mode != "full"
+            # scrolls inside frames are not tracked
+            or len(page.frames) > 1
+        ):
+            return None
+        self.scroll_state = self.scroll_reuse.page_state(page)
+        self.scroll_entry = self.scroll_reuse.lookup(page, self.scroll_state)
+        if self.scroll_entry is None:
+            return None
+        # the tree is not rebuilt, so the DOM snapshot is not needed
+        config = create_browser_config(*page.evaluate(WINDOW_METRICS_SCRIPT))
+        return {"DOMTree": {}, "config": config}
+
+    def reuse_scrolled_accessibility_tree(
+        self, page: Page, entry: ScrollEntry, state: dict[str, Any]
+    ) -> AccessibilityTree:
+        accessibility_tree, pinned = self.scroll_reuse.shifted_tree(entry, state)
+        if pinned:
+            # fixed and sticky elements do not move with the document
+            client = page.context.new_cdp_session(page)
+            for node in pinned:
+                response = self.get_bounding_client_rect(
+                    client, str(node["backendDOMNodeId"])
                 )
-                # remove the nodeid from parent's childIds
-                index = accessibility_tree[parent_cursor]["childIds"].index(nodeid)
-                accessibility_tree[parent_cursor]["childIds"].pop(index)
-                # Insert children_nodeids in the same location
-                for child_nodeid in children_nodeids:
-                    accessibility_tree[parent_cursor]["childIds"].insert(
-                        index, child_nodeid
-                    )
-                    index += 1
-                # update children node's parent
-                for child_nodeid in children_nodeids:
-                    child_cursor = nodeid_to_cursor[child_nodeid]
-                    accessibility_tree[child_cursor]["parentId"] = parent_nodeid
-                # mark as removed
-                accessibility_tree[node_cursor]["parentId"] = "[REMOVED]"
-
-            config = info["config"]
-            for node in accessibility_tree:
-                if not node["union_bound"]:
-                    remove_node_in_graph(node)
-                    continue
-
-                [x, y, width, height] = node["union_bound"]
-
-                # invisible node
-                if width == 0 or height == 0:
-                    remove_node_in_graph(node)
-                    continue
+                node["union_bound"] = union_bound_from_rect(response)
+            client.detach()
+        return accessibility_tree
 
-                in_viewport_ratio = self.get_element_in_viewport_ratio(
-                    elem_left_bound=float(x),
-                    elem_top_bound=float(y),
-                    width=float(width),
-                    height=float(height),
-                    config=config,
+    def fetch_page_accessibility_tree(
+        self,
+        page: Page,
+        info: BrowserInfo,
+        current_viewport_only: bool,
+    ) -> AccessibilityTree:
+        scroll_state, scroll_entry = self.scroll_state, self.scroll_entry
+        self.scroll_state = self.scroll_entry = None
+        if scroll_entry is not None:
+            accessibility_tree = self.reuse_scrolled_accessibility_tree(
+                page, scroll_entry, scroll_state
+            )
+            if current_viewport_only:
+                accessibility_tree = self.filter_accessibility_tree_by_viewport(
+                    accessibility_tree, info["config"]
                 )
+            return accessibility_tree
 
-                if in_viewport_ratio < IN_VIEWPORT_RATIO_THRESHOLD:
-                    remove_node_in_graph(node)
-
-            accessibility_tree = [
-                node
-                for node in accessibility_tree
-                if node.get("parentId", "Root") != "[REMOVED]"
-            ]
+        client = page.context.new_cdp_session(page)
+        accessibility_tree = None
+        if current_viewport_only and self.ax_fetch_mode != "full":
+            accessibility_tree = self.fetch_viewport_accessibility_tree(
+                client, info
+            )
+        check_viewport_fetch = (
+            accessibility_tree is not None and self.ax_fetch_mode == "check"
+        )
+        if accessibility_tree is None and self.ax_mirror is not None:
+            accessibility_tree = self.ax_mirror.tree(page)
+        if accessibility_tree is None:
+            accessibility_tree = client.send(
+                "Accessibility.getFullAXTree", {}
+            )["nodes"]
+        accessibility_tree = self.dedupe_accessibility_tree(accessibility_tree)
+        self.add_union_bounds(client, accessibility_tree)
+
+        if self.scroll_reuse is not None and info["DOMTree"]:
+            self.scroll_reuse.store(
+                page, scroll_state, accessibility_tree, info["DOMTree"]
+            )
+        # filter nodes that are not in the current viewport
+        if current_viewport_only:
+            accessibility_tree = self.filter_accessibility_tree_by_viewport(
+                accessibility_tree, info["config"]
+            )
+        if check_viewport_fetch:
+            full_tree = self.dedupe_accessibility_tree(
+                client.send("Accessibility.getFullAXTree", {})["nodes"]
+            )
+            self.add_union_bounds(client, full_tree)
+            full_tree = self.filter_accessibility_tree_by_viewport(
+                full_tree, info["config"]
+            )
+            accessibility_tree = self.compare_viewport_accessibility_tree(
+                accessibility_tree, full_tree
+            )
 
+        client.detach()
         return accessibility_tree
 
+    def prune_accessibility_tree(
+        self, accessibility_tree: AccessibilityTree
+    ) -> AccessibilityTree:
+        """Fit the tree into the token budget by dropping low-value subtrees"""
+        if not self.observation_token_budget:
+            return accessibility_tree
+        return prune_accessibility_tree(
+            accessibility_tree,
+            self.observation_token_budget,
+            self.viewport_size,
+        )
+
+    def serialize_accessibility_tree(
+        self, accessibility_tree: AccessibilityTree
+    ) -> tuple[str, dict[str, Any]]:
+        """The observation text of the tree in the configured dialect"""
+        if self.observation_dialect == "compact":
+            return serialize_compact_accessibility_tree(accessibility_tree)
+        content, obs_nodes_info = self.parse_accessibility_tree(accessibility_tree)
+        return self.clean_accesibility_tree(content), obs_nodes_info
+
     @staticmethod
     def parse_accessibility_tree(
         accessibility_tree: AccessibilityTree,
@@ -709,6 +1041,7 @@ class TextObervationProcessor(ObservationProcessor):
                     browser_info,
                     current_viewport_only=self.current_viewport_only
                 )
+                frame_ax_trees = self.prune_accessibility_tree(frame_ax_trees)
                 content, obs_nodes_info = self.parse_accessibility_tree(frame_ax_trees)
                 content = self.clean_accesibility_tree(content)
                 self.obs_nodes_info = obs_nodes_info
@@ -718,26 +1051,25 @@ class TextObervationProcessor(ObservationProcessor):
 
         return content
 
-    def process(self, page: Page) -> str:
-        # get the tab info
+    def tab_header(self, page: Page) -> str:
         open_tabs = page.context.pages
         try:
-            tab_titles = [tab.title() for tab in open_tabs]
-            current_tab_idx = open_tabs.index(page)
-            for idx in range(len(open_tabs)):
-                if idx == current_tab_idx:
-                    tab_titles[idx] = f"Tab {idx} (current): {open_tabs[idx].title()}"
-                else:
-                    tab_titles[idx] = f"Tab {idx}: {open_tabs[idx].title()}"
-            tab_title_str = " | ".join(tab_titles)
+            if self.tab_cache is not None:
+                tab_titles = self.tab_cache.tab_titles(page)
+            else:
+                tab_titles = [tab.title() for tab in open_tabs]
+            return format_tab_titles(tab_titles, open_tabs.index(page))
         except Exception:
-            tab_title_str = " | ".join([f"Tab {idx}" for idx in range(len(open_tabs))])
+            return " | ".join([f"Tab {idx}" for idx in range(len(open_tabs))])
 
-        try:
-            browser_info = self.fetch_browser_info(page)
-        except Exception:
-            page.wait_for_load_state("load", timeout=500)
-            browser_info = self.fetch_browser_info(page)
+    def process(self, page: Page, browser_info: BrowserInfo | None = None) -> str:
+        # get the tab info
+        tab_title_str = self.tab_header(page)
+
+        if browser_info is None:
+            browser_info = self.scroll_reuse_info(
+                page
+            ) or fetch_browser_info_with_retry(self, page)
 
         if self.observation_type == "html":
             dom_tree = self.fetch_page_html(
@@ -755,8 +1087,10 @@ class TextObervationProcessor(ObservationProcessor):
                 browser_info,
                 self.current_viewport_only,
             )
-            content, obs_nodes_info = self.parse_accessibility_tree(accessibility_tree)
-            content = self.clean_accesibility_tree(content)
+            accessibility_tree = self.prune_accessibility_tree(accessibility_tree)
+            content, obs_nodes_info = self.serialize_accessibility_tree(
+                accessibility_tree
+            )
             self.obs_nodes_info = obs_nodes_info
             self.meta_data["obs_nodes_info"] = obs_nodes_info
 
@@ -776,6 +1110,7 @@ class TextObervationProcessor(ObservationProcessor):
             raise ValueError(f"Invalid observation type: {self.observation_type}")
 
         self.browser_config = browser_info["config"]
+        self.page_content = content
         content = f"{tab_title_str}\n\n{content}"
 
         return content
@@ -805,57 +1140,8 @@ class ImageObservationProcessor(ObservationProcessor):
 
     def get_page_bboxes(self, page: Page) -> list[list[float]]:
         """JavaScript code to return bounding boxes and other metadata from HTML elements."""
-        js_script = """
-        (() => {
-            const interactableSelectors = [
-                'a[href]:not(:has(img))', 'a[href] img', 'button', 'input:not([type="hidden"])', 'textarea', 'select',
-                '[tabindex]:not([tabindex="-1"])', '[contenteditable="true"]', '[role="button"]', '[role="link"]',
-                '[role="checkbox"]', '[role="menuitem"]', '[role="tab"]', '[draggable="true"]',
-                '.btn', 'a[href="/notifications"]', 'a[href="/submit"]', '.fa.fa-star.is-rating-item', 'input[type="checkbox"]'
-
-            ];
-
-            const textSelectors = ['p', 'span', 'div:not(:has(*))', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'article'];
-            const modifiedTextSelectors = textSelectors.map(selector =>
-                `:not(${interactableSelectors.join(', ')}):not(style) > ${selector}`
-            );
-
-            const combinedSelectors = [...interactableSelectors, ...modifiedTextSelectors];
-            const elements = document.querySelectorAll(combinedSelectors.join(', '));
-
-            const pixelRatio = window.devicePixelRatio;
-            let csvContent = "ID,Element,Top,Right,Bottom,Left,Width,Height,Alt,Class,Id,TextContent,Interactable\\n";
-            let counter = 1;
-
-            elements.forEach(element => {
-                const rect = element.getBoundingClientRect();
-                if (rect.width === 0 || rect.height === 0) return;
-                let altText = element.getAttribute('alt') || '';
-                altText = altText.replace(/"/g, ''); // Escape double quotes in alt text
-                const classList = element.className || '';
-                const id = element.id || '';
-                let textContent = element.textContent || '';
-                textContent = textContent.replace(/"/g, ''); // Escape double quotes in textContent
-
-                // Determine if the element is interactable
-                const isInteractable = interactableSelectors.some(selector => element.matches(selector));
-
-                const dataString = [
-                    counter, element.tagName, (rect.top + window.scrollY) * pixelRatio,
-                    (rect.right + window.scrollX) * pixelRatio, (rect.bottom + window.scrollY) * pixelRatio,
-                    (rect.left + window.scrollX) * pixelRatio, rect.width * pixelRatio, rect.height * pixelRatio,
-                    altText, classList, id, textContent, isInteractable
-                ].map(value => `"${value}"`).join(",");
-
-                csvContent += dataString + "\\n";
-                counter++;
-            });
-
-            return csvContent;
-        })();
-        """
         # Save the bbox as a CSV
-        csv_content = page.evaluate(js_script)
+        csv_content = call_page_script(page, "pageBboxes")
         return csv_content
 
     def draw_bounding_boxes(
@@ -1106,44 +1392,40 @@ class ImageObservationProcessor(ObservationProcessor):
             or rect1[3] < rect2[1] + padding
         )
 
-    def process(self, page: Page) -> npt.NDArray[np.uint8]:
-        try:
-            browser_info = self.fetch_browser_info(page)
-        except Exception:
-            page.wait_for_load_state("load", timeout=500)
-            browser_info = self.fetch_browser_info(page)
+    def build_som_observation(
+        self, screenshot_bytes: bytes, som_bboxes: str
+    ) -> tuple[npt.NDArray[np.uint8], str]:
+        """Draw the SoM bounding boxes on the screenshot"""
+        screenshot_img = Image.open(BytesIO(screenshot_bytes))
+        bbox_img, id2center, content_str = self.draw_bounding_boxes(
+            som_bboxes,
+            screenshot_img,
+            viewport_size=self.viewport_size,
+        )
+        self.som_id_info = id2center
+        self.meta_data["obs_nodes_info"] = id2center
+        screenshot_som = np.array(bbox_img)
+        return screenshot_som, content_str
+
+    def process(
+        self, page: Page, browser_info: BrowserInfo | None = None
+    ) -> npt.NDArray[np.uint8]:
+        if browser_info is None:
+            browser_info = fetch_browser_info_with_retry(self, page)
 
         self.browser_config = browser_info["config"]
 
         if self.observation_type == "image_som":
             # Produce the SoM image, with bounding boxes
             try:
-                screenshot_bytes = page.screenshot()
-                som_bboxes = self.get_page_bboxes(page)
-                screenshot_img = Image.open(BytesIO(screenshot_bytes))
-                bbox_img, id2center, content_str = self.draw_bounding_boxes(
-                    som_bboxes,
-                    screenshot_img,
-                    viewport_size=self.viewport_size,
+                return self.build_som_observation(
+                    page.screenshot(), self.get_page_bboxes(page)
                 )
-                self.som_id_info = id2center
-                self.meta_data["obs_nodes_info"] = id2center
-                screenshot_som = np.array(bbox_img)
-                return screenshot_som, content_str
             except:
                 page.wait_for_event("load")
-                screenshot_bytes = page.screenshot()
-                som_bboxes = self.get_page_bboxes(page)
-                screenshot_img = Image.open(BytesIO(screenshot_bytes))
-                bbox_img, id2center, content_str = self.draw_bounding_boxes(
-                    som_bboxes,
-                    screenshot_img,
-                    viewport_size=self.viewport_size,
+                return self.build_som_observation(
+                    page.screenshot(), self.get_page_bboxes(page)
                 )
-                self.som_id_info = id2center
-                self.meta_data["obs_nodes_info"] = id2center
-                screenshot_som = np.array(bbox_img)
-                return screenshot_som, content_str
         else:
             try:
                 screenshot = png_bytes_to_numpy(page.screenshot())
@@ -1155,43 +1437,12 @@ class ImageObservationProcessor(ObservationProcessor):
     def fetch_browser_info(self, page: Page) -> BrowserInfo:
         client = page.context.new_cdp_session(page)
         # extract domtree
-        tree = client.send(
-            "DOMSnapshot.captureSnapshot",
-            {
-                "computedStyles": [],
-                "includeDOMRects": True,
-                "includePaintOrder": True,
-            },
-        )
+        tree = client.send("DOMSnapshot.captureSnapshot", DOM_SNAPSHOT_PARAMS)
         client.detach()
-        # calibrate the bounds, in some cases, the bounds are scaled somehow
-        bounds = tree["documents"][0]["layout"]["bounds"]
-        b = bounds[0]
-        n = b[2] / self.viewport_size["width"]
-        bounds = [[x / n for x in bound] for bound in bounds]
-        tree["documents"][0]["layout"]["bounds"] = bounds
-        # add union bound placeholder
-        tree["documents"][0]["layout"]["unionBounds"] = [None for _ in bounds]
+        calibrate_dom_snapshot(tree, self.viewport_size)
 
         # extract browser info
-        win_upper_bound = page.evaluate("window.pageYOffset")
-        win_left_bound = page.evaluate("window.pageXOffset")
-        win_width = page.evaluate("window.screen.width")
-        win_height = page.evaluate("window.screen.height")
-        win_right_bound = win_left_bound + win_width
-        win_lower_bound = win_upper_bound + win_height
-        device_pixel_ratio = page.evaluate("window.devicePixelRatio")
-        assert device_pixel_ratio == 1.0, "devicePixelRatio is not 1.0"
-
-        config: BrowserConfig = {
-            "win_upper_bound": win_upper_bound,
-            "win_left_bound": win_left_bound,
-            "win_width": win_width,
-            "win_height": win_height,
-            "win_right_bound": win_right_bound,
-            "win_lower_bound": win_lower_bound,
-            "device_pixel_ratio": device_pixel_ratio,
-        }
+        config = create_browser_config(*page.evaluate(WINDOW_METRICS_SCRIPT))
 
         # assert len(tree['documents']) == 1, "More than one document in the DOM tree"
         info: BrowserInfo = {"DOMTree": tree, "config": config}
@@ -1219,18 +1470,29 @@ class TextObervationProcessorWebRL(TextObervationProcessor):
         current_viewport_only: bool,
         viewport_size: ViewportSize,
         captioning_fn=None,
+        observation_token_budget: int = 0,
+        ax_fetch_mode: str = "full",
+        observation_dialect: str = "default",
     ):
         super().__init__(
             observation_type,
             current_viewport_only,
             viewport_size,
             captioning_fn,
+            observation_token_budget,
+            ax_fetch_mode,
+            observation_dialect,
         )
         
-    def process(self, page: Page) -> str:
+    def process(self, page: Page, browser_info: BrowserInfo | None = None) -> str:
         # get the tab info
         page_info = get_parsed_html(page)
         html = page_info["html"]
+        self.set_obs_nodes_info(html)
+        return html
+
+    def set_obs_nodes_info(self, html: str) -> None:
+        """Collect the element bounds annotated in the parsed html"""
         from bs4 import BeautifulSoup
         soup = BeautifulSoup(html, 'html.parser')
         obs_nodes_info = {}
@@ -1246,7 +1508,6 @@ class TextObervationProcessorWebRL(TextObervationProcessor):
                 }
         self.obs_nodes_info = obs_nodes_info
         self.meta_data["obs_nodes_info"] = obs_nodes_info
-        return html
     
     def get_element_center(self, element_id: str, page: Page=None) -> tuple[float, float]:
         
@@ -1279,6 +1540,9 @@ class ObservationHandler:
         current_viewport_only: bool,
         viewport_size: ViewportSize,
         captioning_fn=None,
+        observation_token_budget: int = 0,
+        ax_fetch_mode: str = "full",
+        observation_dialect: str = "default",
     ) -> None:
         self.main_observation_type = main_observation_type
         if text_observation_type == "webrl":
@@ -1287,6 +1551,9 @@ class ObservationHandler:
                 current_viewport_only,
                 viewport_size,
                 captioning_fn,
+                observation_token_budget,
+                ax_fetch_mode,
+                observation_dialect,
             )
         else:
             self.text_processor = TextObervationProcessor(
@@ -1294,11 +1561,42 @@ class ObservationHandler:
                 current_viewport_only,
                 viewport_size,
                 captioning_fn,
+                observation_token_budget,
+                ax_fetch_mode,
+                observation_dialect,
             )
         self.image_processor = ImageObservationProcessor(
             image_observation_type, viewport_size
         )
         self.viewport_size = viewport_size
+        # seconds spent on each part of the last observation
+        self.timings: dict[str, float] = {}
+        self.tab_cache: TabObservationCache | None = None
+
+    def set_tab_cache(self, tab_cache: TabObservationCache | None) -> None:
+        self.tab_cache = tab_cache
+        self.text_processor.tab_cache = tab_cache
+
+    @property
+    def caches_tabs(self) -> bool:
+        # SoM and WebRL observations keep page-side state the cache lacks
+        return (
+            self.tab_cache is not None
+            and self.text_processor.observation_type in ["accessibility_tree", "html"]
+            and self.image_processor.observation_type == ""
+        )
+
+    def cached_tab_observation(
+        self, page: Page, entry: TabEntry
+    ) -> dict[str, Observation]:
+        self.text_processor.obs_nodes_info = entry.obs_nodes_info
+        self.text_processor.meta_data["obs_nodes_info"] = entry.obs_nodes_info
+        self.text_processor.page_content = entry.content
+        self.text_processor.browser_config = entry.browser_config
+        self.image_processor.browser_config = entry.browser_config
+        # other tabs may have changed their titles, and the current tab has
+        text_obs = f"{self.text_processor.tab_header(page)}\n\n{entry.content}"
+        return {"text": text_obs, "image": entry.image}
 
     def get_observation_space(self) -> spaces.Dict:
         text_space = spaces.Text(
@@ -1324,10 +1622,43 @@ class ObservationHandler:
         return spaces.Dict({"text": text_space, "image": image_space})
 
     def get_observation(self, page: Page) -> dict[str, Observation]:
-        text_obs = self.text_processor.process(page)
-        image_obs, content_str = self.image_processor.process(page)
+        start = time.perf_counter()
+        tab_state = None
+        if self.caches_tabs:
+            tab_state = self.tab_cache.read_state(page)
+            entry = self.tab_cache.lookup(page, tab_state)
+            if entry is not None:
+                observation = self.cached_tab_observation(page, entry)
+                self.timings = {"total": time.perf_counter() - start}
+                return observation
+        # both processors read the same DOM snapshot and window metrics
+        browser_info = self.text_processor.scroll_reuse_info(
+            page
+        ) or fetch_browser_info_with_retry(self.image_processor, page)
+        browser_info_done = time.perf_counter()
+        text_obs = self.text_processor.process(page, browser_info)
+        text_done = time.perf_counter()
+        image_obs, content_str = self.image_processor.process(page, browser_info)
+        end = time.perf_counter()
+        self.timings = {
+            "browser_info": browser_info_done - start,
+            "text": text_done - browser_info_done,
+            "image": end - text_done,
+            "total": end - start,
+        }
         if content_str != "":
             text_obs = content_str
+        if self.caches_tabs:
+            self.tab_cache.store(
+                page,
+                TabEntry(
+                    tab_state,
+                    self.text_processor.page_content,
+                    image_obs,
+                    self.text_processor.obs_nodes_info,
+                    browser_info["config"],
+                ),
+            )
         return {"text": text_obs, "image": image_obs}
 
     def get_observation_metadata(self) -> dict[str, ObservationMetadata]:
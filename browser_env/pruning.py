@@ -0,0 +1,232 @@
+"""Budget-aware pruning of the accessibility tree before serialization.
+
+Instead of cutting the tail of the serialized observation, whole subtrees are
+scored and the least useful ones are dropped until the estimated size fits the
+token budget. Surviving nodes keep their accessibility node ids, so element ids
+in the observation are the same as without pruning.
+"""
+from typing import Callable
+
+from playwright.sync_api import ViewportSize
+
+from .constants import IGNORED_ACTREE_PROPERTIES
+from .utils import AccessibilityTree, AccessibilityTreeNode
+
+# elements the agent can act on
+INTERACTIVE_ROLES = {
+    "button",
+    "link",
+    "menuitem",
+    "menuitemcheckbox",
+    "menuitemradio",
+    "option",
+    "tab",
+    "treeitem",
+    "gridcell",
+}
+# elements the agent can type into or toggle
+INPUT_ROLES = {
+    "textbox",
+    "searchbox",
+    "combobox",
+    "listbox",
+    "checkbox",
+    "radio",
+    "spinbutton",
+    "slider",
+    "switch",
+}
+# page chrome that is rarely needed to solve a task
+LOW_VALUE_ROLES = {
+    "banner",
+    "navigation",
+    "contentinfo",
+    "complementary",
+    "separator",
+}
+# roles that parse_accessibility_tree hides when they have no name
+SILENT_ROLES = {
+    "generic",
+    "img",
+    "list",
+    "strong",
+    "paragraph",
+    "banner",
+    "navigation",
+    "Section",
+    "LabelText",
+    "Legend",
+    "listitem",
+}
+
+LOW_VALUE_DISCOUNT = 0.3
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token"""
+    return len(text) // 4 + 1
+
+
+def _is_focused(node: AccessibilityTreeNode) -> bool:
+    for prop in node.get("properties", []):
+        if prop.get("name") == "focused" and prop.get("value", {}).get("value"):
+            return True
+    return False
+
+
+def _node_line(node: AccessibilityTreeNode) -> str:
+    """Approximation of the line parse_accessibility_tree emits for the node"""
+    try:
+        role = node["role"]["value"]
+        name = node["name"]["value"]
+    except KeyError:
+        return ""
+    properties = [
+        f'{prop["name"]}: {prop["value"].get("value")}'
+        for prop in node.get("properties", [])
+        if "value" in prop and prop.get("name") not in IGNORED_ACTREE_PROPERTIES
+    ]
+    if not str(name).strip() and not properties and role in SILENT_ROLES:
+        return ""
+    return f"[{node['nodeId']}] {role} {repr(name)} " + " ".join(properties)
+
+
+def _center(node: AccessibilityTreeNode) -> tuple[float, float] | None:
+    bound = node.get("union_bound")
+    if not bound:
+        return None
+    x, y, width, height = bound
+    return x + width / 2, y + height / 2
+
+
+def _node_value(
+    node: AccessibilityTreeNode,
+    viewport_size: ViewportSize,
+    focus_center: tuple[float, float] | None,
+) -> float:
+    role = node.get("role", {}).get("value", "")
+    if role in INPUT_ROLES:
+        value = 4.0
+    elif role in INTERACTIVE_ROLES:
+        value = 3.0
+    elif role == "heading":
+        value = 1.5
+    else:
+        value = 1.0
+
+    center = _center(node)
+    if center is not None:
+        width, height = viewport_size["width"], viewport_size["height"]
+        # 1.5 at the viewport center, 0.5 at the corners and beyond
+        dx = abs(center[0] - width / 2) / (width / 2)
+        dy = abs(center[1] - height / 2) / (height / 2)
+        value *= 1.5 - min(1.0, (dx**2 + dy**2) ** 0.5 / 2**0.5)
+        if focus_center is not None:
+            distance = (
+                (center[0] - focus_center[0]) ** 2
+                + (center[1] - focus_center[1]) ** 2
+            ) ** 0.5
+            value += 2.0 * max(0.0, 1.0 - distance / height)
+    return value
+
+
+def prune_accessibility_tree(
+    accessibility_tree: AccessibilityTree,
+    max_tokens: int,
+    viewport_size: ViewportSize,
+    token_counter: Callable[[str], int] = estimate_tokens,
+) -> AccessibilityTree:
+    """Drop the lowest-value subtrees until the tree fits `max_tokens`.
+
+    Nodes are valued by role (inputs > interactive elements > headings > text),
+    position relative to the viewport center and distance to the focused
+    element; landmarks such as banners and navigation menus are discounted.
+    Subtrees are removed in order of increasing value per token. The root and
+    any subtree holding the focused element are always kept.
+    """
+    if not accessibility_tree or max_tokens <= 0:
+        return accessibility_tree
+
+    nodes: dict[str, AccessibilityTreeNode] = {
+        node["nodeId"]: node for node in accessibility_tree
+    }
+    root_id = accessibility_tree[0]["nodeId"]
+
+    focus_center = None
+    focused_ids = set()
+    for node in accessibility_tree:
+        if _is_focused(node):
+            focused_ids.add(node["nodeId"])
+            focus_center = _center(node) or focus_center
+
+    # per node cost and value, then aggregated over subtrees (post-order)
+    cost: dict[str, int] = {}
+    value: dict[str, float] = {}
+    subtree_cost: dict[str, int] = {}
+    subtree_value: dict[str, float] = {}
+    has_focus: dict[str, bool] = {}
+    order: list[str] = []
+    stack: list[tuple[str, int, float, bool]] = [(root_id, 0, 1.0, False)]
+    while stack:
+        node_id, depth, discount, expanded = stack.pop()
+        node = nodes[node_id]
+        children = [c for c in node.get("childIds", []) if c in nodes]
+        if not expanded:
+            role = node.get("role", {}).get("value", "")
+            child_discount = discount * (
+                LOW_VALUE_DISCOUNT if role in LOW_VALUE_ROLES else 1.0
+            )
+            line = _node_line(node)
+            cost[node_id] = token_counter("\t" * depth + line) if line else 0
+            value[node_id] = (
+                _node_value(node, viewport_size, focus_center) * discount
+                if line
+                else 0.0
+            )
+            order.append(node_id)
+            stack.append((node_id, depth, discount, True))
+            for child_id in reversed(children):
+                stack.append((child_id, depth + 1, child_discount, False))
+        else:
+            subtree_cost[node_id] = cost[node_id] + sum(
+                subtree_cost.get(c, 0) for c in children
+            )
+            subtree_value[node_id] = value[node_id] + sum(
+                subtree_value.get(c, 0.0) for c in children
+            )
+            has_focus[node_id] = node_id in focused_ids or any(
+                has_focus.get(c, False) for c in children
+            )
+
+    total_cost = subtree_cost[root_id]
+    if total_cost <= max_tokens:
+        return accessibility_tree
+
+    candidates = sorted(
+        (
+            node_id
+            for node_id in order
+            if node_id != root_id
+            and not has_focus[node_id]
+            and subtree_cost[node_id] > 0
+        ),
+        key=lambda node_id: subtree_value[node_id] / subtree_cost[node_id],
+    )
+
+    dropped: set[str] = set()
+    for node_id in candidates:
+        if total_cost <= max_tokens:
+            break
+        if node_id in dropped:
+            continue
+        # remove the subtree, counting only nodes that are still present
+        pending = [node_id]
+        while pending:
+            cur = pending.pop()
+            if cur in dropped:
+                continue
+            dropped.add(cur)
+            total_cost -= cost[cur]
+            pending.extend(c for c in nodes[cur].get("childIds", []) if c in nodes)
+
+    return [node for node in accessibility_tree if node["nodeId"] not in dropped]
@@ -0,0 +1,126 @@
+"""Block requests the agent never needs, per site.
+
+Videos, web fonts and analytics beacons do not show up in any observation,
+so they are aborted before they hit the network. Images can additionally be
+blocked for observation types that never look at pixels.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from playwright.sync_api import BrowserContext, Route
+
+TRACKER_URL_PATTERNS = [
+    r"google-analytics\.com",
+    r"googletagmanager\.com",
+    r"doubleclick\.net",
+    r"connect\.facebook\.net",
+    r"hotjar\.com",
+    r"/(piwik|matomo)\.(js|php)",
+    # GA4 and Cloudflare Web Analytics endpoints; bare /collect or /beacon
+    # paths may belong to the sites themselves
+    r"analytics\.google\.com/g/collect",
+    r"static\.cloudflareinsights\.com/beacon",
+]
+
+
+@dataclass
+class RoutingProfile:
+    # playwright resource types, e.g. media, font, image
+    blocked_resource_types: set[str] = field(default_factory=set)
+    blocked_url_patterns: list[str] = field(default_factory=list)
+    # whether images may be blocked on this site when the observation
+    # type does not need them
+    allow_image_blocking: bool = True
+
+
+DEFAULT_PROFILE = RoutingProfile(
+    blocked_resource_types={"media", "font"},
+    blocked_url_patterns=TRACKER_URL_PATTERNS,
+)
+
+ROUTING_PROFILES: dict[str, RoutingProfile] = {
+    "shopping": DEFAULT_PROFILE,
+    "shopping_admin": DEFAULT_PROFILE,
+    "reddit": DEFAULT_PROFILE,
+    "gitlab": DEFAULT_PROFILE,
+    "wikipedia": DEFAULT_PROFILE,
+    "classifieds": DEFAULT_PROFILE,
+    # map tiles are images, and tasks on the map reason about what is shown
+    "map": RoutingProfile(
+        blocked_resource_types={"media", "font"},
+        blocked_url_patterns=TRACKER_URL_PATTERNS,
+        allow_image_blocking=False,
+    ),
+}
+
+
+def merge_profiles(sites: list[str]) -> RoutingProfile:
+    """Combine the profiles of all sites of a task.
+
+    Only what every site blocks is blocked, so the merged profile never
+    blocks a request one of the sites needs.
+    """
+    profiles = [ROUTING_PROFILES.get(site, DEFAULT_PROFILE) for site in sites]
+    if not profiles:
+        return DEFAULT_PROFILE
+    return RoutingProfile(
+        blocked_resource_types=set.intersection(
+            *(p.blocked_resource_types for p in profiles)
+        ),
+        blocked_url_patterns=[
+            pattern
+            for pattern in profiles[0].blocked_url_patterns
+            if all(pattern in p.blocked_url_patterns for p in profiles[1:])
+        ],
+        allow_image_blocking=all(p.allow_image_blocking for p in profiles),
+    )
+
+
+class RequestRouter:
+    """Aborts unneeded requests and counts what was blocked per context.
+
+    Blocked requests never reach the server, so their size is unknown; the
+    counters are per resource type.
+    """
+
+    def __init__(self, block_images: bool = False) -> None:
+        self.block_images = block_images
+        self.blocked: dict[BrowserContext, Counter[str]] = {}
+
+    def attach(self, context: BrowserContext, sites: list[str]) -> None:
+        profile = merge_profiles(sites)
+        blocked_types = set(profile.blocked_resource_types)
+        if self.block_images and profile.allow_image_blocking:
+            blocked_types.add("image")
+        url_pattern = (
+            re.compile("|".join(profile.blocked_url_patterns))
+            if profile.blocked_url_patterns
+            else None
+        )
+        counter: Counter[str] = Counter()
+        self.blocked[context] = counter
+
+        def handle(route: Route) -> None:
+            request = route.request
+            # never block the documents themselves
+            if request.resource_type != "document" and (
+                request.resource_type in blocked_types
+                or (url_pattern is not None and url_pattern.search(request.url))
+            ):
+                counter[request.resource_type] += 1
+                route.abort("blockedbyclient")
+            else:
+                route.fallback()
+
+        context.route("**/*", handle)
+        context.on("close", lambda _: self.blocked.pop(context, None))
+
+    def pop_stats(self, context: BrowserContext) -> dict[str, int]:
+        """Blocked request counts since the last call, by resource type"""
+        counter = self.blocked.get(context)
+        if counter is None:
+            return {}
+        stats = dict(counter)
+        counter.clear()
+        return stats
@@ -0,0 +1,181 @@
+"""Reuse the accessibility tree across scroll actions.
+
+A scroll moves the viewport but usually leaves the document alone. When the
+last action was a scroll, the page still shows the same document, no DOM
+mutation and no scroll inside an element was observed since the tree was
+captured, the cached tree is reused: the bounds of its nodes are shifted by
+the change of the window scroll offsets. Nodes inside fixed or sticky
+elements do not move with the document, so only their bounds are measured
+again. Anything else falls back to a full capture.
+"""
+from dataclasses import dataclass
+from typing import Any
+
+from playwright.sync_api import BrowserContext, Page
+
+from .utils import AccessibilityTree
+
+# a random token per document, and counters of DOM mutations and scrolls of
+# elements other than the document
+OBSERVATION_STATE_INIT_SCRIPT = """
+(() => {
+    if (window.__webarenaObservation) {
+        return;
+    }
+    const state = {
+        token: Math.random().toString(36).slice(2),
+        mutations: 0,
+        innerScrolls: 0,
+    };
+    window.__webarenaObservation = state;
+    new MutationObserver(records => {
+        state.mutations += records.length;
+    }).observe(document, {
+        childList: true,
+        subtree: true,
+        characterData: true,
+        attributes: true,
+    });
+    document.addEventListener("scroll", event => {
+        if (event.target !== document) {
+            state.innerScrolls += 1;
+        }
+    }, { capture: true, passive: true });
+})();
+"""
+
+OBSERVATION_STATE_SCRIPT = """
+() => {
+    const state = window.__webarenaObservation;
+    if (!state) {
+        return null;
+    }
+    return {
+        token: state.token,
+        mutations: state.mutations,
+        innerScrolls: state.innerScrolls,
+        scrollX: window.scrollX,
+        scrollY: window.scrollY,
+        url: location.href,
+        title: document.title,
+    };
+}
+"""
+
+
+def pinned_backend_node_ids(tree: dict[str, Any]) -> set[int]:
+    """Backend ids of the DOM nodes inside fixed or sticky elements"""
+    strings = tree["strings"]
+    document = tree["documents"][0]
+    nodes = document["nodes"]
+    layout = document["layout"]
+    parents = nodes["parentIndex"]
+    pinned = [False] * len(parents)
+    for node_idx, styles in zip(layout["nodeIndex"], layout["styles"]):
+        if styles and strings[styles[0]] in ("fixed", "sticky"):
+            pinned[node_idx] = True
+    # parents come before their children in the snapshot
+    for node_idx, parent_idx in enumerate(parents):
+        if parent_idx >= 0 and pinned[parent_idx]:
+            pinned[node_idx] = True
+    backend_node_ids = nodes["backendNodeId"]
+    return {
+        backend_node_ids[node_idx]
+        for node_idx, is_pinned in enumerate(pinned)
+        if is_pinned
+    }
+
+
+@dataclass
+class ScrollEntry:
+    state: dict[str, Any]
+    tree: AccessibilityTree
+    pinned: set[int]
+
+
+def copy_tree(tree: AccessibilityTree) -> AccessibilityTree:
+    # the processors rewrite childIds and parentId while filtering
+    return [
+        {
+            **node,
+            "childIds": list(node.get("childIds", [])),
+            "union_bound": (
+                list(node["union_bound"]) if node.get("union_bound") else None
+            ),
+        }
+        for node in tree
+    ]
+
+
+class ScrollReuseCache:
+    def __init__(self) -> None:
+        self.entries: dict[Page, ScrollEntry] = {}
+        # set by the environment before each observation
+        self.last_action_scrolled = False
+        self.hits = 0
+        self.misses = 0
+
+    def attach(self, context: BrowserContext) -> None:
+        context.add_init_script(script=OBSERVATION_STATE_INIT_SCRIPT)
+
+    def page_state(self, page: Page) -> dict[str, Any] | None:
+        try:
+            return page.evaluate(OBSERVATION_STATE_SCRIPT)
+        except Exception:
+            return None
+
+    def lookup(
+        self, page: Page, state: dict[str, Any] | None
+    ) -> ScrollEntry | None:
+        entry = self.entries.get(page)
+        if not self.last_action_scrolled or entry is None or state is None:
+            return None
+        unchanged = all(
+            state[key] == entry.state[key]
+            for key in ["token", "mutations", "innerScrolls"]
+        )
+        if not unchanged:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(
+        self,
+        page: Page,
+        state: dict[str, Any] | None,
+        tree: AccessibilityTree,
+        dom_tree: dict[str, Any],
+    ) -> None:
+        if state is None:
+            self.entries.pop(page, None)
+            return
+        if page not in self.entries:
+            page.on("close", lambda _: self.entries.pop(page, None))
+        self.entries[page] = ScrollEntry(
+            state, copy_tree(tree), pinned_backend_node_ids(dom_tree)
+        )
+
+    def shifted_tree(
+        self, entry: ScrollEntry, state: dict[str, Any]
+    ) -> tuple[AccessibilityTree, list[dict[str, Any]]]:
+        """The cached tree at the new scroll offsets, and the pinned nodes
+        whose bounds still have to be measured"""
+        dx = state["scrollX"] - entry.state["scrollX"]
+        dy = state["scrollY"] - entry.state["scrollY"]
+        tree = copy_tree(entry.tree)
+        pinned = []
+        for node in tree:
+            bound = node["union_bound"]
+            if bound is None or node["role"]["value"] == "RootWebArea":
+                continue
+            if node.get("backendDOMNodeId") in entry.pinned:
+                pinned.append(node)
+            else:
+                node["union_bound"] = [bound[0] - dx, bound[1] - dy, bound[2], bound[3]]
+        return tree, pinned
+
+    def pop_stats(self) -> dict[str, int]:
+        stats = {"hits": self.hits, "misses": self.misses}
+        self.hits = self.misses = 0
+        return stats
@@ -0,0 +1,145 @@
+"""Wait for a page to settle after an action instead of sleeping a fixed time.
+
+A page counts as settled once all of the following hold:
+- no network request has been in flight for `quiet_window` seconds,
+- the document finished loading (no pending navigation),
+- no DOM mutation was observed for `quiet_window` seconds,
+- web fonts and the images that are not lazily loaded are done.
+The wait never exceeds `max_wait` seconds.
+"""
+import time
+
+from playwright.sync_api import BrowserContext, Page, Request
+
+# records the time of the last DOM mutation; structural and text changes
+# only, so CSS driven animations toggling attributes do not keep it busy
+SETTLE_INIT_SCRIPT = """
+(() => {
+    if (window.__webarenaSettle) {
+        return;
+    }
+    const state = { lastMutation: performance.now() };
+    window.__webarenaSettle = state;
+    new MutationObserver(() => {
+        state.lastMutation = performance.now();
+    }).observe(document, { childList: true, subtree: true, characterData: true });
+})();
+"""
+
+SETTLE_STATE_SCRIPT = """
+() => {
+    const state = window.__webarenaSettle;
+    return {
+        readyState: document.readyState,
+        sinceMutation: state ? performance.now() - state.lastMutation : null,
+        fontsReady: !document.fonts || document.fonts.status === "loaded",
+        pendingImages: Array.from(document.images).filter(
+            img => !img.complete && img.loading !== "lazy"
+        ).length,
+    };
+}
+"""
+
+# requests that stay open for the lifetime of the page
+LONG_LIVED_RESOURCE_TYPES = {"eventsource", "websocket"}
+
+SETTLE_MODES = ["fixed", "adaptive"]
+
+
+class SettleDetector:
+    """Waits after each action until the page has settled.
+
+    In `fixed` mode it sleeps `max_wait` seconds, as the environment always
+    did; in `adaptive` mode it returns as soon as the page is quiet. The time
+    of the last wait is kept in `last_wait`.
+    """
+
+    def __init__(
+        self,
+        mode: str = "fixed",
+        max_wait: float = 3.0,
+        quiet_window: float = 0.3,
+        poll_interval: float = 0.05,
+    ) -> None:
+        if mode not in SETTLE_MODES:
+            raise ValueError(f"Unsupported settle mode: {mode}")
+        self.mode = mode
+        self.max_wait = max_wait
+        self.quiet_window = quiet_window
+        self.poll_interval = poll_interval
+        self.last_wait = 0.0
+        # network activity is tracked per context, so that prefetched
+        # contexts do not delay the active one
+        self.inflight: dict[BrowserContext, set[Request]] = {}
+        self.last_network_activity: dict[BrowserContext, float] = {}
+
+    def attach(self, context: BrowserContext) -> None:
+        """Start observing a newly created context"""
+        if self.mode != "adaptive":
+            return
+        self.inflight[context] = set()
+        self.last_network_activity[context] = time.perf_counter()
+        context.add_init_script(script=SETTLE_INIT_SCRIPT)
+        context.on("request", lambda r: self._on_request(context, r))
+        context.on("requestfinished", lambda r: self._on_done(context, r))
+        context.on("requestfailed", lambda r: self._on_done(context, r))
+        context.on("close", lambda _: self._detach(context))
+
+    def _on_request(self, context: BrowserContext, request: Request) -> None:
+        if request.resource_type in LONG_LIVED_RESOURCE_TYPES:
+            return
+        self.inflight.setdefault(context, set()).add(request)
+        self.last_network_activity[context] = time.perf_counter()
+
+    def _on_done(self, context: BrowserContext, request: Request) -> None:
+        self.inflight.get(context, set()).discard(request)
+        self.last_network_activity[context] = time.perf_counter()
+
+    def _detach(self, context: BrowserContext) -> None:
+        self.inflight.pop(context, None)
+        self.last_network_activity.pop(context, None)
+
+    def _page_settled(self, page: Page) -> bool:
+        try:
+            state = page.evaluate(SETTLE_STATE_SCRIPT)
+        except Exception:
+            # the execution context is replaced during a navigation
+            return False
+        if state["readyState"] != "complete":
+            return False
+        if (
+            state["sinceMutation"] is not None
+            and state["sinceMutation"] < self.quiet_window * 1000
+        ):
+            return False
+        return state["fontsReady"] and state["pendingImages"] == 0
+
+    def wait(self, page: Page) -> float:
+        """Wait until `page` settles; returns the seconds spent waiting"""
+        start = time.perf_counter()
+        if self.mode == "fixed":
+            page.wait_for_timeout(int(self.max_wait * 1000))
+            self.last_wait = time.perf_counter() - start
+            return self.last_wait
+
+        context = page.context
+        while True:
+            now = time.perf_counter()
+            if now - start >= self.max_wait:
+                break
+            # the quiet window counts from the action, which may have started
+            # a request or a navigation that has not been reported yet
+            quiet_since = max(
+                start, self.last_network_activity.get(context, start)
+            )
+            network_quiet = (
+                not self.inflight.get(context)
+                and now - quiet_since >= self.quiet_window
+            )
+            if network_quiet and self._page_settled(page):
+                break
+            # waiting through Playwright also delivers the request events
+            page.wait_for_timeout(int(self.poll_interval * 1000))
+
+        self.last_wait = time.perf_counter() - start
+        return self.last_wait
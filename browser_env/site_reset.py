@@ -0,0 +1,348 @@
+"""Reset WebArena sites between tasks and wait until they are ready again.
+
+A `SiteResetManager` decides which sites of a task to reset and hands them to
+a `ResetBackend`:
+- `ClassifiedsResetBackend`: the classifieds site's reset endpoint
+- `DockerResetBackend`: recreates the site's container, as the shell scripts
+  in this repository do, but polls the site instead of sleeping
+- `InProcessResetBackend`: only records the resets, for tests and for
+  exercising schedulers without the sites
+
+Readiness is probed over HTTP with exponential backoff.
+"""
+import argparse
+import os
+import subprocess
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any
+
+import requests
+
+RESET_POLICIES = ["on_require", "dirty"]
+RESET_BACKENDS = ["http", "docker", "in_process"]
+
+
+def site_urls() -> dict[str, str]:
+    """URL of every site configured for the current dataset"""
+    from browser_env import env_config
+
+    names = {
+        "shopping": "SHOPPING",
+        "shopping_admin": "SHOPPING_ADMIN",
+        "reddit": "REDDIT",
+        "gitlab": "GITLAB",
+        "wikipedia": "WIKIPEDIA",
+        "map": "MAP",
+        "classifieds": "CLASSIFIEDS",
+    }
+    urls = {site: getattr(env_config, name, "") for site, name in names.items()}
+    return {site: url for site, url in urls.items() if url}
+
+
+def wait_until_ready(
+    url: str,
+    timeout: float = 300.0,
+    initial_delay: float = 0.5,
+    max_delay: float = 10.0,
+) -> bool:
+    """Poll `url` until it answers without a server error"""
+    deadline = time.time() + timeout
+    delay = initial_delay
+    while True:
+        try:
+            response = requests.get(url, timeout=10, allow_redirects=False)
+            if response.status_code < 500:
+                return True
+        except requests.RequestException:
+            pass
+        if time.time() + delay > deadline:
+            return False
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+class ResetBackend(ABC):
+    """Brings a site back to its initial state"""
+
+    @abstractmethod
+    def supports(self, site: str) -> bool:
+        ...
+
+    @abstractmethod
+    def reset(self, site: str) -> None:
+        ...
+
+
+class ClassifiedsResetBackend(ResetBackend):
+    def __init__(self, url: str, token: str) -> None:
+        self.url = url
+        self.token = token
+
+    def supports(self, site: str) -> bool:
+        return site == "classifieds"
+
+    def reset(self, site: str) -> None:
+        # Send POST request to __CLASSIFIEDS__/index.php?page=reset with token=CLASSIFIEDS_TOKEN
+        response = requests.post(
+            f"{self.url}/index.php?page=reset",
+            data={"token": self.token},
+        )
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Failed to reset Classifieds site: {response.status_code}"
+            )
+
+
+@dataclass
+class DockerSite:
+    container: str
+    image: str
+    port: int
+    container_port: int = 80
+    run_args: list[str] = field(default_factory=list)
+    command: list[str] = field(default_factory=list)
+    # run inside the container once it serves requests, e.g. to fix the
+    # base url of the site
+    post_start: list[str] = field(default_factory=list)
+
+
+MAGENTO_INDEXERS = [
+    "catalogrule_product",
+    "catalogrule_rule",
+    "catalogsearch_fulltext",
+    "catalog_category_product",
+    "customer_grid",
+    "design_config_grid",
+    "inventory",
+    "catalog_product_category",
+    "catalog_product_attribute",
+    "catalog_product_price",
+    "cataloginventory_stock",
+]
+
+
+def _magento_post_start(hostname: str, port: int, indexers: bool) -> list[str]:
+    commands = [
+        f'/var/www/magento2/bin/magento setup:store-config:set --base-url="{hostname}:{port}"',
+        f"mysql -u magentouser -pMyPassword magentodb -e \"UPDATE core_config_data SET value='{hostname}:{port}/' WHERE path = 'web/secure/base_url';\"",
+        "/var/www/magento2/bin/magento cache:flush",
+    ]
+    if indexers:
+        commands += [
+            f"/var/www/magento2/bin/magento indexer:set-mode schedule {indexer}"
+            for indexer in MAGENTO_INDEXERS
+        ]
+    return commands
+
+
+def docker_sites(hostname: str = "http://localhost") -> dict[str, DockerSite]:
+    """Containers of the WebArena sites, see refresh_website_dockers.sh"""
+    hostname = hostname.rstrip("/")
+    return {
+        "shopping": DockerSite(
+            "shopping",
+            "shopping_final_0712",
+            7770,
+            post_start=_magento_post_start(hostname, 7770, indexers=True),
+        ),
+        "shopping_admin": DockerSite(
+            "shopping_admin",
+            "shopping_admin_final_0719",
+            7780,
+            post_start=_magento_post_start(hostname, 7780, indexers=False),
+        ),
+        "reddit": DockerSite(
+            "forum",
+            "postmill-populated-exposed-withimg",
+            9999,
+            post_start=[
+                f"sed -i '/@RateLimit/,/)/d' /var/www/html/src/DataObject/{name}.php"
+                for name in ["CommentData", "SubmissionData", "UserData"]
+            ]
+            + ["bin/console cache:clear --env=prod"],
+        ),
+        "gitlab": DockerSite(
+            "gitlab",
+            "gitlab-populated-final-port8023",
+            8023,
+            container_port=8023,
+            run_args=["--shm-size=10g"],
+            command=["/opt/gitlab/embedded/bin/runsvdir-start"],
+            post_start=[
+                f"sed -i \"s|^external_url.*|external_url '{hostname}:8023'|\" /etc/gitlab/gitlab.rb",
+                "sed -i \"s/.*postgresql\\['max_connections'.*/postgresql\\['max_connections'\\] = 2000/g\" /etc/gitlab/gitlab.rb",
+                "gitlab-ctl reconfigure",
+                "gitlab-ctl restart",
+            ],
+        ),
+    }
+
+
+class DockerResetBackend(ResetBackend):
+    def __init__(
+        self, hostname: str = "http://localhost", ready_timeout: float = 300.0
+    ) -> None:
+        self.hostname = hostname.rstrip("/")
+        self.sites = docker_sites(hostname)
+        self.ready_timeout = ready_timeout
+
+    def supports(self, site: str) -> bool:
+        return site in self.sites
+
+    def reset(self, site: str) -> None:
+        spec = self.sites[site]
+        subprocess.run(["docker", "rm", "-f", spec.container], check=False)
+        subprocess.run(
+            [
+                "docker",
+                "run",
+                "--name",
+                spec.container,
+                "-p",
+                f"{spec.port}:{spec.container_port}",
+                "-d",
+                *spec.run_args,
+                spec.image,
+                *spec.command,
+            ],
+            check=True,
+        )
+        if spec.post_start:
+            # the configuration commands need the services inside to be up
+            if not wait_until_ready(
+                f"{self.hostname}:{spec.port}", timeout=self.ready_timeout
+            ):
+                raise RuntimeError(f"{site} did not start in time")
+            for command in spec.post_start:
+                subprocess.run(
+                    ["docker", "exec", spec.container, "sh", "-c", command],
+                    check=True,
+                )
+
+
+class InProcessResetBackend(ResetBackend):
+    """Stand-in backend that records resets instead of performing them"""
+
+    def __init__(
+        self, sites: list[str] | None = None, reset_time: float = 0.0
+    ) -> None:
+        self.sites = sites
+        self.reset_time = reset_time
+        self.resets: list[str] = []
+
+    def supports(self, site: str) -> bool:
+        return self.sites is None or site in self.sites
+
+    def reset(self, site: str) -> None:
+        time.sleep(self.reset_time)
+        self.resets.append(site)
+
+
+class SiteResetManager:
+    """Resets the sites of a task before it runs.
+
+    With the `on_require` policy, all sites of a task whose config sets
+    `require_reset` are reset before it. With the `dirty` policy, a task's
+    sites are reset only if an earlier task that modifies state (one with
+    `require_reset`) touched them since their last reset.
+
+    Environments running concurrently may share a manager as long as no
+    task resets or modifies a site another running task is on;
+    `VectorBrowserEnv` schedules its tasks that way.
+    """
+
+    def __init__(
+        self,
+        backends: list[ResetBackend],
+        probe_urls: dict[str, str] | None = None,
+        policy: str = "on_require",
+        ready_timeout: float = 300.0,
+    ) -> None:
+        if policy not in RESET_POLICIES:
+            raise ValueError(f"Unsupported reset policy: {policy}")
+        self.backends = backends
+        self.probe_urls = probe_urls or {}
+        self.policy = policy
+        self.ready_timeout = ready_timeout
+        self.dirty: set[str] = set()
+
+    def _backend(self, site: str) -> ResetBackend | None:
+        for backend in self.backends:
+            if backend.supports(site):
+                return backend
+        return None
+
+    def sites_to_reset(self, instance_config: dict[str, Any]) -> list[str]:
+        sites = instance_config.get("sites", [])
+        if self.policy == "dirty":
+            return [site for site in sites if site in self.dirty]
+        return sites if instance_config.get("require_reset", False) else []
+
+    def reset_site(self, site: str) -> bool:
+        backend = self._backend(site)
+        if backend is None:
+            print(
+                f"WARNING: Reset is not supported for {site}. Please manually reset the site."
+            )
+            return False
+        try:
+            backend.reset(site)
+        except Exception as e:
+            print(f"WARNING: failed to reset {site}: {e}")
+            return False
+        url = self.probe_urls.get(site)
+        if url and not wait_until_ready(url, timeout=self.ready_timeout):
+            print(f"WARNING: {site} is not ready after its reset.")
+            return False
+        print(f"Reset {site} site.")
+        self.dirty.discard(site)
+        return True
+
+    def before_task(self, instance_config: dict[str, Any]) -> list[str]:
+        """Reset what the task needs; returns the sites that were reset"""
+        reset = [
+            site
+            for site in self.sites_to_reset(instance_config)
+            if self.reset_site(site)
+        ]
+        if instance_config.get("require_reset", False):
+            self.dirty.update(instance_config.get("sites", []))
+        return reset
+
+
+def build_site_reset_manager(
+    backend: str = "http", policy: str = "on_require"
+) -> SiteResetManager:
+    """Reset manager for the sites configured in the environment"""
+    if backend not in RESET_BACKENDS:
+        raise ValueError(f"Unsupported reset backend: {backend}")
+    if backend == "in_process":
+        return SiteResetManager([InProcessResetBackend()], policy=policy)
+
+    urls = site_urls()
+    backends: list[ResetBackend] = []
+    if "classifieds" in urls:
+        from browser_env.env_config import CLASSIFIEDS_RESET_TOKEN
+
+        backends.append(
+            ClassifiedsResetBackend(urls["classifieds"], CLASSIFIEDS_RESET_TOKEN)
+        )
+    if backend == "docker":
+        backends.append(
+            DockerResetBackend(os.environ.get("SITE_HOSTNAME", "http://localhost"))
+        )
+    return SiteResetManager(backends, probe_urls=urls, policy=policy)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--site_list", nargs="+", default=[])
+    parser.add_argument(
+        "--backend", type=str, default="docker", choices=RESET_BACKENDS
+    )
+    args = parser.parse_args()
+    manager = build_site_reset_manager(args.backend)
+    for site in args.site_list:
+        manager.reset_site(site)
@@ -0,0 +1,151 @@
+"""Serve tab switches back to unchanged tabs from cache.
+
+`page_focus` and `page_close` move the agent to a tab it usually observed
+before. The last observation of every tab is kept together with the page
+state it was captured in (see `scroll_reuse.OBSERVATION_STATE_SCRIPT`): the
+document token, the DOM mutation and inner scroll counters, the scroll
+offsets and the URL. When the focused tab is in the same state after a
+switch, its observation and node table are reused and only the tab header
+is rebuilt.
+
+Tab titles are cached as well. A tab's title is read again after it
+navigates, or when its document reports a new title through a binding, so
+building the header does not call `title()` on every open tab.
+"""
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+from playwright.sync_api import BrowserContext, Page
+
+from .scroll_reuse import OBSERVATION_STATE_INIT_SCRIPT, OBSERVATION_STATE_SCRIPT
+from .utils import BrowserConfig
+
+TITLE_BINDING = "__webarenaTitleChanged"
+
+TITLE_WATCH_INIT_SCRIPT = f"""
+(() => {{
+    if (window.__webarenaTitleWatch || window.top !== window) {{
+        return;
+    }}
+    window.__webarenaTitleWatch = true;
+    let title = null;
+    new MutationObserver(() => {{
+        if (document.title !== title) {{
+            title = document.title;
+            window.{TITLE_BINDING}?.();
+        }}
+    }}).observe(document, {{
+        childList: true,
+        subtree: true,
+        characterData: true,
+    }});
+}})();
+"""
+
+# the page is unchanged if all of these are
+STATE_KEYS = ["token", "mutations", "innerScrolls", "scrollX", "scrollY", "url"]
+
+
+@dataclass
+class TabEntry:
+    state: dict[str, Any] | None
+    content: str
+    image: npt.NDArray[np.uint8]
+    obs_nodes_info: dict[str, Any]
+    browser_config: BrowserConfig
+
+
+class TabObservationCache:
+    def __init__(self) -> None:
+        self.entries: dict[Page, TabEntry] = {}
+        self.titles: dict[Page, str] = {}
+        self.tracked: set[Page] = set()
+        # state of the page being observed, read before the capture
+        self.current: tuple[Page, dict[str, Any] | None] | None = None
+        # set by the environment before each observation
+        self.last_action_switched_tab = False
+        self.hits = 0
+        self.misses = 0
+        self.title_reads = 0
+
+    def attach(self, context: BrowserContext) -> None:
+        context.add_init_script(script=OBSERVATION_STATE_INIT_SCRIPT)
+        context.add_init_script(script=TITLE_WATCH_INIT_SCRIPT)
+        context.expose_binding(
+            TITLE_BINDING, lambda source: self.titles.pop(source["page"], None)
+        )
+
+    def _forget(self, page: Page) -> None:
+        self.entries.pop(page, None)
+        self.titles.pop(page, None)
+        self.tracked.discard(page)
+
+    def _track(self, page: Page) -> None:
+        if page in self.tracked:
+            return
+        self.tracked.add(page)
+        page.on(
+            "framenavigated",
+            lambda frame: (
+                self.titles.pop(page, None) if frame == page.main_frame else None
+            ),
+        )
+        page.on("close", lambda _: self._forget(page))
+
+    def read_state(self, page: Page) -> dict[str, Any] | None:
+        self._track(page)
+        try:
+            state = page.evaluate(OBSERVATION_STATE_SCRIPT)
+        except Exception:
+            state = None
+        self.current = (page, state)
+        return state
+
+    def lookup(self, page: Page, state: dict[str, Any] | None) -> TabEntry | None:
+        if not self.last_action_switched_tab:
+            return None
+        entry = self.entries.get(page)
+        if (
+            entry is not None
+            and state is not None
+            and all(state[key] == entry.state[key] for key in STATE_KEYS)
+        ):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, page: Page, entry: TabEntry) -> None:
+        if entry.state is None:
+            self.entries.pop(page, None)
+        else:
+            self.entries[page] = entry
+
+    def tab_titles(self, page: Page) -> list[str]:
+        """Titles of all tabs of the page's context"""
+        current, self.current = self.current, None
+        if current is not None and current[0] == page and current[1] is not None:
+            self.titles[page] = current[1]["title"]
+        titles = []
+        for tab in page.context.pages:
+            self._track(tab)
+            if tab not in self.titles:
+                self.titles[tab] = tab.title()
+                self.title_reads += 1
+            titles.append(self.titles[tab])
+        return titles
+
+    def pop_stats(self) -> dict[str, int]:
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "title_reads": self.title_reads,
+        }
+        self.hits = self.misses = self.title_reads = 0
+        return stats
+
+    def reset(self) -> None:
+        self.entries, self.titles, self.tracked = {}, {}, set()
+        self.current = None
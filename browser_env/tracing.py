@@ -0,0 +1,102 @@
+"""Playwright tracing policies.
+
+- off: no tracing
+- on: full trace (screenshots and DOM snapshots) for every task
+- on_failure: full trace, only written when the task failed; the trace of a
+  successful task is dropped by the driver without being exported
+- sampled: full trace for a deterministic `sample_rate` share of the tasks
+- lightweight: trace of actions and network only, without screenshots and
+  snapshots, for every task
+
+Exporting a trace has to happen on the thread that owns the Playwright
+objects, so it is written to a local temporary file first; moving it into
+the result directory, which may live on slower storage, happens on a
+background thread. The export itself, where the driver zips the screenshots
+and snapshots, is the expensive part and still blocks the task loop in
+`stop`: the sync API offers no way to export a trace without waiting for
+it. The policies that keep fewer full traces are the way to make it cheap.
+"""
+import os
+import random
+import shutil
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from playwright.sync_api import BrowserContext
+
+TRACE_POLICIES = ["off", "on", "on_failure", "sampled", "lightweight"]
+
+
+def _move(src: str, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(src, dst)
+
+
+class TraceManager:
+    def __init__(
+        self, policy: str = "off", sample_rate: float = 0.1, seed: int = 0
+    ) -> None:
+        if policy not in TRACE_POLICIES:
+            raise ValueError(f"Unsupported trace policy: {policy}")
+        self.policy = policy
+        self.sample_rate = sample_rate
+        self.seed = seed
+        self.traced: set[BrowserContext] = set()
+        self.executor: ThreadPoolExecutor | None = None
+        self.pending: list[Future] = []
+
+    def should_trace(self, task_id: int | str | None) -> bool:
+        if self.policy == "off":
+            return False
+        if self.policy == "sampled":
+            # the same tasks are sampled on every run and every worker
+            rng = random.Random(f"{self.seed}-{task_id}")
+            return rng.random() < self.sample_rate
+        return True
+
+    def start(
+        self, context: BrowserContext, task_id: int | str | None = None
+    ) -> None:
+        if not self.should_trace(task_id):
+            return
+        full = self.policy != "lightweight"
+        context.tracing.start(screenshots=full, snapshots=full)
+        self.traced.add(context)
+        context.on("close", lambda _: self.traced.discard(context))
+
+    def stop(
+        self, context: BrowserContext, trace_path: str | Path, failed: bool
+    ) -> None:
+        """Stop tracing `context` and write the trace if the policy keeps it"""
+        if context not in self.traced:
+            return
+        self.traced.discard(context)
+        if self.policy == "on_failure" and not failed:
+            context.tracing.stop()
+            return
+
+        fd, tmp_path = tempfile.mkstemp(suffix=".zip")
+        os.close(fd)
+        # blocks until the driver has written the archive
+        context.tracing.stop(path=tmp_path)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self._collect(wait=False)
+        self.pending.append(self.executor.submit(_move, tmp_path, Path(trace_path)))
+
+    def _collect(self, wait: bool) -> None:
+        remaining = []
+        for future in self.pending:
+            if not wait and not future.done():
+                remaining.append(future)
+            elif future.exception() is not None:
+                print(f"WARNING: failed to save a trace: {future.exception()}")
+        self.pending = remaining
+
+    def close(self) -> None:
+        """Wait for the traces that are still being moved"""
+        self._collect(wait=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
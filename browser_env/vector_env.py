@@ -0,0 +1,211 @@
+"""Step several browser environments together.
+
+`VectorBrowserEnv` follows gymnasium's vector environments: `reset` and
+`step` take and return one entry per sub-environment, and a sub-environment
+whose episode ended is reset to the next task on its own. All
+sub-environments are `AsyncScriptBrowserEnv`s on one event loop, so their
+browser work overlaps without threads or worker processes, and the agent
+can batch its model calls over the returned observations.
+
+An episode ends when the sub-environment receives a STOP action, or when
+`step` is told so through `dones`, e.g. after the agent's early-stop
+checks. The returned observation is then the first one of the next task;
+`infos[i]["final_config_file"]` names the finished task, and when an
+action was executed in that step its result is kept in
+`infos[i]["final_observation"]` and `infos[i]["final_info"]`. Once the
+task queue is empty the sub-environment becomes inactive; its entries are
+None from then on.
+
+All sub-environments share one `SiteResetManager`, and tasks that touch the
+same sites never overlap if one of them resets or modifies a site: such a
+task is held in the queue until no running task is on its sites, and later
+tasks that do not conflict start ahead of it. A sub-environment with no
+task it may start waits; its entries are None, like an inactive one, and it
+starts the next eligible task in a later `step`, returning that task's
+first observation with `infos[i]["config_file"]` set. Pass None as the
+action of a waiting sub-environment. Everything is done once `done` is
+true.
+"""
+import asyncio
+import json
+from pathlib import Path
+from typing import Any
+
+from .actions import Action, ActionTypes
+from .async_envs import AsyncScriptBrowserEnv
+from .site_reset import build_site_reset_manager
+from .utils import Observation
+
+
+class VectorBrowserEnv:
+    def __init__(self, num_envs: int, **env_kwargs: Any) -> None:
+        self.num_envs = num_envs
+        # one manager, so that the reset state of a site is known to all
+        # sub-environments; built with the first task that requires a reset
+        self.site_reset_manager = env_kwargs.get("site_reset_manager")
+        self.envs = [AsyncScriptBrowserEnv(**env_kwargs) for _ in range(num_envs)]
+        self.loop = asyncio.new_event_loop()
+        self.queue: list[str] = []
+        self.queued_configs: dict[str, dict[str, Any]] = {}
+        self.config_files: list[str | None] = [None] * num_envs
+        self.instance_configs: list[dict[str, Any] | None] = [None] * num_envs
+
+    @property
+    def active(self) -> list[bool]:
+        return [config_file is not None for config_file in self.config_files]
+
+    @property
+    def done(self) -> bool:
+        return not self.queue and not any(self.active)
+
+    def _share_reset_manager(self) -> None:
+        if self.site_reset_manager is None:
+            self.site_reset_manager = build_site_reset_manager()
+        for env in self.envs:
+            env.site_reset_manager = self.site_reset_manager
+
+    def _modifies_sites(self, instance_config: dict[str, Any]) -> bool:
+        return instance_config.get("require_reset", False) or bool(
+            self.site_reset_manager is not None
+            and self.site_reset_manager.sites_to_reset(instance_config)
+        )
+
+    def _conflicts(self, instance_config: dict[str, Any]) -> bool:
+        """Whether the task shares a site with a running task while either
+        of them resets or modifies it"""
+        sites = set(instance_config.get("sites", []))
+        for other in self.instance_configs:
+            if other is None or not sites & set(other.get("sites", [])):
+                continue
+            if self._modifies_sites(instance_config) or self._modifies_sites(
+                other
+            ):
+                return True
+        return False
+
+    def _next_task(self) -> tuple[str, dict[str, Any]] | None:
+        """Take the first queued task that may start now"""
+        for i, config_file in enumerate(self.queue):
+            instance_config = self.queued_configs[config_file]
+            if not self._conflicts(instance_config):
+                del self.queue[i]
+                return config_file, instance_config
+        return None
+
+    async def _areset_env(
+        self, idx: int
+    ) -> tuple[dict[str, Observation] | None, dict[str, Any] | None]:
+        self.config_files[idx] = None
+        self.instance_configs[idx] = None
+        task = self._next_task()
+        if task is None:
+            return None, None
+        config_file, instance_config = task
+        self.config_files[idx] = config_file
+        self.instance_configs[idx] = instance_config
+        obs, info = await self.envs[idx].areset(
+            options={"config_file": config_file}
+        )
+        info["config_file"] = config_file
+        return obs, info
+
+    async def areset(
+        self, config_files: list[str | Path]
+    ) -> tuple[list[dict[str, Observation] | None], list[dict[str, Any] | None]]:
+        """Start the first tasks; the remaining ones are run by auto-reset"""
+        self.queue = [str(config_file) for config_file in config_files]
+        self.queued_configs = {}
+        for config_file in self.queue:
+            with open(config_file, "r") as f:
+                self.queued_configs[config_file] = json.load(f)
+        if any(
+            config.get("require_reset", False)
+            for config in self.queued_configs.values()
+        ):
+            self._share_reset_manager()
+        results = await asyncio.gather(
+            *[self._areset_env(idx) for idx in range(self.num_envs)]
+        )
+        return [obs for obs, _ in results], [info for _, info in results]
+
+    async def _astep_env(
+        self, idx: int, action: Action | None, done: bool
+    ) -> tuple[dict[str, Observation] | None, float, bool, bool, dict[str, Any] | None]:
+        env = self.envs[idx]
+        if self.config_files[idx] is None:
+            # waiting for a task that conflicted with the running ones
+            obs, info = await self._areset_env(idx) if self.queue else (None, None)
+            return obs, 0.0, False, False, info
+
+        config_file = self.config_files[idx]
+        if action is not None and action["action_type"] != ActionTypes.STOP:
+            obs, reward, terminated, truncated, info = await env.astep(action)
+        else:
+            # the episode ended with the previous observation
+            obs, reward, terminated, truncated, info = None, 0.0, True, False, {}
+        if action is not None and action["action_type"] == ActionTypes.STOP:
+            terminated = True
+        if not (terminated or truncated or done):
+            return obs, reward, terminated, truncated, info
+
+        next_obs, next_info = await self._areset_env(idx)
+        final_info = {
+            "final_observation": obs,
+            "final_info": info,
+            "final_config_file": config_file,
+        }
+        if next_info is not None:
+            final_info.update(next_info)
+        return next_obs, reward, terminated, truncated, final_info
+
+    async def astep(
+        self, actions: list[Action | None], dones: list[bool] | None = None
+    ) -> tuple[
+        list[dict[str, Observation] | None],
+        list[float],
+        list[bool],
+        list[bool],
+        list[dict[str, Any] | None],
+    ]:
+        """Step every active sub-environment with its action.
+
+        `None` ends the episode of a sub-environment without acting.
+        """
+        if len(actions) != self.num_envs:
+            raise ValueError(
+                f"Expected {self.num_envs} actions, got {len(actions)}"
+            )
+        dones = dones or [False] * self.num_envs
+        results = await asyncio.gather(
+            *[
+                self._astep_env(idx, action, done)
+                for idx, (action, done) in enumerate(zip(actions, dones))
+            ]
+        )
+        observations, rewards, terminateds, truncateds, infos = map(
+            list, zip(*results)
+        )
+        return observations, rewards, terminateds, truncateds, infos
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*[env.aclose() for env in self.envs])
+
+    def reset(
+        self, config_files: list[str | Path]
+    ) -> tuple[list[dict[str, Observation] | None], list[dict[str, Any] | None]]:
+        return self.loop.run_until_complete(self.areset(config_files))
+
+    def step(
+        self, actions: list[Action | None], dones: list[bool] | None = None
+    ) -> tuple[
+        list[dict[str, Observation] | None],
+        list[float],
+        list[bool],
+        list[bool],
+        list[dict[str, Any] | None],
+    ]:
+        return self.loop.run_until_complete(self.astep(actions, dones))
+
+    def close(self) -> None:
+        self.loop.run_until_complete(self.aclose())
+        self.loop.close()
@@ -1,11 +1,20 @@
+from collections import OrderedDict
 from typing import Any
 
 import tiktoken
 from transformers import LlamaTokenizer, AutoTokenizer  # type: ignore
 
+# Truncated observations shared by every Tokenizer instance, so the planner and
+# the executor of the same step only pay for the cut once. Keys hold the
+# observation string itself; its hash is cached by Python after the first use.
+_TRUNCATION_CACHE: OrderedDict[tuple[str, str, int, str], str] = OrderedDict()
+_TRUNCATION_CACHE_SIZE = 64
+
 
 class Tokenizer(object):
     def __init__(self, provider: str, model_name: str) -> None:
+        self.provider = provider
+        self.model_name = model_name
         if provider == "openai":
             try:
                 self.tokenizer = tiktoken.encoding_for_model(model_name)
@@ -30,3 +39,40 @@ class Tokenizer(object):
 
     def __call__(self, text: str) -> list[int]:
         return self.tokenizer.encode(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut `text` to at most `max_tokens` tokens at a line boundary.
+
+        Lines are encoded one at a time until the budget is spent, so the
+        discarded tail is never tokenized. Results are memoized per
+        (tokenizer, budget, text). Without a tokenizer, characters are used.
+        """
+        if self.tokenizer is None:
+            return text[:max_tokens]
+
+        key = (self.provider, self.model_name, max_tokens, text)
+        if key in _TRUNCATION_CACHE:
+            _TRUNCATION_CACHE.move_to_end(key)
+            return _TRUNCATION_CACHE[key]
+
+        # no token spans less than one byte, so short texts fit as they are
+        if len(text.encode("utf-8")) < max_tokens:
+            truncated = text
+        else:
+            kept: list[str] = []
+            used = 0
+            for line in text.splitlines(keepends=True):
+                num_tokens = len(self.encode(line))
+                if used + num_tokens > max_tokens:
+                    if not kept:
+                        # a single line is over budget, cut inside it
+                        kept.append(self.decode(self.encode(line)[:max_tokens]))
+                    break
+                kept.append(line)
+                used += num_tokens
+            truncated = "".join(kept)
+
+        _TRUNCATION_CACHE[key] = truncated
+        if len(_TRUNCATION_CACHE) > _TRUNCATION_CACHE_SIZE:
+            _TRUNCATION_CACHE.popitem(last=False)
+        return truncated
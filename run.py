@@ -8,9 +8,9 @@ import json
 import logging
 import os
 import random
-import subprocess
 import tempfile
 import time
+from functools import partial
 from pathlib import Path
 from typing import List, Any
 import cv2
@@ -39,6 +39,8 @@ from browser_env import (
 )
 from browser_env.actions import is_equivalent
 from browser_env.auto_login import get_site_comb_from_filepath
+from browser_env.login_cache import LoginCache
+from browser_env.site_reset import build_site_reset_manager
 from browser_env.helper_functions import (
     RenderHelper,
     get_action_description,
@@ -145,7 +147,142 @@ def config() -> argparse.Namespace:
     parser.add_argument("--viewport_width", type=int, default=1280)
     parser.add_argument("--viewport_height", type=int, default=2048)
     parser.add_argument("--save_trace_enabled", action="store_true")
+    parser.add_argument(
+        "--trace_policy",
+        type=str,
+        default=None,
+        choices=["off", "on", "on_failure", "sampled", "lightweight"],
+        help="Which tasks to trace and how; defaults to a full trace of every task when --save_trace_enabled is set",
+    )
+    parser.add_argument(
+        "--trace_sample_rate",
+        type=float,
+        default=0.1,
+        help="Share of tasks traced with --trace_policy sampled",
+    )
     parser.add_argument("--sleep_after_execution", type=float, default=0.0)
+    parser.add_argument(
+        "--settle_mode",
+        type=str,
+        default="adaptive",
+        choices=["fixed", "adaptive"],
+        help="Wait a fixed sleep_after_execution after each action, or until the page settles (capped at sleep_after_execution)",
+    )
+    parser.add_argument(
+        "--reuse_browser",
+        action="store_true",
+        help="Keep one browser alive for all tasks and only create a fresh context per task",
+    )
+    parser.add_argument(
+        "--block_resources",
+        action="store_true",
+        help="Block media, web fonts and trackers the agent never looks at",
+    )
+    parser.add_argument(
+        "--block_images",
+        action="store_true",
+        help="With --block_resources, also block images (accessibility_tree observations only)",
+    )
+    parser.add_argument(
+        "--asset_cache_dir",
+        type=str,
+        default=None,
+        help="Serve static assets from this on-disk cache, shared across tasks and workers",
+    )
+    parser.add_argument(
+        "--har_mode",
+        type=str,
+        default="off",
+        choices=["off", "record", "replay"],
+        help="Record each task's traffic into a HAR archive, or replay tasks from recorded archives without the sites",
+    )
+    parser.add_argument("--har_dir", type=str, default=None)
+    parser.add_argument(
+        "--har_not_found",
+        type=str,
+        default="abort",
+        choices=["abort", "fallback"],
+        help="What to do with requests missing from the archive in replay mode",
+    )
+    parser.add_argument(
+        "--site_reset_backend",
+        type=str,
+        default="http",
+        choices=["http", "docker", "in_process"],
+        help="How sites are reset: the classifieds reset endpoint only, recreating the docker containers, or an in-process stand-in",
+    )
+    parser.add_argument(
+        "--site_reset_policy",
+        type=str,
+        default="on_require",
+        choices=["on_require", "dirty"],
+        help="Reset the sites of tasks with require_reset, or only sites modified by earlier tasks",
+    )
+    parser.add_argument(
+        "--auth_folder",
+        type=str,
+        default="./.auth",
+        help="Where the login states of the site combinations are cached",
+    )
+    parser.add_argument(
+        "--memory_watchdog",
+        action="store_true",
+        help="Sample page JS heap and browser RSS after each step and log them per task",
+    )
+    parser.add_argument(
+        "--max_js_heap_mb",
+        type=float,
+        default=0.0,
+        help="Warn when a page's JS heap exceeds this (0 disables)",
+    )
+    parser.add_argument(
+        "--max_browser_rss_mb",
+        type=float,
+        default=0.0,
+        help="Recycle the browser between tasks when its RSS exceeds this (0 disables, needs --reuse_browser)",
+    )
+    parser.add_argument(
+        "--browser_endpoint",
+        type=str,
+        default=None,
+        help="CDP endpoint of a shared browser (python -m browser_env.browser_server) to create contexts in",
+    )
+    parser.add_argument(
+        "--ax_fetch_mode",
+        type=str,
+        default="full",
+        choices=["full", "viewport", "check"],
+        help="With --current_viewport_only, 'viewport' fetches only the accessibility subtrees on screen; 'check' also compares the result with a full fetch",
+    )
+    parser.add_argument(
+        "--observation_dialect",
+        type=str,
+        default="default",
+        choices=["default", "compact"],
+        help="Serialization of the accessibility tree; 'compact' needs a compact prompt and --action_set_tag id_accessibility_tree_compact",
+    )
+    parser.add_argument(
+        "--ax_mirror",
+        type=str,
+        default="off",
+        choices=["off", "on", "check"],
+        help="Maintain the accessibility tree from change events instead of refetching it every step; 'check' verifies it against a full fetch",
+    )
+    parser.add_argument(
+        "--scroll_reuse",
+        action="store_true",
+        help="After a scroll that changed nothing else on the page, shift the previous accessibility tree instead of capturing it again",
+    )
+    parser.add_argument(
+        "--tab_cache",
+        action="store_true",
+        help="Serve switches back to unchanged tabs from their last observation and cache tab titles",
+    )
+    parser.add_argument(
+        "--prefetch_next_task",
+        action="store_true",
+        help="Open the next task's start pages while the current task runs (implies --reuse_browser)",
+    )
 
     parser.add_argument("--max_steps", type=int, default=30)
 
@@ -225,6 +362,11 @@ def config() -> argparse.Namespace:
         help="when not zero, will truncate the observation to this length before feeding to the model",
         default=3840,
     )
+    parser.add_argument(
+        "--prune_observation",
+        action="store_true",
+        help="Drop low-value accessibility tree subtrees to fit max_obs_length instead of cutting the tail",
+    )
 
     # planner/executor model configs
     parser.add_argument("--planner_provider", type=str, default="openai")
@@ -278,6 +420,21 @@ def config() -> argparse.Namespace:
         raise ValueError(
             f"Action type {args.action_set_tag} is incompatible with the observation type {args.observation_type}"
         )
+    # the compact dialect renumbers the elements, so its ids only make
+    # sense to the compact action parser and vice versa
+    if (args.action_set_tag == "id_accessibility_tree_compact") != (
+        args.observation_dialect == "compact"
+    ):
+        raise ValueError(
+            f"Action type {args.action_set_tag} is incompatible with the observation dialect {args.observation_dialect}"
+        )
+    if (
+        args.action_set_tag == "id_accessibility_tree_compact"
+        and args.observation_type != "accessibility_tree"
+    ):
+        raise ValueError(
+            f"Action type {args.action_set_tag} is incompatible with the observation type {args.observation_type}"
+        )
 
     return args
 
@@ -425,6 +582,27 @@ def log_dialogue(result_dir: str, task_id: str, turn_id: int, agent: str, dialog
         f.write(json.dumps(entry, cls=DialogueLogEncoder) + "\n")
 
 
+def renew_login(config_file: str, login_cache: LoginCache) -> str:
+    """Point the task at a valid login state and return the config file to use for it"""
+    with open(config_file) as f:
+        _c = json.load(f)
+    # automatically login
+    if _c["storage_state"]:
+        cookie_file_name = os.path.basename(_c["storage_state"])
+        comb = get_site_comb_from_filepath(cookie_file_name)
+        storage_state = login_cache.get(comb)
+        assert storage_state.exists()
+        if storage_state.resolve() == Path(_c["storage_state"]).resolve():
+            return config_file
+        _c["storage_state"] = str(storage_state)
+        # update the config file
+        temp_dir = tempfile.mkdtemp()
+        config_file = f"{temp_dir}/{os.path.basename(config_file)}"
+        with open(config_file, "w") as f:
+            json.dump(_c, f)
+    return config_file
+
+
 def test(
     args: argparse.Namespace,
     config_file_list: list[str]
@@ -480,14 +658,75 @@ def test(
         planner_agent = None
         executor_agent = None
 
-    browser_env = None  # Initialize to None to avoid UnboundLocalError
-    for config_file in config_file_list:
+    browser_env = ScriptBrowserEnv(
+        headless=not args.render,
+        slow_mo=args.slow_mo,
+        observation_type=args.observation_type,
+        current_viewport_only=args.current_viewport_only,
+        viewport_size={
+            "width": args.viewport_width,
+            "height": args.viewport_height,
+        },
+        save_trace_enabled=args.save_trace_enabled,
+        trace_policy=args.trace_policy,
+        trace_sample_rate=args.trace_sample_rate,
+        sleep_after_execution=args.sleep_after_execution,
+        captioning_fn=caption_image_fn,
+        observation_token_budget=(
+            args.max_obs_length if args.prune_observation else 0
+        ),
+        ax_fetch_mode=args.ax_fetch_mode,
+        observation_dialect=args.observation_dialect,
+        reuse_browser=args.reuse_browser or args.prefetch_next_task,
+        context_pool_size=1 if args.prefetch_next_task else 0,
+        settle_mode=args.settle_mode,
+        block_resources=args.block_resources,
+        block_images=args.block_images,
+        asset_cache_dir=args.asset_cache_dir,
+        har_mode=args.har_mode,
+        har_dir=args.har_dir,
+        har_not_found=args.har_not_found,
+        site_reset_manager=(
+            build_site_reset_manager(
+                args.site_reset_backend, args.site_reset_policy
+            )
+            if args.har_mode != "replay"
+            else None
+        ),
+        memory_watchdog=args.memory_watchdog,
+        max_js_heap_mb=args.max_js_heap_mb,
+        max_browser_rss_mb=args.max_browser_rss_mb,
+        browser_endpoint=args.browser_endpoint,
+        ax_mirror=args.ax_mirror,
+        scroll_reuse=args.scroll_reuse,
+        tab_cache=args.tab_cache,
+    )
+    # time spent waiting for pages to settle, per step
+    settle_times: list[float] = []
+    # time spent capturing the observation, per step
+    observation_times: list[float] = []
+    # replayed tasks never reach the sites, so there is nothing to log into
+    login_cache = (
+        LoginCache(args.auth_folder) if args.har_mode != "replay" else None
+    )
+    prepare_config = (
+        partial(renew_login, login_cache=login_cache)
+        if login_cache is not None
+        else lambda config_file: config_file
+    )
+    # config files of upcoming tasks whose login was already renewed
+    prepared_configs: dict[str, str] = {}
+    for config_idx, config_file in enumerate(config_file_list):
+        task_id = None
         try:
             render_helper = RenderHelper(
                 config_file, args.result_dir, args.action_set_tag
             )
 
-            # Load task.
+            # Load task, with freshly renewed cookies.
+            config_file = prepared_configs.pop(
+                config_file, None
+            ) or prepare_config(config_file)
             with open(config_file) as f:
                 _c = json.load(f)
                 intent = _c["intent"]
@@ -495,29 +734,6 @@ def test(
                 image_paths = _c.get("image", None)
                 images = []
 
-                # automatically login
-                if _c["storage_state"]:
-                    cookie_file_name = os.path.basename(_c["storage_state"])
-                    comb = get_site_comb_from_filepath(cookie_file_name)
-                    temp_dir = tempfile.mkdtemp()
-                    # subprocess to renew the cookie
-                    subprocess.run(
-                        [
-                            "python",
-                            "browser_env/auto_login.py",
-                            "--auth_folder",
-                            temp_dir,
-                            "--site_list",
-                            *comb,
-                        ]
-                    )
-                    _c["storage_state"] = f"{temp_dir}/{cookie_file_name}"
-                    assert os.path.exists(_c["storage_state"])
-                    # update the config file
-                    config_file = f"{temp_dir}/{os.path.basename(config_file)}"
-                    with open(config_file, "w") as f:
-                        json.dump(_c, f)
-
                 # Load input images for the task, if any.
                 if image_paths is not None:
                     if isinstance(image_paths, str):
@@ -534,22 +750,26 @@ def test(
             logger.info(f"[Config file]: {config_file}")
             logger.info(f"[Intent]: {intent}")
 
-            browser_env = ScriptBrowserEnv(
-                headless=not args.render,
-                slow_mo=args.slow_mo,
-                observation_type=args.observation_type,
-                current_viewport_only=args.current_viewport_only,
-                viewport_size={
-                    "width": args.viewport_width,
-                    "height": args.viewport_height,
-                },
-                save_trace_enabled=args.save_trace_enabled,
-                sleep_after_execution=args.sleep_after_execution,
-                captioning_fn=caption_image_fn,
-            )
-
             trajectory: Trajectory = []
             obs, info = browser_env.reset(options={"config_file": config_file})
+            settle_times.append(info["step_stats"]["settle_time"])
+            observation_times.append(
+                info["step_stats"]["observation_time"].get("total", 0.0)
+            )
+            peak_memory = dict(info["step_stats"]["memory"])
+
+            # Let the next task's pages load while the agent works on this one.
+            if args.prefetch_next_task and config_idx + 1 < len(config_file_list):
+                next_config_file = config_file_list[config_idx + 1]
+                try:
+                    prepared_configs[next_config_file] = prepare_config(
+                        next_config_file
+                    )
+                    browser_env.prefetch(
+                        Path(prepared_configs[next_config_file])
+                    )
+                except Exception as e:
+                    logger.info(f"[Prefetch Error] {repr(e)}")
 
             # The task is to navigate to a website and do something.
             if args.use_plan_act:
@@ -647,6 +867,12 @@ def test(
                 if action["action_type"] != ActionTypes.STOP:
                     obs, _, terminated, _, info = browser_env.step(action)
                     state_info = info["state_info"]
+                    settle_times.append(info["step_stats"]["settle_time"])
+                    observation_times.append(
+                        info["step_stats"]["observation_time"].get("total", 0.0)
+                    )
+                    for key, value in info["step_stats"]["memory"].items():
+                        peak_memory[key] = max(peak_memory.get(key, 0.0), value)
                     trajectory.append(state_info)
 
                 if render_helper:
@@ -692,6 +918,12 @@ def test(
                         trajectory.append(create_stop_action(""))
                     break
             
+            if peak_memory:
+                logger.info(
+                    "[Memory] "
+                    + ", ".join(f"peak {k}: {v:.0f}" for k, v in peak_memory.items())
+                )
+
             # NOTE: eval_caption_image_fn is used for running eval_vqa functions.
             evaluator = evaluator_router(
                 config_file, captioning_fn=eval_caption_image_fn
@@ -716,7 +948,8 @@ def test(
 
             if args.save_trace_enabled:
                 browser_env.save_trace(
-                    Path(args.result_dir) / "traces" / f"{task_id}.zip"
+                    Path(args.result_dir) / "traces" / f"{task_id}.zip",
+                    failed=score != 1,
                 )
         except openai.OpenAIError as e:
             logger.info(f"[OpenAI Error] {repr(e)}")
@@ -730,10 +963,29 @@ def test(
                 f.write(f"[Unhandled Error] {repr(e)}\n")
                 f.write(traceback.format_exc())  # write stack trace to file
 
+            if args.save_trace_enabled and task_id is not None:
+                try:
+                    browser_env.save_trace(
+                        Path(args.result_dir) / "traces" / f"{task_id}.zip",
+                        failed=True,
+                    )
+                except Exception as trace_error:
+                    logger.info(f"[Trace Error] {repr(trace_error)}")
+
         render_helper.close()
 
-    if browser_env is not None:
-        browser_env.close()
+    browser_env.close()
+    if login_cache is not None:
+        login_cache.close()
+    if len(settle_times):
+        logger.info(
+            f"Settle time: {sum(settle_times):.1f}s over {len(settle_times)} steps "
+            f"(fixed sleep would be {len(settle_times) * args.sleep_after_execution:.1f}s)"
+        )
+    if len(observation_times):
+        logger.info(
+            f"Observation time: {sum(observation_times) / len(observation_times):.2f}s per step over {len(observation_times)} steps"
+        )
     if len(scores):
         logger.info(f"Average score: {sum(scores) / len(scores)}")
 
@@ -0,0 +1,79 @@
+"""Measure the observation latency of the sync and async environments.
+
+Both environments capture the text observation and the page screenshot on
+every step, as MultimodalCoTPromptConstructor runs use them. The sync
+environment captures them one after the other; the async one overlaps the
+screenshot with the DOM and accessibility tree queries.
+
+    python scripts/benchmark_observation.py --url http://localhost:7770 --steps 20
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+from collections import defaultdict
+
+os.environ.setdefault("DATASET", "webarena")
+
+from browser_env import (
+    AsyncScriptBrowserEnv,
+    ScriptBrowserEnv,
+    create_scroll_action,
+)
+
+
+def benchmark(env, config_file: str, steps: int) -> dict[str, list[float]]:
+    timings = defaultdict(list)
+    env.reset(options={"config_file": config_file})
+    for step in range(steps):
+        # scroll down and back up so the page keeps changing
+        direction = "down" if step % 2 == 0 else "up"
+        _, _, _, _, info = env.step(create_scroll_action(direction))
+        for key, value in info["step_stats"]["observation_time"].items():
+            timings[key].append(value)
+    env.close()
+    return timings
+
+
+def report(name: str, timings: dict[str, list[float]]) -> None:
+    parts = ", ".join(
+        f"{key} {statistics.mean(values) * 1000:.0f}ms"
+        for key, values in timings.items()
+    )
+    print(f"{name}: {parts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, required=True)
+    parser.add_argument("--storage_state", type=str, default=None)
+    parser.add_argument(
+        "--observation_type",
+        type=str,
+        default="accessibility_tree",
+        choices=["accessibility_tree", "html", "image_som"],
+    )
+    parser.add_argument("--current_viewport_only", action="store_true")
+    parser.add_argument("--steps", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"start_url": args.url, "storage_state": args.storage_state}, f)
+        config_file = f.name
+
+    env_kwargs = dict(
+        observation_type=args.observation_type,
+        current_viewport_only=args.current_viewport_only,
+    )
+    try:
+        report(
+            "sync",
+            benchmark(ScriptBrowserEnv(**env_kwargs), config_file, args.steps),
+        )
+        report(
+            "async",
+            benchmark(AsyncScriptBrowserEnv(**env_kwargs), config_file, args.steps),
+        )
+    finally:
+        os.remove(config_file)
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+# browser_env reads the dataset when it is imported
+os.environ.setdefault("DATASET", "webarena")
+# env_config asserts that every site URL is set; the tests never reach them
+for name, url in {
+    "REDDIT": "http://localhost:9999",
+    "SHOPPING": "http://localhost:7770",
+    "SHOPPING_ADMIN": "http://localhost:7780/admin",
+    "GITLAB": "http://localhost:8023",
+    "WIKIPEDIA": "http://localhost:8888",
+    "MAP": "http://localhost:3000",
+    "HOMEPAGE": "http://localhost:4399",
+}.items():
+    os.environ.setdefault(name, url)
+
+
+def make_ax_node(
+    node_id, role: str, name: str = "", children=(), parent=None, properties=()
+) -> dict:
+    """An AX node as Accessibility.getFullAXTree returns it, with its bounds
+    inside the viewport"""
+    node = {
+        "nodeId": str(node_id),
+        "backendDOMNodeId": 100 + int(node_id),
+        "role": {"value": role},
+        "name": {"value": name},
+        "childIds": [str(child_id) for child_id in children],
+        "properties": list(properties),
+        "union_bound": [0.0, 0.0, 10.0, 10.0],
+    }
+    # the root has no parentId
+    if parent is not None:
+        node["parentId"] = str(parent)
+    return node
+
+
+@pytest.fixture
+def ax_node():
+    return make_ax_node
@@ -0,0 +1,71 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip("playwright")
+pytest.importorskip("requests")
+
+from browser_env.auto_login import probe_is_expired
+
+
+class RedirectingHandler(BaseHTTPRequestHandler):
+    """`/profile` redirects to `/account`, which needs the session cookie"""
+
+    def do_GET(self) -> None:
+        if self.path == "/profile":
+            self.send_response(302)
+            self.send_header("Location", "/account")
+            self.end_headers()
+            return
+        logged_in = "session=abc" in self.headers.get("Cookie", "")
+        body = b"My account" if logged_in else b"Sign in"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server():
+    server = HTTPServer(("127.0.0.1", 0), RedirectingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def storage_state(domain: str, expires: float = -1) -> dict:
+    return {
+        "cookies": [
+            {
+                "name": "session",
+                "value": "abc",
+                "domain": domain,
+                "path": "/",
+                "expires": expires,
+            }
+        ]
+    }
+
+
+def test_cookies_survive_redirects(server: str) -> None:
+    assert not probe_is_expired(
+        storage_state("127.0.0.1"), f"{server}/profile", "My account"
+    )
+
+
+def test_cookies_of_other_domains_are_not_sent(server: str) -> None:
+    assert probe_is_expired(
+        storage_state("example.com"), f"{server}/profile", "My account"
+    )
+
+
+def test_expired_cookies_are_not_sent(server: str) -> None:
+    assert probe_is_expired(
+        storage_state("127.0.0.1", expires=1.0), f"{server}/profile", "My account"
+    )
@@ -0,0 +1,219 @@
+import copy
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from browser_env import ax_mirror
+from browser_env.ax_mirror import AXMirror, PageAXMirror, compare_ax_trees
+
+
+@pytest.fixture
+def page_tree(ax_node):
+    def build() -> list[dict]:
+        return [
+            ax_node(1, "RootWebArea", "Page", [2, 5]),
+            ax_node(2, "main", "Content", [3], parent=1),
+            ax_node(3, "link", "Home", [4], parent=2),
+            ax_node(4, "StaticText", "Home", parent=3),
+            ax_node(5, "contentinfo", "Footer", parent=1),
+        ]
+
+    return build
+
+
+# DOM frontend ids; the div and its text have no AX node of their own
+DOCUMENT = {
+    "nodeId": 1,
+    "backendNodeId": 101,
+    "children": [
+        {
+            "nodeId": 2,
+            "backendNodeId": 102,
+            "children": [
+                {
+                    "nodeId": 6,
+                    "backendNodeId": 200,
+                    "children": [{"nodeId": 7, "backendNodeId": 201}],
+                }
+            ],
+        },
+        {"nodeId": 5, "backendNodeId": 105},
+    ],
+}
+
+
+class FakeClient:
+    """A CDP session over `nodes`, the page's current AX tree"""
+
+    def __init__(self, nodes: list[dict]) -> None:
+        self.nodes = nodes
+        self.handlers: dict[str, object] = {}
+        self.sent: Counter[str] = Counter()
+
+    def on(self, event: str, handler) -> None:
+        self.handlers[event] = handler
+
+    def emit(self, event: str, params: dict) -> None:
+        self.handlers[event](params)
+
+    def send(self, method: str, params: dict | None = None) -> dict:
+        self.sent[method] += 1
+        nodes = copy.deepcopy(self.nodes)
+        if method == "DOM.getDocument":
+            return {"root": copy.deepcopy(DOCUMENT)}
+        if method == "Accessibility.getFullAXTree":
+            return {"nodes": nodes}
+        if method == "Accessibility.getPartialAXTree":
+            backend_node_id = params["backendNodeId"]
+            return {
+                "nodes": [n for n in nodes if n["backendDOMNodeId"] == backend_node_id]
+            }
+        if method == "Accessibility.getChildAXNodes":
+            return {"nodes": [n for n in nodes if n.get("parentId") == params["id"]]}
+        return {}
+
+    def detach(self) -> None:
+        pass
+
+
+class FakeContext:
+    def __init__(self, client: FakeClient) -> None:
+        self.client = client
+
+    def new_cdp_session(self, page) -> FakeClient:
+        return self.client
+
+
+class FakePage:
+    def __init__(self, client: FakeClient) -> None:
+        self.context = FakeContext(client)
+        self.main_frame = object()
+
+    def on(self, event: str, handler) -> None:
+        pass
+
+
+def make_mirror(nodes: list[dict]) -> tuple[PageAXMirror, FakeClient]:
+    client = FakeClient(nodes)
+    mirror = PageAXMirror(FakePage(client))
+    mirror.tree()
+    client.sent.clear()
+    return mirror, client
+
+
+def names(accessibility_tree: list[dict]) -> list[str]:
+    return [n["name"]["value"] for n in accessibility_tree]
+
+
+def test_dom_changes_mark_the_closest_ax_ancestor(page_tree) -> None:
+    mirror, client = make_mirror(page_tree())
+
+    # the text node's DOM parent has no AX node either
+    client.emit("DOM.characterDataModified", {"nodeId": 7})
+    assert mirror.dirty == {"2"}
+    assert not mirror.stale
+
+    # nodes the mirror never saw cannot be placed
+    client.emit("DOM.attributeModified", {"nodeId": 42})
+    assert mirror.stale
+
+
+def test_nodes_updated_with_unseen_children_refreshes_the_subtree(
+    page_tree, ax_node
+) -> None:
+    mirror, client = make_mirror(page_tree())
+    client.nodes[2]["childIds"].append("6")
+    client.nodes.append(ax_node(6, "StaticText", "new", parent=3))
+
+    # updates of nodes outside the mirror are ignored
+    client.emit("Accessibility.nodesUpdated", {"nodes": [ax_node(9, "link")]})
+    client.emit(
+        "Accessibility.nodesUpdated", {"nodes": [copy.deepcopy(client.nodes[2])]}
+    )
+    assert mirror.dirty == {"3"}
+
+    assert names(mirror.tree()) == [
+        "Page",
+        "Content",
+        "Home",
+        "Home",
+        "new",
+        "Footer",
+    ]
+    assert client.sent["Accessibility.getFullAXTree"] == 0
+    assert client.sent["Accessibility.getPartialAXTree"] == 1
+    assert mirror.patched_nodes == 2
+
+
+def test_stale_mirror_fetches_the_full_tree(page_tree) -> None:
+    mirror, client = make_mirror(page_tree())
+
+    client.emit("DOM.documentUpdated", {})
+    mirror.tree()
+
+    assert client.sent["Accessibility.getFullAXTree"] == 1
+    assert client.sent["DOM.getDocument"] == 1
+
+
+def test_vanished_dirty_node_fetches_the_full_tree(page_tree, ax_node) -> None:
+    mirror, client = make_mirror(page_tree())
+    client.nodes = [ax_node(1, "RootWebArea", "Page", [5]), page_tree()[-1]]
+
+    client.emit("DOM.attributeModified", {"nodeId": 2})
+
+    assert names(mirror.tree()) == ["Page", "Footer"]
+    assert client.sent["Accessibility.getPartialAXTree"] == 1
+    assert client.sent["Accessibility.getFullAXTree"] == 1
+
+
+def test_dirty_root_fetches_the_full_tree(page_tree) -> None:
+    mirror, client = make_mirror(page_tree())
+
+    client.emit(
+        "DOM.childNodeInserted",
+        {"parentNodeId": 1, "node": {"nodeId": 8, "backendNodeId": 300}},
+    )
+    mirror.tree()
+
+    assert client.sent["Accessibility.getFullAXTree"] == 1
+    assert client.sent["Accessibility.getChildAXNodes"] == 0
+
+
+def test_large_dirty_subtree_fetches_the_full_tree(monkeypatch, page_tree) -> None:
+    monkeypatch.setattr(ax_mirror, "MAX_REFRESHED_SUBTREE_NODES", 1)
+    mirror, client = make_mirror(page_tree())
+
+    client.emit("DOM.attributeModified", {"nodeId": 2})
+    mirror.tree()
+
+    assert client.sent["Accessibility.getFullAXTree"] == 1
+    assert client.sent["Accessibility.getChildAXNodes"] == 0
+
+
+def test_stats_count_document_fetches(page_tree) -> None:
+    mirrors = AXMirror()
+
+    mirrors.tree(FakePage(FakeClient(page_tree())))
+
+    assert mirrors.pop_stats() == {
+        "full_fetches": 1,
+        "document_fetches": 1,
+        "patched_nodes": 0,
+        "mismatched_reads": 0,
+    }
+    assert mirrors.pop_stats()["document_fetches"] == 0
+
+
+def test_compare_ax_trees(page_tree, ax_node) -> None:
+    full = page_tree()
+    mirror = page_tree()[:-1] + [ax_node(6, "link", "Old", parent=1)]
+    mirror[2]["name"]["value"] = "Start"
+
+    assert sorted(compare_ax_trees(mirror, full)) == [
+        "3 differs in name",
+        "missing 5",
+        "stale 6",
+    ]
+    assert compare_ax_trees(page_tree(), page_tree()) == []
@@ -0,0 +1,134 @@
+"""Integration tests against a real `browser_server` process.
+
+They need an installed Chromium and are skipped without one.
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from playwright.sync_api import sync_playwright
+
+from browser_env import ScriptBrowserEnv
+from browser_env.browser_server import connect
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+class BrowserServer:
+    """A `python -m browser_env.browser_server` process in its own group"""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self.endpoint = f"http://localhost:{port}"
+        self.process: subprocess.Popen | None = None
+
+    def start(self, timeout: float = 30.0) -> None:
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "browser_env.browser_server",
+                "--port",
+                str(self.port),
+            ],
+            cwd=REPO_ROOT,
+            # killing the group also kills the driver and Chromium
+            start_new_session=True,
+        )
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                pytest.skip("the browser server could not start a browser")
+            try:
+                urllib.request.urlopen(f"{self.endpoint}/json/version", timeout=1)
+                return
+            except OSError:
+                time.sleep(0.2)
+        self.kill()
+        pytest.skip("the browser server did not come up")
+
+    def kill(self) -> None:
+        if self.process is None:
+            return
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.process.wait()
+        self.process = None
+
+
+@pytest.fixture
+def server():
+    server = BrowserServer(free_port())
+    server.start()
+    yield server
+    server.kill()
+
+
+@pytest.fixture
+def playwright():
+    with sync_playwright() as playwright:
+        yield playwright
+
+
+def test_crashed_page_leaves_other_contexts_working(server, playwright) -> None:
+    crashing = connect(playwright, server.endpoint).new_context().new_page()
+    other = connect(playwright, server.endpoint).new_context().new_page()
+    other.set_content("<button>ok</button>")
+
+    with pytest.raises(Exception):
+        crashing.goto("chrome://crash")
+
+    assert other.evaluate("1 + 1") == 2
+    assert other.inner_text("button") == "ok"
+
+
+def test_closed_connection_leaves_other_contexts_working(server, playwright) -> None:
+    closing = connect(playwright, server.endpoint)
+    closing.new_context().new_page().set_content("<p>closing</p>")
+    other = connect(playwright, server.endpoint).new_context().new_page()
+    other.set_content("<p>other</p>")
+
+    closing.close()
+
+    assert other.inner_text("p") == "other"
+    other.set_content("<p>still working</p>")
+    assert other.inner_text("p") == "still working"
+
+
+def test_env_reconnects_after_server_restart(server) -> None:
+    env = ScriptBrowserEnv(
+        browser_endpoint=server.endpoint,
+        reuse_browser=True,
+    )
+    try:
+        env.reset()
+        assert env.browser_is_healthy()
+
+        server.kill()
+        assert not env.browser_is_healthy()
+        server.start()
+
+        # the next reset notices the dropped connection and reconnects
+        env.reset()
+        assert env.browser_is_healthy()
+        env.page.set_content("<p>reconnected</p>")
+        assert env.page.inner_text("p") == "reconnected"
+    finally:
+        env.close()
@@ -0,0 +1,121 @@
+import pytest
+
+pytest.importorskip("playwright")
+pytest.importorskip("numpy")
+
+from browser_env.actions import (
+    ActionTypes,
+    action2str,
+    create_compact_id_based_action,
+    create_type_action,
+)
+from browser_env.compact_observation import serialize_compact_accessibility_tree
+
+
+def prop(name: str, value) -> dict:
+    return {"name": name, "value": {"value": value}}
+
+
+@pytest.fixture
+def tree(ax_node) -> list[dict]:
+    return [
+        ax_node(1, "RootWebArea", "Shop", [2, 5, 6]),
+        # the link text repeats the link name
+        ax_node(2, "link", "Home", [3], parent=1),
+        ax_node(3, "StaticText", "Home", parent=2),
+        # an unnamed generic is left out, its text is merged into one line
+        ax_node(5, "generic", "", [7, 8], parent=1),
+        ax_node(
+            6,
+            "checkbox",
+            "Remember me",
+            parent=1,
+            properties=[
+                prop("checked", "true"),
+                prop("required", False),
+                prop("focusable", True),
+            ],
+        ),
+        ax_node(7, "StaticText", "Total:", parent=5),
+        ax_node(8, "StaticText", "$12", parent=5),
+    ]
+
+
+def test_serialize_compact_accessibility_tree(tree) -> None:
+    observation, obs_nodes_info = serialize_compact_accessibility_tree(tree)
+
+    assert observation == "\n".join(
+        [
+            "1 page Shop",
+            "\t2 a Home",
+            "\t3 t Total: $12",
+            "\t4 check(checked) Remember me",
+        ]
+    )
+    assert list(obs_nodes_info) == ["1", "2", "3", "4"]
+    assert obs_nodes_info["2"]["backend_id"] == 102
+    assert obs_nodes_info["3"]["backend_id"] == 107
+    assert obs_nodes_info["4"]["text"] == "4 check(checked) Remember me"
+
+
+def test_text_of_different_elements_is_not_merged(ax_node) -> None:
+    observation, _ = serialize_compact_accessibility_tree(
+        [
+            ax_node(1, "RootWebArea", "Shop", [2, 3]),
+            # both generics are left out, so their texts end up side by side
+            ax_node(2, "generic", "", [4], parent=1),
+            ax_node(3, "generic", "", [5], parent=1),
+            ax_node(4, "StaticText", "Price", parent=2),
+            ax_node(5, "StaticText", "Shipping", parent=3),
+        ]
+    )
+
+    assert observation == "\n".join(["1 page Shop", "\t2 t Price", "\t3 t Shipping"])
+
+
+def test_serialize_empty_tree() -> None:
+    assert serialize_compact_accessibility_tree([]) == ("", {})
+
+
+@pytest.mark.parametrize(
+    "action_str", ["click [2]", "click 2", "click #2", "  CLICK 2", "click [2] where"]
+)
+def test_click_on_short_id(action_str: str, tree) -> None:
+    _, obs_nodes_info = serialize_compact_accessibility_tree(tree)
+    action = create_compact_id_based_action(action_str)
+
+    assert action["action_type"] == ActionTypes.CLICK
+    assert action["element_id"] == "2"
+    assert action["element_id"] in obs_nodes_info
+
+
+def test_typed_text_keeps_its_numbers() -> None:
+    action = create_compact_id_based_action("type 4 [click 12 then hover 3]")
+
+    assert action["action_type"] == ActionTypes.TYPE
+    assert action["element_id"] == "4"
+    assert action["text"] == create_type_action(
+        text="click 12 then hover 3", element_id="4"
+    )["text"]
+
+
+def test_ids_are_only_read_at_the_start() -> None:
+    action = create_compact_id_based_action("scroll [down] and click 2")
+
+    assert action["action_type"] == ActionTypes.SCROLL
+
+
+def test_round_trip_through_action2str(tree) -> None:
+    _, obs_nodes_info = serialize_compact_accessibility_tree(tree)
+    for action_str in ["click 4", "hover 2", "type 4 [yes 1]"]:
+        action = create_compact_id_based_action(action_str)
+        element_id = action["element_id"]
+        rendered = action2str(
+            action,
+            "id_accessibility_tree_compact",
+            obs_nodes_info[element_id]["text"],
+        )
+        again = create_compact_id_based_action(rendered)
+        assert again["action_type"] == action["action_type"]
+        assert again["element_id"] == element_id
+        assert again["text"] == action["text"]
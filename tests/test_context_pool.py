@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("playwright")
+pytest.importorskip("numpy")
+
+from browser_env import ScriptBrowserEnv
+
+
+def test_prefetch_is_kept_without_routing() -> None:
+    env = ScriptBrowserEnv(reuse_browser=True, context_pool_size=1)
+    assert env.context_pool is not None
+
+
+@pytest.mark.parametrize("routing", ["block_resources", "asset_cache", "har_replay"])
+def test_prefetch_is_disabled_with_route_handlers(routing: str, tmp_path) -> None:
+    kwargs = {
+        "block_resources": {"block_resources": True},
+        "asset_cache": {"asset_cache_dir": str(tmp_path / "asset_cache")},
+        "har_replay": {"har_mode": "replay", "har_dir": str(tmp_path / "hars")},
+    }[routing]
+    env = ScriptBrowserEnv(reuse_browser=True, context_pool_size=1, **kwargs)
+    assert env.context_pool is None
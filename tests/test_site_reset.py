@@ -0,0 +1,114 @@
+import pytest
+
+pytest.importorskip("playwright")
+requests = pytest.importorskip("requests")
+
+from browser_env import site_reset
+from browser_env.site_reset import (
+    InProcessResetBackend,
+    ResetBackend,
+    SiteResetManager,
+    wait_until_ready,
+)
+
+
+def test_reset_backend_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        ResetBackend()  # type: ignore[abstract]
+
+
+def test_on_require_resets_only_tasks_that_require_it() -> None:
+    backend = InProcessResetBackend()
+    manager = SiteResetManager([backend], policy="on_require")
+
+    assert manager.before_task({"sites": ["reddit"]}) == []
+    assert manager.before_task(
+        {"sites": ["reddit", "gitlab"], "require_reset": True}
+    ) == ["reddit", "gitlab"]
+    assert backend.resets == ["reddit", "gitlab"]
+
+
+def test_dirty_resets_sites_touched_by_a_modifying_task() -> None:
+    backend = InProcessResetBackend()
+    manager = SiteResetManager([backend], policy="dirty")
+
+    # nothing has modified the sites yet
+    assert manager.before_task({"sites": ["shopping"], "require_reset": True}) == []
+    assert manager.dirty == {"shopping"}
+    # a read-only task on another site leaves the dirty site alone
+    assert manager.before_task({"sites": ["reddit"]}) == []
+    assert manager.before_task({"sites": ["shopping"]}) == ["shopping"]
+    assert manager.dirty == set()
+    assert manager.before_task({"sites": ["shopping"]}) == []
+    assert backend.resets == ["shopping"]
+
+
+def test_unsupported_site_is_not_reset() -> None:
+    backend = InProcessResetBackend(sites=["reddit"])
+    manager = SiteResetManager([backend], policy="on_require")
+
+    assert manager.before_task(
+        {"sites": ["reddit", "map"], "require_reset": True}
+    ) == ["reddit"]
+    assert backend.resets == ["reddit"]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code: int) -> None:
+        self.status_code = status_code
+
+
+def test_wait_until_ready_backs_off_until_the_site_answers(monkeypatch) -> None:
+    clock = FakeClock()
+    answers = [requests.ConnectionError(), FakeResponse(502), None, FakeResponse(200)]
+
+    def get(url: str, **kwargs):
+        answer = answers.pop(0)
+        if answer is None:
+            raise requests.Timeout()
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(site_reset, "time", clock)
+    monkeypatch.setattr(site_reset.requests, "get", get)
+
+    assert wait_until_ready("http://site", initial_delay=0.5, max_delay=10.0)
+    assert clock.sleeps == [0.5, 1.0, 2.0]
+
+
+def test_wait_until_ready_caps_the_delay_and_gives_up(monkeypatch) -> None:
+    clock = FakeClock()
+
+    def get(url: str, **kwargs):
+        raise requests.ConnectionError()
+
+    monkeypatch.setattr(site_reset, "time", clock)
+    monkeypatch.setattr(site_reset.requests, "get", get)
+
+    assert not wait_until_ready(
+        "http://site", timeout=30.0, initial_delay=1.0, max_delay=4.0
+    )
+    assert clock.sleeps == [1.0, 2.0, 4.0, 4.0, 4.0, 4.0, 4.0, 4.0]
+    assert clock.now <= 30.0
+
+
+def test_env_builds_no_manager_for_tasks_without_reset() -> None:
+    from browser_env import ScriptBrowserEnv
+
+    env = ScriptBrowserEnv()
+    env._reset_sites({"sites": ["gitlab"]})
+    assert env.site_reset_manager is None
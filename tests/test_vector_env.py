@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from browser_env import VectorBrowserEnv, vector_env
+from browser_env.site_reset import InProcessResetBackend, SiteResetManager
+
+
+def make_env(policy: str = "on_require") -> VectorBrowserEnv:
+    manager = SiteResetManager([InProcessResetBackend()], policy=policy)
+    return VectorBrowserEnv(2, site_reset_manager=manager)
+
+
+def queue(env: VectorBrowserEnv, tmp_path, configs: list[dict]) -> None:
+    env.queue = []
+    for i, config in enumerate(configs):
+        config_file = str(tmp_path / f"{i}.json")
+        with open(config_file, "w") as f:
+            json.dump(config, f)
+        env.queue.append(config_file)
+        env.queued_configs[config_file] = config
+
+
+def start(env: VectorBrowserEnv, idx: int) -> dict | None:
+    task = env._next_task()
+    if task is None:
+        return None
+    env.config_files[idx], env.instance_configs[idx] = task
+    return task[1]
+
+
+def test_sub_envs_share_the_reset_manager() -> None:
+    env = make_env()
+    assert all(
+        sub_env.site_reset_manager is env.site_reset_manager for sub_env in env.envs
+    )
+
+
+def test_manager_is_only_built_for_reset_tasks(tmp_path, monkeypatch) -> None:
+    env = VectorBrowserEnv(2)
+    queue(env, tmp_path, [{"task_id": 0, "sites": ["gitlab"]}])
+    assert env.site_reset_manager is None
+
+    manager = SiteResetManager([InProcessResetBackend()])
+    monkeypatch.setattr(vector_env, "build_site_reset_manager", lambda: manager)
+    env._share_reset_manager()
+    assert all(sub_env.site_reset_manager is manager for sub_env in env.envs)
+
+
+def test_reset_task_waits_for_running_tasks_on_its_sites(tmp_path) -> None:
+    env = make_env()
+    reading = {"task_id": 0, "sites": ["gitlab"]}
+    resetting = {"task_id": 1, "sites": ["gitlab"], "require_reset": True}
+    other = {"task_id": 2, "sites": ["reddit"], "require_reset": True}
+    queue(env, tmp_path, [reading, resetting, other])
+
+    assert start(env, 0) == reading
+    # the reset would change gitlab under the running task
+    assert start(env, 1) == other
+    assert env.queue == [str(tmp_path / "1.json")]
+    assert env._next_task() is None
+
+    env.config_files[0] = env.instance_configs[0] = None
+    assert start(env, 0) == resetting
+
+
+def test_tasks_wait_for_a_running_task_that_modifies_their_sites(tmp_path) -> None:
+    env = make_env()
+    modifying = {"task_id": 0, "sites": ["gitlab"], "require_reset": True}
+    reading = {"task_id": 1, "sites": ["gitlab", "wikipedia"]}
+    queue(env, tmp_path, [modifying, reading])
+
+    assert start(env, 0) == modifying
+    assert start(env, 1) is None
+
+
+def test_read_only_tasks_run_together(tmp_path) -> None:
+    env = make_env(policy="dirty")
+    first = {"task_id": 0, "sites": ["gitlab"]}
+    second = {"task_id": 1, "sites": ["gitlab"]}
+    queue(env, tmp_path, [first, second])
+
+    assert start(env, 0) == first
+    assert start(env, 1) == second
+
+
+def test_dirty_site_is_not_reset_under_a_running_task(tmp_path) -> None:
+    env = make_env(policy="dirty")
+    env.site_reset_manager.dirty.add("gitlab")
+    running = {"task_id": 0, "sites": ["gitlab", "reddit"]}
+    queue(env, tmp_path, [{"task_id": 1, "sites": ["gitlab"]}])
+    env.config_files[0], env.instance_configs[0] = "running.json", running
+
+    assert start(env, 1) is None
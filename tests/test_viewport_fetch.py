@@ -0,0 +1,199 @@
+import copy
+
+import pytest
+
+pytest.importorskip("playwright")
+pytest.importorskip("numpy")
+
+from browser_env import processors
+from browser_env.processors import (
+    MAX_PARTIAL_AX_FETCHES,
+    TextObervationProcessor,
+    assemble_partial_accessibility_tree,
+    observation_line_differences,
+)
+
+
+def make_processor() -> TextObervationProcessor:
+    return TextObervationProcessor(
+        "accessibility_tree",
+        current_viewport_only=True,
+        viewport_size={"width": 1280, "height": 720},
+        ax_fetch_mode="check",
+    )
+
+
+@pytest.fixture
+def tree(ax_node):
+    def links_tree(*links: str) -> list[dict]:
+        ids = range(2, len(links) + 2)
+        return [ax_node(1, "RootWebArea", "Page", ids)] + [
+            ax_node(node_id, "link", name, parent=1)
+            for node_id, name in zip(ids, links)
+        ]
+
+    return links_tree
+
+
+@pytest.fixture
+def page(ax_node) -> list[dict]:
+    """The page's AX tree; the footer is below the viewport"""
+    nodes = [
+        ax_node(1, "RootWebArea", "Page", [2, 5]),
+        ax_node(2, "main", "Content", [3, 4, 7], parent=1),
+        ax_node(3, "link", "Home", parent=2),
+        ax_node(4, "link", "About", parent=2),
+        ax_node(7, "list", "Docs", [8], parent=2),
+        ax_node(8, "listitem", "Guide", [9], parent=7),
+        ax_node(9, "link", "Getting started", parent=8),
+        ax_node(5, "contentinfo", "Footer", [6], parent=1),
+        ax_node(6, "link", "Contact", parent=5),
+    ]
+    for off_screen in nodes[-2:]:
+        off_screen["union_bound"] = [0.0, 2000.0, 10.0, 10.0]
+    return nodes
+
+
+CONFIG = {"win_width": 1280, "win_height": 720}
+
+
+class FakeClient:
+    def __init__(self, ax_node) -> None:
+        self.ax_node = ax_node
+        self.sent = 0
+
+    def send(self, method: str, params: dict) -> dict:
+        self.sent += 1
+        backend_node_id = params["backendNodeId"]
+        return {"nodes": [self.ax_node(backend_node_id - 100, "link", "x")]}
+
+
+class FakePageClient:
+    """Answers getPartialAXTree with fetchRelatives from a full tree"""
+
+    def __init__(self, nodes: list[dict]) -> None:
+        self.fetched: list[int] = []
+        self.nodes = {n["nodeId"]: n for n in nodes}
+        self.backend_nodes = {n["backendDOMNodeId"]: n for n in nodes}
+
+    def send(self, method: str, params: dict) -> dict:
+        assert method == "Accessibility.getPartialAXTree"
+        assert params["fetchRelatives"]
+        self.fetched.append(params["backendNodeId"])
+        target = self.backend_nodes[params["backendNodeId"]]
+        ancestors = []
+        parent_id = target.get("parentId")
+        while parent_id is not None:
+            ancestors.append(self.nodes[parent_id])
+            parent_id = self.nodes[parent_id].get("parentId")
+        siblings = [
+            self.nodes[child_id]
+            for child_id in (ancestors[0]["childIds"] if ancestors else [])
+            if child_id != target["nodeId"]
+        ]
+        children = [self.nodes[child_id] for child_id in target["childIds"]]
+        # the requested node comes first, as in Chromium's reply
+        relatives = [target] + ancestors + siblings + children
+        # the bounds come with the nodes here; the processor adds them with
+        # add_union_bounds after the fetch
+        return {"nodes": copy.deepcopy(relatives)}
+
+
+def test_line_differences() -> None:
+    assert observation_line_differences("a\nb", "a\nb") == []
+    assert observation_line_differences("a\nc", "a\nb") == ["- b", "+ c"]
+
+
+def test_matching_viewport_fetch_is_used(tree) -> None:
+    processor = make_processor()
+    viewport_tree = tree("Home", "About")
+
+    result = processor.compare_viewport_accessibility_tree(
+        viewport_tree, tree("Home", "About")
+    )
+
+    assert result is viewport_tree
+    assert processor.pop_ax_fetch_stats() == {"checked_reads": 1}
+
+
+def test_differing_viewport_fetch_falls_back_to_the_full_tree(tree) -> None:
+    processor = make_processor()
+    full_tree = tree("Home", "About")
+
+    result = processor.compare_viewport_accessibility_tree(tree("Home"), full_tree)
+
+    assert result is full_tree
+    assert processor.pop_ax_fetch_stats() == {
+        "checked_reads": 1,
+        "mismatched_reads": 1,
+        "mismatched_lines": 1,
+    }
+    assert processor.pop_ax_fetch_stats() == {}
+
+
+def test_partial_fetches_are_capped(monkeypatch, ax_node) -> None:
+    processor = make_processor()
+    monkeypatch.setattr(
+        processors,
+        "viewport_backend_node_ids",
+        lambda info: list(range(100, 100 + 2 * MAX_PARTIAL_AX_FETCHES)),
+    )
+    client = FakeClient(ax_node)
+
+    assert processor.fetch_viewport_accessibility_tree(client, {}) is None
+    assert client.sent == MAX_PARTIAL_AX_FETCHES
+    assert processor.pop_ax_fetch_stats() == {
+        "partial_fetches": MAX_PARTIAL_AX_FETCHES,
+        "full_fallbacks": 1,
+    }
+
+
+def test_viewport_fetch_matches_the_filtered_full_tree(monkeypatch, page) -> None:
+    processor = make_processor()
+    # the document node has no layout box, the footer is off screen
+    monkeypatch.setattr(
+        processors,
+        "viewport_backend_node_ids",
+        lambda info: [102, 103, 104, 107, 108, 109],
+    )
+    client = FakePageClient(page)
+
+    viewport_tree = processor.fetch_viewport_accessibility_tree(client, {})
+
+    # 2 brings its parent, siblings and children along, 8 the rest
+    assert client.fetched == [102, 108]
+    assert processor.pop_ax_fetch_stats() == {"partial_fetches": 2}
+    # the tree starts at the RootWebArea although 2 was fetched first
+    assert viewport_tree[0]["nodeId"] == "1"
+    nodes = {n["nodeId"]: n for n in viewport_tree}
+    assert set(nodes) == {"1", "2", "3", "4", "5", "7", "8", "9"}
+    # the footer's link was never fetched
+    assert nodes["5"]["childIds"] == []
+    assert nodes["1"]["childIds"] == ["2", "5"]
+
+    viewport_text, _ = processor.parse_accessibility_tree(
+        processor.filter_accessibility_tree_by_viewport(viewport_tree, CONFIG)
+    )
+    full_text, _ = processor.parse_accessibility_tree(
+        processor.filter_accessibility_tree_by_viewport(copy.deepcopy(page), CONFIG)
+    )
+    assert viewport_text == full_text
+    assert "Getting started" in viewport_text
+    assert "Footer" not in viewport_text
+
+
+def test_partial_trees_drop_unfetched_children(ax_node) -> None:
+    nodes = {
+        n["nodeId"]: n
+        for n in [
+            ax_node(2, "main", "Content", [3, 4], parent=1),
+            ax_node(3, "link", "Home", parent=2),
+            ax_node(1, "RootWebArea", "Page", [2, 5]),
+        ]
+    }
+
+    accessibility_tree = assemble_partial_accessibility_tree(nodes)
+
+    assert [n["nodeId"] for n in accessibility_tree] == ["1", "2", "3"]
+    assert nodes["1"]["childIds"] == ["2"]
+    assert nodes["2"]["childIds"] == ["3"]